@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Benchmark da inserção de pixels: executemany (caminho antigo) x COPY
+Sem --db mede só o custo Python de montar as linhas; com --db insere
+em granules de teste no banco do .env e remove tudo no final (inclusive
+a partição do mês de BENCHMARK_ACQUISITION, se ficou vazia)
+"""
+import sys
+import argparse
+import time
+from datetime import datetime
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'src'))
+
+from database.bulk_loader import extract_pixel_columns, build_copy_buffer, copy_pixels, prepare_copy
+import numpy as np
+import pandas as pd
+
+# Aquisição dos granules de teste: antes do lançamento do SWOT, então a
+# partição mensal de pixel_data é só do benchmark e é apagada no fim
+BENCHMARK_ACQUISITION = datetime(2000, 1, 1)
+
+
+def make_synthetic_pixels(n_pixels, seed=0):
+    """Gerar DataFrame sintético com o formato do pixel_cloud"""
+    rng = np.random.default_rng(seed)
+
+    height = rng.normal(250, 15, n_pixels).astype('float32')
+    height[rng.random(n_pixels) < 0.05] = np.nan
+
+    return pd.DataFrame({
+        'latitude': rng.uniform(-25.8, -25.6, n_pixels).astype('float32'),
+        'longitude': rng.uniform(-54.7, -54.5, n_pixels).astype('float32'),
+        'height': height,
+        'classification': rng.integers(0, 7, n_pixels).astype('uint8'),
+        'coherent_power': rng.gamma(2.0, 50.0, n_pixels).astype('float32'),
+    })
+
+
+def build_legacy_rows(df, granule_id, acquired_on=None):
+    """Montar tuplas como o antigo insert_granule_data_optimized"""
+    prefix = (granule_id,) if acquired_on is None else (granule_id, acquired_on)
+    rows = []
+    for _, row in df.iterrows():
+        rows.append(prefix + (
+            float(row['latitude']),
+            float(row['longitude']),
+            float(row['height']) if pd.notna(row['height']) else None,
+            int(row['classification']) if pd.notna(row['classification']) and row['classification'] <= 7 else None,
+            float(row['coherent_power']) if pd.notna(row['coherent_power']) else None,
+        ))
+    return rows
+
+
+def build_copy_rows(df, granule_id):
+    """Montar buffer do COPY inteiro em memória"""
+    columns = extract_pixel_columns(df)
+    return build_copy_buffer(granule_id, columns)
+
+
+def legacy_insert(cursor, df, granule_id, batch_size=2000, table='pixel_data', acquired_on=None):
+    """Caminho antigo: iterrows + executemany em lotes (acquired_on só no schema particionado)"""
+    columns = ['granule_id', 'latitude', 'longitude', 'height_m', 'classification_id', 'coherent_power']
+    if acquired_on is not None:
+        columns.insert(1, 'acquired_on')
+
+    for i in range(0, len(df), batch_size):
+        cursor.executemany(f"""
+            INSERT INTO {table} ({', '.join(columns)})
+            VALUES ({', '.join(['%s'] * len(columns))})
+        """, build_legacy_rows(df.iloc[i:i+batch_size], granule_id, acquired_on))
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def run_offline(df):
+    legacy = timed(build_legacy_rows, df, 0)
+    copy = timed(build_copy_rows, df, 0)
+    return {'legacy_build_s': legacy, 'copy_build_s': copy}
+
+
+def cleanup_database(conn, stamp):
+    """Apagar os granules da execução (pixels em cascata) e a partição do
+    mês de BENCHMARK_ACQUISITION, se ficou vazia"""
+    from database.ingest_stats import existing_tables
+    from database.partitions import partition_name
+
+    partition = partition_name(BENCHMARK_ACQUISITION)
+    with conn.cursor() as cursor:
+        cursor.execute("DELETE FROM granules WHERE granule_name LIKE %s", (f"benchmark_%_{stamp}",))
+        if partition in existing_tables(cursor, [partition]):
+            cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {partition})")
+            if not cursor.fetchone()[0]:
+                cursor.execute(f"DROP TABLE {partition}")
+    conn.commit()
+
+
+def run_database(df):
+    from database.connection import DatabaseConnection
+
+    database = DatabaseConnection()
+    conn = database.getconn()
+    cursor = conn.cursor()
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    results = {}
+
+    try:
+        options = prepare_copy(conn, cursor, BENCHMARK_ACQUISITION)
+        table = options.get('table', 'pixel_data')
+        acquired_on = options.get('acquired_on')
+
+        for label, loader in (('legacy_insert_s', legacy_insert), ('copy_insert_s', copy_pixels)):
+            cursor.execute("""
+                INSERT INTO granules (granule_name, mission_id, region_id, total_pixels, acquisition_start, processing_status)
+                VALUES (%s, 1, 'benchmark', %s, %s, 'benchmark')
+                RETURNING granule_id
+            """, (f"benchmark_{label}_{stamp}", len(df), BENCHMARK_ACQUISITION))
+            granule_id = cursor.fetchone()[0]
+
+            if loader is legacy_insert:
+                results[label] = timed(loader, cursor, df, granule_id, table=table, acquired_on=acquired_on)
+            else:
+                results[label] = timed(loader, cursor, granule_id, df, **options)
+            conn.commit()
+    finally:
+        conn.rollback()
+        cleanup_database(conn, stamp)
+        cursor.close()
+        database.putconn(conn)
+        database.close()
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de inserção de pixels')
+    parser.add_argument('--pixels', type=int, default=100000, help='pixels sintéticos')
+    parser.add_argument('--db', action='store_true', help='inserir no PostgreSQL do .env')
+    args = parser.parse_args()
+
+    df = make_synthetic_pixels(args.pixels)
+    print(f" Benchmark com {len(df):,} pixels sintéticos")
+
+    results = run_database(df) if args.db else run_offline(df)
+
+    for label, seconds in results.items():
+        print(f"   {label}: {seconds:.3f}s ({len(df) / seconds:,.0f} pixels/s)")
+
+    legacy, copy = list(results.values())
+    print(f"   Ganho: {legacy / copy:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""
+Benchmark do caminho de ingestão com granules PIXC sintéticos
+Gera arquivos NetCDF4 com o grupo pixel_cloud (variáveis e dtypes do
+produto, compressão zlib) e mede cada estágio: abertura, extração do
+recorte regional, divisão por região e carga (COPY), além da carga em
+streaming. Sem --db a carga vai para um substituto do PostgreSQL em
+processo (mede o custo Python: extração, buffers do COPY, resumo e nível);
+com --db vai para o banco do .env e tudo o que foi gravado (granules,
+derivados e a partição do benchmark) é removido no fim, mesmo com erro.
+Roda sem rede; o resultado em JSON pode ser comparado com --compare
+"""
+import sys
+import argparse
+import json
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'src'))
+
+from core.pixc_reader import open_pixel_cloud, read_pixel_cloud, iter_pixel_cloud
+from core.region_index import split_by_region
+from database.bulk_loader import insert_granule_data, insert_granule_stream
+import numpy as np
+
+# Tile PIXC: ~64 km ao longo do traço, meia faixa de ~64 km
+TILE_DEG = 0.6
+PIXELS_PER_LINE = 3000
+TILE_ORIGIN = (-54.9, -25.9)  # canto sudoeste (lon, lat)
+
+# Proporção de cada classe (terra, terra perto d'água, água perto de terra,
+# água aberta, água escura, baixa coerência) no pixel_cloud sintético
+CLASS_WEIGHTS = {1: 0.40, 2: 0.15, 3: 0.10, 4: 0.25, 5: 0.05, 6: 0.03, 7: 0.02}
+
+# Variáveis do produto que o leitor não usa, gravadas para o arquivo ter o tamanho real
+EXTRA_VARIABLES = ('sig0', 'cross_track', 'geoid', 'water_frac', 'phase_noise_std')
+
+STAGES = ('open', 'extract', 'filter', 'load', 'stream')
+
+# Aquisição dos granules de teste: antes do lançamento do SWOT, então com
+# --db a partição mensal de pixel_data é só do benchmark e é apagada no fim
+BENCHMARK_ACQUISITION = datetime(2000, 1, 1)
+
+
+def make_pixc_file(path, n_pixels, seed=0, block_lines=200):
+    """Gravar um PIXC sintético de n_pixels em path (grupo pixel_cloud)"""
+    import netCDF4
+
+    rng = np.random.default_rng(seed)
+    lines = -(-n_pixels // PIXELS_PER_LINE)
+    classes = np.array(list(CLASS_WEIGHTS))
+    weights = np.array(list(CLASS_WEIGHTS.values()))
+
+    with netCDF4.Dataset(path, 'w', format='NETCDF4') as nc:
+        nc.title = 'Level 2 KaRIn High Rate Water Mask Pixel Cloud Data Product (sintético)'
+        group = nc.createGroup('pixel_cloud')
+        group.createDimension('points', n_pixels)
+
+        def variable(name, dtype, fill=None):
+            return group.createVariable(name, dtype, ('points',), zlib=True, complevel=4,
+                                        chunksizes=(min(n_pixels, 1 << 18),), fill_value=fill)
+
+        variables = {
+            'latitude': variable('latitude', 'f8', 9.969209968386869e36),
+            'longitude': variable('longitude', 'f8', 9.969209968386869e36),
+            'height': variable('height', 'f4', 9.96921e36),
+            'classification': variable('classification', 'u1', 255),
+            'coherent_power': variable('coherent_power', 'f4', 9.96921e36),
+            'pixel_area': variable('pixel_area', 'f4', 9.96921e36),
+        }
+        for name in EXTRA_VARIABLES:
+            variables[name] = variable(name, 'f4', 9.96921e36)
+
+        # Linhas ao longo do traço (latitude crescente, leve inclinação) com
+        # PIXELS_PER_LINE pixels cada na direção transversal
+        for first_line in range(0, lines, block_lines):
+            line = np.arange(first_line, min(first_line + block_lines, lines))
+            along = np.repeat(line / lines, PIXELS_PER_LINE)
+            across = np.tile(np.linspace(0, 1, PIXELS_PER_LINE), len(line))
+            start = first_line * PIXELS_PER_LINE
+            stop = min(start + len(along), n_pixels)
+            size = stop - start
+            along, across = along[:size], across[:size]
+
+            classification = rng.choice(classes, size, p=weights).astype('u1')
+            water = np.isin(classification, (3, 4, 5))
+            height = np.where(water, 240.0 + rng.normal(0, 0.3, size), 250.0 + rng.normal(0, 8, size))
+            height[rng.random(size) < 0.02] = np.nan
+
+            values = {
+                'latitude': TILE_ORIGIN[1] + along * TILE_DEG + rng.normal(0, 1e-5, size),
+                'longitude': TILE_ORIGIN[0] + across * TILE_DEG + along * 0.05,
+                'height': height,
+                'classification': classification,
+                'coherent_power': rng.gamma(2.0, np.where(water, 200.0, 40.0)),
+                'pixel_area': rng.uniform(20, 80, size),
+            }
+            for name in EXTRA_VARIABLES:
+                values[name] = rng.random(size)
+
+            for name, values_block in values.items():
+                variables[name][start:stop] = np.ma.masked_invalid(values_block)
+
+    return path
+
+
+def make_regions(count, seed=0, size_deg=0.2):
+    """Regiões quadradas espalhadas numa área com o dobro do tile; parte cai fora do swath"""
+    rng = np.random.default_rng(seed + 1)
+    span = 2 * TILE_DEG
+    regions = []
+    for i in range(count):
+        lon = TILE_ORIGIN[0] - TILE_DEG / 2 + rng.random() * (span - size_deg)
+        lat = TILE_ORIGIN[1] - TILE_DEG / 2 + rng.random() * (span - size_deg)
+        regions.append({
+            'id': f'benchmark_{i}',
+            'name': f'Benchmark {i}',
+            'bbox': [round(lon, 4), round(lat, 4), round(lon + size_deg, 4), round(lat + size_deg, 4)],
+        })
+    return regions
+
+
+class StandInConnection:
+    """Substituto do PostgreSQL em processo para a carga
+
+    Responde às consultas de bulk_loader (layout de pixel_data, tabelas
+    derivadas, RETURNING granule_id) e consome os buffers do COPY.
+    """
+
+    def __init__(self, copy_format='binary', derived=True):
+        self.copy_format = copy_format
+        self.derived = derived
+        self.next_id = 0
+        self.copied_bytes = 0
+        self.statements = 0
+
+    def cursor(self):
+        return StandInCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class StandInCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+
+    def execute(self, sql, params=None):
+        self.connection.statements += 1
+        if 'information_schema.columns' in sql:
+            self.rows = [('latitude', 'real' if self.connection.copy_format == 'binary' else 'numeric')]
+        elif 'to_regclass' in sql:
+            self.rows = [(name,) for name in params[0]] if self.connection.derived else []
+        elif 'RETURNING granule_id' in sql:
+            self.connection.next_id += 1
+            self.rows = [(self.connection.next_id,)]
+        else:
+            self.rows = []
+
+    def executemany(self, sql, params):
+        for _ in params:
+            self.connection.statements += 1
+
+    def copy_expert(self, sql, buffer):
+        self.connection.copied_bytes += len(buffer.read())
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+def reset_peak_rss():
+    """Zerar o pico de memória (Linux); devolve False se não der para medir por estágio"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """Pico de memória residente (MB): desde o último reset_peak_rss no Linux,
+    senão desde o início do processo; None se não há como medir"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024, 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, 'peak_wset', info.rss) / 1024 ** 2, 1)
+    except ImportError:
+        return None
+
+
+def timed_stage(results, name, pixels, func, *args):
+    """Executar func medindo tempo e pico de memória; guarda em results[name]"""
+    reset_peak_rss()
+    start = time.perf_counter()
+    value = func(*args)
+    seconds = time.perf_counter() - start
+    results[name] = {
+        'seconds': round(seconds, 4),
+        'pixels': pixels,
+        'pixels_per_second': round(pixels / seconds) if seconds > 0 else None,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    return value
+
+
+def open_stage(path):
+    with open_pixel_cloud(path) as ds:
+        return ds.sizes[ds['latitude'].dims[0]]
+
+
+def load_stage(splits, granule_name, connection, acquired_at):
+    for region, region_df in splits:
+        if len(region_df) and not insert_granule_data(region_df, granule_name, region, connection, acquired_at):
+            raise RuntimeError(f"falha na carga de {granule_name}")
+
+
+def stream_stage(path, regions, granule_name, connection, acquired_at):
+    region_chunks = (
+        pair
+        for chunk in iter_pixel_cloud(path, regions)
+        for pair in split_by_region(chunk, regions)
+    )
+    totals = insert_granule_stream(region_chunks, granule_name, connection, acquired_at)
+    if totals is None:
+        raise RuntimeError(f"falha na carga em streaming de {granule_name}")
+    return sum(totals.values())
+
+
+def run_granule(path, total, regions, connection, label):
+    """Medir os estágios de um granule de total pixels; devolve {estágio: medidas}"""
+    results = {}
+    acquired_at = BENCHMARK_ACQUISITION
+
+    timed_stage(results, 'open', total, open_stage, path)
+    df = timed_stage(results, 'extract', total, read_pixel_cloud, path, regions)
+    splits = timed_stage(results, 'filter', len(df), split_by_region, df, regions)
+    timed_stage(results, 'load', len(df), load_stage, splits, f"{label}_load", connection, acquired_at)
+    del df, splits
+
+    timed_stage(results, 'stream', total, stream_stage, path, regions, f"{label}_stream", connection, acquired_at)
+    return results
+
+
+def best_of(runs):
+    """Para cada estágio, a repetição mais rápida (pico de memória: o maior)"""
+    best = {}
+    for stage in STAGES:
+        measured = [run[stage] for run in runs]
+        fastest = min(measured, key=lambda m: m['seconds'])
+        best[stage] = dict(fastest, runs=[m['seconds'] for m in measured])
+        best[stage]['peak_rss_mb'] = max((m['peak_rss_mb'] or 0) for m in measured) or None
+    return best
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def connect_database():
+    from database.connection import DatabaseConnection
+
+    database = DatabaseConnection()
+    if not database.test_connection():
+        raise RuntimeError("sem conexão com o banco do .env")
+    return database
+
+
+def cleanup_database(database, stamp):
+    """Apagar tudo o que a execução gravou no banco: granules (e, em cascata,
+    pixels, resumos e níveis), contadores, níveis por passagem e a partição
+    do mês de BENCHMARK_ACQUISITION, se ficou vazia"""
+    from database.ingest_stats import existing_tables
+    from database.partitions import partition_name
+
+    partition = partition_name(BENCHMARK_ACQUISITION)
+    with database.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM granules WHERE granule_name LIKE %s", (f"benchmark_{stamp}_%",))
+            tables = existing_tables(cursor, ['region_ingest_stats', 'water_level_pass', partition])
+            if 'region_ingest_stats' in tables:
+                cursor.execute("DELETE FROM region_ingest_stats WHERE region_id LIKE 'benchmark_%'")
+            if 'water_level_pass' in tables:
+                cursor.execute("DELETE FROM water_level_pass WHERE region_id LIKE 'benchmark_%'")
+            if partition in tables:
+                cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {partition})")
+                if not cursor.fetchone()[0]:
+                    cursor.execute(f"DROP TABLE {partition}")
+        conn.commit()
+
+
+def compare(report, previous, tolerance):
+    """Mostrar a variação de pixels/s contra um JSON anterior; devolve o número de regressões"""
+    regressions = 0
+    print(f"\n Comparação com {previous.get('commit') or '?'} ({previous.get('created_at')})")
+
+    for size, stages in report['sizes'].items():
+        old_stages = previous.get('sizes', {}).get(size)
+        if not old_stages:
+            print(f"   {size} pixels: sem medida anterior")
+            continue
+        for stage, measured in stages.items():
+            old = old_stages.get(stage)
+            if not old or not old.get('pixels_per_second') or not measured.get('pixels_per_second'):
+                continue
+            ratio = measured['pixels_per_second'] / old['pixels_per_second']
+            flag = ''
+            if ratio < 1 - tolerance:
+                flag = '  <- REGRESSÃO'
+                regressions += 1
+            print(f"   {size} {stage}: {old['pixels_per_second']:,} -> {measured['pixels_per_second']:,} pixels/s ({ratio:.2f}x){flag}")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark da ingestão com PIXC sintéticos')
+    parser.add_argument('--pixels', type=int, nargs='+', default=[1000000], help='tamanhos dos granules sintéticos')
+    parser.add_argument('--regions', type=int, default=8, help='regiões sintéticas')
+    parser.add_argument('--repeat', type=int, default=3, help='repetições por tamanho (vale a mais rápida)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', help='guardar/reutilizar os NetCDF gerados aqui (padrão: temporário)')
+    parser.add_argument('--db', action='store_true', help='carregar no PostgreSQL do .env em vez do substituto')
+    parser.add_argument('--json', help='gravar resultados neste arquivo')
+    parser.add_argument('--compare', help='JSON de uma execução anterior para comparar')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='queda de pixels/s tolerada no --compare')
+    args = parser.parse_args()
+
+    regions = make_regions(args.regions, args.seed)
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    database = connect_database() if args.db else None
+
+    report = {
+        'benchmark': 'pipeline',
+        'commit': git_commit(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'backend': 'postgresql' if args.db else 'stand-in',
+        'regions': len(regions),
+        'repeat': args.repeat,
+        'seed': args.seed,
+        'peak_rss_per_stage': reset_peak_rss(),
+        'sizes': {},
+    }
+
+    with tempfile.TemporaryDirectory() as scratch:
+        data_dir = Path(args.data_dir or scratch)
+        data_dir.mkdir(parents=True, exist_ok=True)
+
+        try:
+            for n_pixels in args.pixels:
+                path = data_dir / f"pixc_synthetic_{n_pixels}_{args.seed}.nc"
+                if not path.exists():
+                    print(f" Gerando {path.name}...")
+                    make_pixc_file(path, n_pixels, args.seed)
+
+                print(f" Benchmark com {n_pixels:,} pixels ({path.stat().st_size / 1024 ** 2:.0f} MB), {len(regions)} regiões")
+                runs = []
+                for repeat in range(args.repeat):
+                    label = f"benchmark_{stamp}_{n_pixels}_{repeat}"
+                    if database is not None:
+                        with database.connection() as conn:
+                            runs.append(run_granule(path, n_pixels, regions, conn, label))
+                    else:
+                        runs.append(run_granule(path, n_pixels, regions, StandInConnection(), label))
+
+                best = best_of(runs)
+                report['sizes'][str(n_pixels)] = best
+                for stage, measured in best.items():
+                    print(
+                        f"   {stage}: {measured['seconds']:.3f}s, {measured['pixels']:,} pixels "
+                        f"({measured['pixels_per_second'] or 0:,} pixels/s), pico {measured['peak_rss_mb']} MB"
+                    )
+        finally:
+            if database is not None:
+                cleanup_database(database, stamp)
+                database.close()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n Resultados gravados em {args.json}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"   {regressions} estágios mais lentos que a tolerância ({args.tolerance:.0%})")
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
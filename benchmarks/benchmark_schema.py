@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark do layout de pixel_data: schema original (DECIMAL + pixel_id +
+created_at) x schema compacto (REAL/SMALLINT, migração 1)
+Cria tabelas temporárias no banco do .env, carrega pixels sintéticos com
+COPY e mede tamanho total (heap + índices) e taxa de inserção
+"""
+import sys
+import os
+import argparse
+import json
+import time
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'src'))
+
+from database.bulk_loader import copy_pixels
+from benchmark_insert import make_synthetic_pixels
+import psycopg2
+
+LAYOUTS = {
+    'original': ("""
+        CREATE TEMP TABLE bench_pixels_original (
+            pixel_id BIGSERIAL PRIMARY KEY,
+            granule_id INTEGER NOT NULL,
+            latitude DECIMAL(10,6) NOT NULL,
+            longitude DECIMAL(11,6) NOT NULL,
+            height_m DECIMAL(8,3),
+            classification_id INTEGER,
+            coherent_power DECIMAL(15,6),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX ON bench_pixels_original(granule_id);
+        CREATE INDEX ON bench_pixels_original(latitude, longitude);
+        CREATE INDEX ON bench_pixels_original(classification_id);
+    """, 'text'),
+    'compact': ("""
+        CREATE TEMP TABLE bench_pixels_compact (
+            granule_id INTEGER NOT NULL,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            height_m REAL,
+            classification_id SMALLINT,
+            coherent_power REAL
+        );
+        CREATE INDEX ON bench_pixels_compact(granule_id);
+        CREATE INDEX ON bench_pixels_compact(latitude, longitude);
+        CREATE INDEX ON bench_pixels_compact(classification_id);
+    """, 'binary'),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de layout de pixel_data')
+    parser.add_argument('--pixels', type=int, default=1000000, help='pixels sintéticos')
+    parser.add_argument('--json', help='gravar resultados neste arquivo')
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    conn = psycopg2.connect(
+        host=os.getenv('DB_HOST'),
+        port=os.getenv('DB_PORT'),
+        database=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD')
+    )
+    cursor = conn.cursor()
+
+    df = make_synthetic_pixels(args.pixels)
+    print(f" Benchmark de schema com {len(df):,} pixels sintéticos")
+
+    results = {}
+    for layout, (ddl, copy_format) in LAYOUTS.items():
+        table = f"bench_pixels_{layout}"
+        cursor.execute(ddl)
+
+        start = time.perf_counter()
+        copy_pixels(cursor, 1, df, copy_format=copy_format, table=table)
+        conn.commit()
+        seconds = time.perf_counter() - start
+
+        cursor.execute(f"ANALYZE {table}")
+        cursor.execute("SELECT pg_relation_size(%s), pg_total_relation_size(%s)", (table, table))
+        heap_bytes, total_bytes = cursor.fetchone()
+
+        results[layout] = {
+            'insert_seconds': round(seconds, 3),
+            'rows_per_second': round(len(df) / seconds),
+            'heap_bytes': heap_bytes,
+            'total_bytes': total_bytes,
+            'bytes_per_row': round(total_bytes / len(df), 1),
+        }
+        print(
+            f"   {layout}: {seconds:.2f}s ({len(df) / seconds:,.0f} linhas/s), "
+            f"{total_bytes / 1024 ** 2:.1f} MB ({total_bytes / len(df):.1f} bytes/linha)"
+        )
+
+    cursor.close()
+    conn.close()
+
+    ratio = results['original']['total_bytes'] / results['compact']['total_bytes']
+    print(f"   Compacto ocupa {ratio:.1f}x menos")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'pixels': len(df), 'layouts': results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
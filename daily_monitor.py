@@ -4,31 +4,23 @@ Monitor diário para dados SWOT
 Verifica automaticamente se há novos dados nas regiões configuradas
 """
 import sys
-import os
 from datetime import datetime, timedelta
 sys.path.append('src')
 
 from core.swot_downloader import SWOTDownloader
 from utils.config import get_regions
 from utils.logger import setup_logger
+from database.bulk_loader import insert_granule_data
+from database.granule_registry import GranuleRegistry
 from database.connection import DatabaseConnection
+from database.sync_state import RegionSyncState, high_water_mark
+from core.granule_planner import extract_acquisition_start
+from core.region_index import split_by_region
 import tempfile
 import xarray as xr
 import pandas as pd
 import geopandas as gpd
 from shapely.geometry import Point
-import psycopg2
-
-def check_granule_exists(granule_name, db_connection):
-    """Verificar se granule já existe no banco"""
-    try:
-        cursor = db_connection.cursor()
-        cursor.execute("SELECT COUNT(*) FROM granules WHERE granule_name = %s", (granule_name,))
-        count = cursor.fetchone()[0]
-        cursor.close()
-        return count > 0
-    except:
-        return False
 
 def extract_granule_name(granule):
     """Extrair nome do granule"""
@@ -87,14 +79,9 @@ def process_netcdf_file(file_path, region):
             df = df.dropna(subset=['latitude', 'longitude'])
             print(f"   Apos limpeza: {len(df)} pixels validos")
             
-            # Filtrar por região se especificado
+            # Filtrar por região se especificado (polígono quando configurado, senão bbox)
             if region and 'bbox' in region:
-                bbox = region['bbox']
-                mask = (
-                    (df['longitude'] >= bbox[0]) & (df['longitude'] <= bbox[2]) &
-                    (df['latitude'] >= bbox[1]) & (df['latitude'] <= bbox[3])
-                )
-                df = df[mask]
+                df = split_by_region(df, [region], buffer=0)[0][1]
                 print(f"   Apos filtro regional: {len(df)} pixels")
             
             return df
@@ -103,53 +90,28 @@ def process_netcdf_file(file_path, region):
         print(f"ERRO processando NetCDF: {e}")
         return None
 
-def insert_granule_data(df, granule_name, region, db_connection):
-    """Inserir dados no banco"""
+def record_failure(registry, granule_name, region, error):
+    """Registrar tentativa que falhou; após MAX_GRANULE_ATTEMPTS o granule é abandonado"""
     try:
-        cursor = db_connection.cursor()
-        
-        # Inserir granule
-        cursor.execute("""
-            INSERT INTO granules (granule_name, mission_id, region_id, total_pixels, created_at)
-            VALUES (%s, 1, %s, %s, %s)
-            RETURNING granule_id
-        """, (granule_name, region.get('id'), len(df), datetime.now()))
-        
-        granule_id = cursor.fetchone()[0]
-        print(f"   Granule inserido com ID: {granule_id}")
-        
-        # Inserir pixels em lotes
-        batch_size = 1000
-        for i in range(0, len(df), batch_size):
-            batch = df.iloc[i:i+batch_size]
-            
-            insert_data = []
-            for _, row in batch.iterrows():
-                insert_data.append((
-                    granule_id,
-                    float(row['latitude']),
-                    float(row['longitude']),
-                    float(row.get('height', None)) if 'height' in row and pd.notna(row['height']) else None,
-                    int(row.get('classification', None)) if 'classification' in row and pd.notna(row['classification']) else None,
-                    float(row.get('coherent_power', None)) if 'coherent_power' in row and pd.notna(row['coherent_power']) else None,
-                    datetime.now()
-                ))
-            
-            cursor.executemany("""
-                INSERT INTO pixel_data (granule_id, latitude, longitude, height_m, classification_id, coherent_power, created_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """, insert_data)
-            
-            print(f"   Inserido lote {i//batch_size + 1}: {len(batch)} pixels")
-        
-        db_connection.commit()
-        cursor.close()
-        return True
-        
+        attempts = registry.record_failure(granule_name, region.get('id'), error)
+        if attempts >= registry.max_attempts:
+            print(f"   AVISO: {attempts} tentativas falharam, granule abandonado")
     except Exception as e:
-        print(f"ERRO inserindo dados: {e}")
-        db_connection.rollback()
-        return False
+        print(f"   ERRO: Falha registrando tentativa: {e}")
+
+def advance_region(sync_state, region, results, registry):
+    """Avançar a marca d'água da região até o último granule concluído em sequência"""
+    region_id = region.get('id')
+    mark = high_water_mark(
+        results,
+        lambda granule: (
+            registry.is_done(extract_granule_name(granule), region_id) or
+            sync_state.is_completed(extract_granule_name(granule), region_id)
+        ),
+        extract_acquisition_start
+    )
+    if sync_state.advance(region_id, mark):
+        print(f"   SINCRONIZADO ate {mark}")
 
 def main():
     """Função principal do monitor"""
@@ -160,18 +122,12 @@ def main():
     
     try:
         # Conectar ao banco
-        from dotenv import load_dotenv
-        load_dotenv()
-        
-        db_conn = psycopg2.connect(
-            host=os.getenv('DB_HOST'),
-            port=os.getenv('DB_PORT'),
-            database=os.getenv('DB_NAME'),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD')
-        )
+        database = DatabaseConnection()
+        db_conn = database.getconn()
         
         print("Conectado ao banco de dados")
+        registry = GranuleRegistry(database)
+        sync_state = RegionSyncState(database)
         
         # Inicializar downloader
         downloader = SWOTDownloader()
@@ -182,12 +138,21 @@ def main():
         
         total_new_granules = 0
         
+        # Buscar novos dados desde a última aquisição ingerida (com sobreposição),
+        # uma consulta por grupo de regiões próximas
+        region_results = downloader.search_regions(
+            regions,
+            window=lambda region: sync_state.window(region.get('id'))
+        )
+        
         # Processar cada região
-        for region in regions:
+        for region, results in region_results:
             print(f"\nVERIFICANDO regiao: {region['name']}")
             
-            # Buscar novos dados
-            results = downloader.search_data(region, days_back=2)
+            results = sorted(
+                results,
+                key=lambda granule: extract_acquisition_start(granule) or datetime.min
+            )
             
             if not results:
                 print(f"   INFO: Nenhum dado encontrado")
@@ -195,15 +160,18 @@ def main():
             
             print(f"   ENCONTRADOS: {len(results)} granules")
             
-            # Verificar quais são novos
-            new_granules = []
-            for granule in results:
-                granule_name = extract_granule_name(granule)
-                if not check_granule_exists(granule_name, db_conn):
-                    new_granules.append(granule)
+            # Verificar quais são novos para esta região (granules que falharam
+            # vezes demais também saem)
+            granule_names = [extract_granule_name(granule) for granule in results]
+            registry.resolve(granule_names)
+            new_granules = [
+                granule for granule, granule_name in zip(results, granule_names)
+                if not registry.is_done(granule_name, region.get('id'))
+            ]
             
             if not new_granules:
                 print(f"   INFO: Nenhum dado novo ({len(results)} ja processados)")
+                advance_region(sync_state, region, results, registry)
                 continue
             
             print(f"   NOVOS: {len(new_granules)} novos granules encontrados")
@@ -228,18 +196,27 @@ def main():
                             if df is not None and len(df) > 0:
                                 # Inserir no banco
                                 if insert_granule_data(df, granule_name, region, db_conn):
+                                    registry.mark(granule_name, region.get('id'))
                                     print(f"   SUCESSO: {len(df)} pixels inseridos")
                                     total_new_granules += 1
                                 else:
                                     print(f"   ERRO: Falha inserindo dados")
-                            else:
+                                    record_failure(registry, granule_name, region, 'erro na inserção')
+                            elif df is not None:
+                                sync_state.complete(granule_name, region.get('id'))
                                 print(f"   AVISO: Nenhum pixel valido")
+                            else:
+                                record_failure(registry, granule_name, region, 'falha na leitura do NetCDF')
                         else:
                             print(f"   ERRO: Falha no download")
+                            record_failure(registry, granule_name, region, 'falha no download')
                             
                 except Exception as e:
                     print(f"   ERRO: Erro processando granule: {e}")
+                    record_failure(registry, granule_name, region, e)
                     continue
+            
+            advance_region(sync_state, region, results, registry)
         
         # Resumo final
         if total_new_granules > 0:
@@ -247,7 +224,8 @@ def main():
         else:
             print(f"\nINFO: Monitor completado - Nenhum dado novo encontrado")
         
-        db_conn.close()
+        database.putconn(db_conn)
+        database.close()
         
     except Exception as e:
         print(f"ERRO: Erro no monitor: {e}")
@@ -1,24 +1,58 @@
 #!/usr/bin/env python3
 """
 Dashboard simples do sistema SWOT
+Uso: python dashboard.py [--exact] [--refresh]
+
+Os totais vêm de region_ingest_stats (mantida pela carga); sem ela, de
+estimativas do planner (pg_class.reltuples). --exact volta ao COUNT(*).
+Pixels são os que estão em pixel_data (sem partições retiradas nem
+granules gravados só fora do banco).
 """
 import sys
+import argparse
+import time
 sys.path.append('src')
 
-import psycopg2
-from dotenv import load_dotenv
-import os
+from database.connection import DatabaseConnection
+from database.ingest_stats import STATS_TABLE, existing_tables, refresh_ingest_stats, estimated_rows
 
-def show_status():
-    load_dotenv()
+def exact_status(cursor):
+    """Totais e regiões contando as tabelas (lento em bases grandes)"""
+    cursor.execute("SELECT COUNT(*) FROM pixel_data;")
+    total_pixels = cursor.fetchone()[0]
+    
+    cursor.execute("""
+        SELECT g.region_id, COUNT(*) as granules, COALESCE(SUM(p.pixels), 0) as pixels
+        FROM granules g
+        LEFT JOIN (
+            SELECT granule_id, COUNT(*) AS pixels FROM pixel_data GROUP BY granule_id
+        ) p ON p.granule_id = g.granule_id
+        GROUP BY g.region_id 
+        ORDER BY granules DESC;
+    """)
+    regions = cursor.fetchall()
     
-    conn = psycopg2.connect(
-        host=os.getenv('DB_HOST'),
-        port=os.getenv('DB_PORT'),
-        database=os.getenv('DB_NAME'),
-        user=os.getenv('DB_USER'),
-        password=os.getenv('DB_PASSWORD')
-    )
+    return sum(row[1] for row in regions), total_pixels, regions, 'exato'
+
+def counter_status(cursor):
+    """Totais e regiões a partir dos contadores mantidos pela carga"""
+    cursor.execute(f"""
+        SELECT region_id, granules, pixels
+        FROM {STATS_TABLE}
+        ORDER BY granules DESC;
+    """)
+    regions = cursor.fetchall()
+    
+    return sum(row[1] for row in regions), sum(row[2] for row in regions), regions, 'contadores'
+
+def estimated_status(cursor):
+    """Só estimativas do planner (sem contadores por região)"""
+    return estimated_rows(cursor, 'granules') or 0, estimated_rows(cursor, 'pixel_data') or 0, [], 'estimativa'
+
+def show_status(exact=False, refresh=False):
+    started = time.perf_counter()
+    database = DatabaseConnection()
+    conn = database.getconn()
     
     cursor = conn.cursor()
     
@@ -26,28 +60,29 @@ def show_status():
     print(" STATUS SWOT MONITOR")
     print("="*50)
     
-    # Totais
-    cursor.execute("SELECT COUNT(*) FROM granules;")
-    total_granules = cursor.fetchone()[0]
+    has_counters = STATS_TABLE in existing_tables(cursor, [STATS_TABLE])
     
-    cursor.execute("SELECT COUNT(*) FROM pixel_data;")
-    total_pixels = cursor.fetchone()[0]
+    if refresh and has_counters:
+        refresh_ingest_stats(cursor)
+        conn.commit()
     
-    print(f" Total Granules: {total_granules:,}")
-    print(f" Total Pixels: {total_pixels:,}")
+    # Totais
+    if exact:
+        total_granules, total_pixels, regions, source = exact_status(cursor)
+    elif has_counters:
+        total_granules, total_pixels, regions, source = counter_status(cursor)
+    else:
+        total_granules, total_pixels, regions, source = estimated_status(cursor)
     
-    # Por região
-    cursor.execute("""
-        SELECT region_id, COUNT(*) as granules, SUM(total_pixels) as pixels
-        FROM granules 
-        GROUP BY region_id 
-        ORDER BY granules DESC;
-    """)
+    print(f" Total Granules: {total_granules:,} ({source})")
+    print(f" Total Pixels: {total_pixels:,} ({source})")
     
-    print(f"\n Por Região:")
-    for row in cursor.fetchall():
-        region, granules, pixels = row
-        print(f"   {region}: {granules} granules ({pixels:,} pixels)")
+    # Por região
+    if regions:
+        print(f"\n Por Região:")
+        for row in regions:
+            region, granules, pixels = row
+            print(f"   {region}: {granules} granules ({pixels:,} pixels)")
     
     # Últimos
     cursor.execute("""
@@ -60,12 +95,19 @@ def show_status():
     print(f"\n Últimos Processamentos:")
     for row in cursor.fetchall():
         name, pixels, created = row
-        print(f"   {created}: {pixels:,} pixels")
+        print(f"   {created}: {pixels or 0:,} pixels")
     
     cursor.close()
-    conn.close()
+    database.putconn(conn)
+    database.close()
+    print(f"\n Consultado em {time.perf_counter() - started:.2f}s")
     print("="*50)
 
 if __name__ == "__main__":
-    show_status()
-    input("Pressione Enter...")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Dashboard SWOT')
+    parser.add_argument('--exact', action='store_true', help='contar as tabelas (COUNT(*)) em vez de usar contadores')
+    parser.add_argument('--refresh', action='store_true', help='recalcular os contadores (granules e pixels em pixel_data; varre pixel_data)')
+    args = parser.parse_args()
+    
+    show_status(exact=args.exact, refresh=args.refresh)
+    input("Pressione Enter...")
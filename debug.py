@@ -9,28 +9,21 @@ from datetime import datetime, timedelta
 sys.path.append('src')
 
 from core.swot_downloader import SWOTDownloader
+from core.granule_cache import GranuleCache
+from core.granule_planner import extract_acquisition_start
+from core.pixel_store import PixelStore, store_granule
 from utils.config import get_regions
 from utils.logger import setup_logger
+from database.bulk_loader import insert_granule_data
+from database.granule_registry import GranuleRegistry
 from database.connection import DatabaseConnection
 import tempfile
 import xarray as xr
 import pandas as pd
 import geopandas as gpd
 from shapely.geometry import Point
-import psycopg2
 import earthaccess
 
-def check_granule_exists(granule_name, db_connection):
-    """Verificar se granule já existe no banco"""
-    try:
-        cursor = db_connection.cursor()
-        cursor.execute("SELECT COUNT(*) FROM granules WHERE granule_name = %s", (granule_name,))
-        count = cursor.fetchone()[0]
-        cursor.close()
-        return count > 0
-    except:
-        return False
-
 def extract_granule_name(granule):
     """Extrair nome do granule - VERSÃO CORRIGIDA"""
     try:
@@ -48,12 +41,21 @@ def extract_granule_name(granule):
     except:
         return f"unknown_granule_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
 
+_downloader = None
+PIXEL_STORE_DIR = os.getenv('PIXEL_STORE_DIR') or None
+
+def get_downloader():
+    """SWOTDownloader compartilhado: uma sessão Earthdata para toda a execução"""
+    global _downloader
+    if _downloader is None:
+        _downloader = SWOTDownloader(cache=GranuleCache())
+    return _downloader
+
 def search_swot_data_corrected(region, start_date, end_date):
     """Buscar dados SWOT usando método funcionando"""
     try:
-        # Autenticar usando earthaccess
-        auth = earthaccess.login()
-        if not auth:
+        # Autenticar usando earthaccess (login só na primeira chamada)
+        if not get_downloader().authenticate():
             print("   ERRO: Falha na autenticação earthaccess")
             return []
         
@@ -81,14 +83,32 @@ def search_swot_data_corrected(region, start_date, end_date):
         return []
 
 def download_swot_data_corrected(granules, temp_dir):
-    """Download usando earthaccess - método funcionando"""
+    """Download usando earthaccess - passa pelo cache local de granules"""
     try:
-        downloaded_files = earthaccess.download(granules, temp_dir)
+        downloaded_files = get_downloader().download_data(granules, temp_dir)
         return downloaded_files
     except Exception as e:
         print(f"   ERRO no download earthaccess: {e}")
         return []
 
+def load_stored_pixels(granule_name, region):
+    """Pixels do granule/região no armazenamento local (PIXEL_STORE_DIR), ou None"""
+    if not PIXEL_STORE_DIR:
+        return None
+    store = PixelStore(PIXEL_STORE_DIR)
+    if not store.has(region.get('id'), granule_name):
+        return None
+    return store.frame(region.get('id'), granule_name)
+
+def save_stored_pixels(df, granule_name, region, granule):
+    """Guardar os pixels processados para as próximas análises não baixarem de novo"""
+    if not PIXEL_STORE_DIR or df is None or len(df) == 0:
+        return
+    try:
+        store_granule(df, granule_name, region.get('id'), extract_acquisition_start(granule), PIXEL_STORE_DIR)
+    except Exception as e:
+        print(f"   AVISO: Falha gravando armazenamento local: {e}")
+
 def process_netcdf_file_corrected(file_path, region):
     """Processar arquivo NetCDF - BASEADO NO CÓDIGO FUNCIONANDO"""
     try:
@@ -146,54 +166,6 @@ def process_netcdf_file_corrected(file_path, region):
         traceback.print_exc()
         return None
 
-def insert_granule_data(df, granule_name, region, db_connection):
-    """Inserir dados no banco"""
-    try:
-        cursor = db_connection.cursor()
-        
-        # Inserir granule
-        cursor.execute("""
-            INSERT INTO granules (granule_name, mission_id, region_id, total_pixels, created_at)
-            VALUES (%s, 1, %s, %s, %s)
-            RETURNING granule_id
-        """, (granule_name, region.get('id'), len(df), datetime.now()))
-        
-        granule_id = cursor.fetchone()[0]
-        print(f"   Granule inserido com ID: {granule_id}")
-        
-        # Inserir pixels em lotes
-        batch_size = 1000
-        for i in range(0, len(df), batch_size):
-            batch = df.iloc[i:i+batch_size]
-            
-            insert_data = []
-            for _, row in batch.iterrows():
-                insert_data.append((
-                    granule_id,
-                    float(row['latitude']),
-                    float(row['longitude']),
-                    float(row.get('height', None)) if 'height' in row and pd.notna(row['height']) else None,
-                    int(row.get('classification', None)) if 'classification' in row and pd.notna(row['classification']) else None,
-                    float(row.get('coherent_power', None)) if 'coherent_power' in row and pd.notna(row['coherent_power']) else None,
-                    datetime.now()
-                ))
-            
-            cursor.executemany("""
-                INSERT INTO pixel_data (granule_id, latitude, longitude, height_m, classification_id, coherent_power, created_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """, insert_data)
-            
-            print(f"   Inserido lote {i//batch_size + 1}: {len(batch)} pixels")
-        
-        db_connection.commit()
-        cursor.close()
-        return True
-        
-    except Exception as e:
-        print(f"   ERRO inserindo dados: {e}")
-        db_connection.rollback()
-        return False
-
 def main():
     """Função principal do monitor - VERSÃO CORRIGIDA"""
     
@@ -203,18 +175,11 @@ def main():
     
     try:
         # Conectar ao banco
-        from dotenv import load_dotenv
-        load_dotenv()
-        
-        db_conn = psycopg2.connect(
-            host=os.getenv('DB_HOST'),  
-            port=os.getenv('DB_PORT'),
-            database=os.getenv('DB_NAME'),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD')
-        )
+        database = DatabaseConnection()
+        db_conn = database.getconn()
         
         print("Conectado ao banco de dados")
+        registry = GranuleRegistry(database)
         
         # Obter regiões ativas
         regions = get_regions()
@@ -242,11 +207,12 @@ def main():
             print(f"   ENCONTRADOS: {len(results)} granules")
             
             # Verificar quais são novos
-            new_granules = []
-            for granule in results:
-                granule_name = extract_granule_name(granule)
-                if not check_granule_exists(granule_name, db_conn):
-                    new_granules.append(granule)
+            granule_names = [extract_granule_name(granule) for granule in results]
+            registry.resolve(granule_names)
+            new_granules = [
+                granule for granule, granule_name in zip(results, granule_names)
+                if not registry.exists(granule_name, region.get('id'))
+            ]
             
             if not new_granules:
                 print(f"   INFO: Nenhum dado novo ({len(results)} já processados)")
@@ -260,28 +226,36 @@ def main():
                     granule_name = extract_granule_name(granule)
                     print(f"   PROCESSANDO: {granule_name}")
                     
-                    # Download usando earthaccess
-                    with tempfile.TemporaryDirectory() as temp_dir:
-                        print(f"   Baixando para: {temp_dir}")
-                        files = download_swot_data_corrected([granule], temp_dir)
-                        
-                        if files:
+                    # Pixels já guardados no armazenamento local dispensam o download
+                    df = load_stored_pixels(granule_name, region)
+                    if df is not None:
+                        print(f"   Armazenamento local: {len(df)} pixels (sem download)")
+                    else:
+                        # Download usando earthaccess
+                        with tempfile.TemporaryDirectory() as temp_dir:
+                            print(f"   Baixando para: {temp_dir}")
+                            files = download_swot_data_corrected([granule], temp_dir)
+                            
+                            if not files:
+                                print(f"   ERRO: Falha no download")
+                                continue
+                            
                             print(f"   Arquivo baixado: {files[0]}")
                             
                             # Processar arquivo
                             df = process_netcdf_file_corrected(files[0], region)
-                            
-                            if df is not None and len(df) > 0:
-                                # Inserir no banco
-                                if insert_granule_data(df, granule_name, region, db_conn):
-                                    print(f"   SUCESSO: {len(df)} pixels inseridos")
-                                    total_new_granules += 1
-                                else:
-                                    print(f"   ERRO: Falha inserindo dados")
-                            else:
-                                print(f"   AVISO: Nenhum pixel válido")
+                            save_stored_pixels(df, granule_name, region, granule)
+                    
+                    if df is not None and len(df) > 0:
+                        # Inserir no banco
+                        if insert_granule_data(df, granule_name, region, db_conn):
+                            registry.mark(granule_name, region.get('id'))
+                            print(f"   SUCESSO: {len(df)} pixels inseridos")
+                            total_new_granules += 1
                         else:
-                            print(f"   ERRO: Falha no download")
+                            print(f"   ERRO: Falha inserindo dados")
+                    else:
+                        print(f"   AVISO: Nenhum pixel válido")
                             
                 except Exception as e:
                     print(f"   ERRO: Erro processando granule: {e}")
@@ -293,7 +267,8 @@ def main():
         else:
             print(f"\nINFO: Monitor completado - Nenhum dado novo encontrado")
         
-        db_conn.close()
+        database.putconn(db_conn)
+        database.close()
         
     except Exception as e:
         print(f"ERRO: Erro no monitor: {e}")
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Partições mensais de pixel_data: listar e aplicar retenção
+Uso: python manage_partitions.py [--retain-months N] [--drop]
+"""
+import sys
+import argparse
+from datetime import date
+sys.path.append('src')
+
+from database.partitions import list_partitions, retire_partitions, month_start
+from database.connection import DatabaseConnection
+
+def main():
+    parser = argparse.ArgumentParser(description='Partições de pixel_data')
+    parser.add_argument('--retain-months', type=int, help='manter só os últimos N meses')
+    parser.add_argument('--drop', action='store_true', help='apagar (em vez de só desanexar) as partições antigas')
+    args = parser.parse_args()
+
+    database = DatabaseConnection()
+    conn = database.getconn()
+
+    cursor = conn.cursor()
+    partitions = list_partitions(cursor)
+    conn.commit()
+    cursor.close()
+
+    print(f" {len(partitions)} partições:")
+    for name in partitions:
+        print(f"   {name}")
+
+    if args.retain_months:
+        today = month_start(date.today())
+        months = today.year * 12 + today.month - 1 - (args.retain_months - 1)
+        cutoff = date(months // 12, months % 12 + 1, 1)
+
+        retired = retire_partitions(conn, cutoff, drop=args.drop)
+        action = 'apagadas' if args.drop else 'desanexadas'
+        print(f"\n {len(retired)} partições anteriores a {cutoff} {action}")
+
+    database.putconn(conn)
+    database.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
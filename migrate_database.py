@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Aplicar migrações pendentes do schema SWOT
+Uso: python migrate_database.py [--postgis]
+"""
+import sys
+import argparse
+sys.path.append('src')
+
+from database.migrations import apply_migrations, current_version, enable_postgis
+from database.connection import DatabaseConnection
+
+def main():
+    parser = argparse.ArgumentParser(description='Migrações do banco SWOT')
+    parser.add_argument('--postgis', action='store_true', help='adicionar coluna geom (PostGIS) em pixel_data')
+    args = parser.parse_args()
+
+    database = DatabaseConnection()
+    conn = database.getconn()
+
+    cursor = conn.cursor()
+    print(f" Versão atual do schema: {current_version(cursor)}")
+    conn.commit()
+    cursor.close()
+
+    applied = apply_migrations(conn)
+    print(f" {len(applied)} migrações aplicadas")
+
+    if args.postgis and enable_postgis(conn):
+        print(" Coluna geom (PostGIS) disponível")
+
+    database.putconn(conn)
+    database.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,348 +5,520 @@ Configurado para suas regiões específicas
 """
 import sys
 import os
+import argparse
+import logging
 from datetime import datetime, timedelta
 sys.path.append('src')
 
 from core.swot_downloader import SWOTDownloader
+from core.granule_cache import GranuleCache
+from core.footprints import merge_region_clusters
+from core.pipeline import Pipeline, Stage
+from core.granule_planner import plan_granules, extract_granule_name, extract_acquisition_start
+from core.region_index import split_by_region
+from core.parallel_decode import DecodePool
+from core.pixc_reader import read_pixel_cloud, iter_pixel_cloud, GranuleTooLarge
+from core.pixel_archive import GranuleArchive, archive_chunks, write_granule
+from core.pixel_store import GranuleStore, store_granule
 from utils.config import get_regions
 from utils.logger import setup_logger
-import psycopg2
+from utils.metrics import RunMetrics
+from utils.profiling import RunProfiler, PROFILE_MODES
+from database.connection import DatabaseConnection
+from database.bulk_loader import insert_granule_data, insert_granule_stream
+from database.granule_registry import GranuleRegistry
+from database.sync_state import RegionSyncState, backfill_windows, high_water_mark, BACKFILL_CHUNK_DAYS
 import tempfile
-import xarray as xr
-import pandas as pd
+import shutil
 
 # CONFIGURAÇÕES DE PRODUÇÃO
 MAX_GRANULES_PER_REGION = 5  # Máximo por região
 MAX_EXECUTION_TIME_MINUTES = 45  # Timeout
-MAX_PIXELS_PER_GRANULE = 500000  # Pular granules muito grandes
+MAX_PIXELS_PER_GRANULE = 500000  # Acima disso o granule é carregado em streaming
+SEARCH_WORKERS = 4  # Buscas simultâneas no CMR (uma por grupo de regiões próximas)
+DOWNLOAD_WORKERS = 3  # Downloads simultâneos
+DOWNLOAD_PREFETCH = 2  # Granules baixados à frente do que está sendo processado
+DECODE_PROCESSES = max(1, (os.cpu_count() or 2) - 1)  # Processos de decodificação de NetCDF
+LOAD_QUEUE_SIZE = 2  # Granules decodificados aguardando o banco
+GRANULE_CACHE_DIR = 'data/cache'  # Cache persistente de granules baixados
+GRANULE_CACHE_MAX_GB = 50  # Orçamento do cache (LRU)
+PIXEL_ARCHIVE_DIR = os.getenv('PIXEL_ARCHIVE_DIR') or None  # Arquivo Parquet dos pixels (desligado se vazio)
+PIXEL_STORE_DIR = os.getenv('PIXEL_STORE_DIR') or None  # Armazenamento local (memmap) dos pixels (desligado se vazio)
+STORE_PIXELS_IN_DATABASE = os.getenv('STORE_PIXELS_IN_DATABASE', '1') != '0'  # 0: pixels só fora do banco
+METRICS_DIR = 'logs'  # Relatório JSON de cada execução (run_AAAAMMDD_HHMMSS.json)
+METRICS_TEXTFILE = os.getenv('METRICS_TEXTFILE') or None  # Textfile do node_exporter (desligado se vazio)
 
-def process_region_optimized(region, downloader, db_conn):
-    """Processar região de forma otimizada"""
+logger = logging.getLogger('swot')
+
+def acquisition_key(granule):
+    return extract_acquisition_start(granule) or datetime.min
+
+def search_cluster(cluster, downloader, window, searched, metrics):
+    """Estágio de busca: uma consulta ao CMR para um grupo de regiões próximas"""
     
-    print(f"\n Processando: {region['name']}")
+    with metrics.timer('search'):
+        region_results = downloader.search_cluster(cluster, window)
+    
+    found = []
+    for region, results in region_results:
+        results = sorted(results, key=acquisition_key)
+        searched[region.get('id')] = results
+        metrics.count('granules_found', len(results), region=region.get('id'))
+        
+        if not results:
+            logger.info(f"{region['name']}: nenhum dado encontrado")
+            continue
+        
+        logger.info(f"{region['name']}: {len(results)} granules encontrados")
+        found.append((region, results))
     
-    # Buscar dados
-    results = downloader.search_data(region)
+    return found
+
+def plan_run(region_results, registry, metrics, max_per_region=MAX_GRANULES_PER_REGION):
+    """Estágio de planejamento: agrupar os resultados de todas as regiões por granule"""
     
-    if not results:
-        print(f"     Nenhum dado encontrado")
-        return 0
+    # Uma única consulta para todos os candidatos da execução (o limite por
+    # região vale para os novos, então todos os resultados são resolvidos)
+    registry.resolve(
+        extract_granule_name(granule)
+        for _, results in region_results
+        for granule in results
+    )
+    
+    # Já carregados e pares abandonados após falhas repetidas ficam fora do plano
+    plans = plan_granules(
+        region_results,
+        max_per_region=max_per_region,
+        is_processed=lambda name, region: registry.is_done(name, region.get('id'))
+    )
+    
+    total_pairs = sum(len(plan.regions) for plan in plans)
+    metrics.count('granules_planned', len(plans))
+    metrics.count('pairs_planned', total_pairs)
+    logger.info(f"Plano: {len(plans)} granules novos para {total_pairs} pares granule/região")
+    
+    return plans
+
+def record_failure(registry, metrics, plan, regions, error):
+    """Registrar uma tentativa que falhou para cada região do granule
+    
+    Depois de MAX_GRANULE_ATTEMPTS o par sai dos próximos planos e a marca
+    d'água da região passa por ele.
+    """
+    for region in regions:
+        try:
+            attempts = registry.record_failure(plan.name, region.get('id'), error)
+        except Exception as e:
+            logger.error(f"{plan.name[:30]}... {region['name']}: erro registrando falha: {e}")
+            continue
+        
+        if attempts >= registry.max_attempts:
+            logger.warning(f"{plan.name[:30]}... {region['name']}: {attempts} tentativas falharam, granule abandonado")
+            metrics.count('pairs_abandoned', granule=plan.name, region=region.get('id'))
+
+def download_granule(plan, downloader, registry, download_dir, metrics):
+    """Estágio de download: baixar o granule em um diretório próprio
+    
+    Os arquivos no cache ficam reservados até release_download, para o
+    LRU não apagá-los enquanto esperam na fila da decodificação.
+    """
+    
+    directory = tempfile.mkdtemp(prefix='granule_', dir=download_dir)
+    with metrics.timer('download', granule=plan.name):
+        files = downloader.download_with_retry(plan.granule, directory, pin=True)
+    
+    if not files:
+        logger.error(f"{plan.name[:30]}...: falha no download")
+        metrics.count('download_failures', granule=plan.name)
+        record_failure(registry, metrics, plan, plan.regions, 'falha no download')
+        shutil.rmtree(directory, ignore_errors=True)
+        return None
+    
+    metrics.count('bytes_downloaded', sum(os.path.getsize(f) for f in files), granule=plan.name)
+    
+    return plan, files, directory
+
+def release_download(downloader, plan, directory):
+    """Apagar o diretório do download e liberar os arquivos reservados no cache"""
+    shutil.rmtree(directory, ignore_errors=True)
+    downloader.release(plan.granule)
+
+def decode_granule(downloaded, downloader, decode_pool, registry, sync_state, metrics):
+    """Estágio de decodificação: ler o NetCDF uma vez e distribuir os pixels entre as regiões
+    
+    Recortes acima de MAX_PIXELS_PER_GRANULE não são materializados: o
+    arquivo segue para o estágio de carga, que o lê em blocos (streaming).
+    """
+    
+    plan, files, directory = downloaded
+    
+    try:
+        with metrics.timer('decode', granule=plan.name):
+            df = process_netcdf_fixed(files[0], plan.regions, max_pixels=MAX_PIXELS_PER_GRANULE,
+                                      decode_pool=decode_pool)
+    except GranuleTooLarge:
+        logger.warning(f"{plan.name[:30]}...: grande demais para memória, carga em streaming")
+        return plan, None, (files[0], directory)
     
-    print(f"     Encontrados: {len(results)} granules")
+    release_download(downloader, plan, directory)
     
-    # Verificar granules novos
-    new_granules = []
-    for granule in results[:MAX_GRANULES_PER_REGION]:  # Limitar
-        granule_name = extract_granule_name(granule)
-        if not check_granule_exists(granule_name, db_conn):
-            new_granules.append(granule)
+    if df is None:
+        metrics.count('decode_failures', granule=plan.name)
+        record_failure(registry, metrics, plan, plan.regions, 'falha na leitura do NetCDF')
+        return None
+    
+    metrics.count('pixels_decoded', len(df), granule=plan.name)
+    
+    if len(df) == 0:
+        logger.info(f"{plan.name[:30]}...: nenhum pixel válido")
+        for region in plan.regions:
+            sync_state.complete(plan.name, region.get('id'))
+        return None
     
-    if not new_granules:
-        print(f"     Todos os granules já processados")
+    return plan, split_by_region(df, plan.regions), None
+
+def stream_granule(plan, file_path, database, registry, sync_state, metrics):
+    """Carregar o granule bloco a bloco, com memória limitada"""
+    
+    region_chunks = (
+        pair
+        for chunk in iter_pixel_cloud(file_path, plan.regions)
+        for pair in split_by_region(chunk, plan.regions)
+    )
+    
+    # Cópias fora do banco (Parquet e/ou armazenamento local) recebem os mesmos blocos
+    sinks = []
+    if PIXEL_ARCHIVE_DIR:
+        sinks.append(GranuleArchive(plan.name, plan.acquisition_start, PIXEL_ARCHIVE_DIR))
+    if PIXEL_STORE_DIR:
+        sinks.append(GranuleStore(plan.name, plan.acquisition_start, PIXEL_STORE_DIR))
+    for sink in sinks:
+        region_chunks = archive_chunks(region_chunks, sink)
+    
+    # Em streaming leitura e carga se intercalam: o timer de carga cobre as duas
+    with metrics.timer('load', granule=plan.name), database.connection() as db_conn:
+        totals = insert_granule_stream(region_chunks, plan.name, db_conn, plan.acquisition_start,
+                                       store_pixels=STORE_PIXELS_IN_DATABASE)
+    
+    if totals is None:
+        for sink in sinks:
+            sink.abort()
+        logger.error(f"{plan.name[:30]}...: erro na inserção (streaming)")
+        metrics.count('load_failures', granule=plan.name)
+        record_failure(registry, metrics, plan, plan.regions, 'erro na inserção (streaming)')
         return 0
     
-    print(f"     Novos: {len(new_granules)} granules")
+    for sink in sinks:
+        sink.close()
     
-    processed = 0
+    for region in plan.regions:
+        label = f"{plan.name[:30]}... {region['name']}"
+        if region.get('id') in totals:
+            registry.mark(plan.name, region.get('id'))
+            record_loaded(metrics, plan.name, region.get('id'), totals[region.get('id')], streamed=True)
+            logger.info(f"{label}: {totals[region.get('id')]} pixels inseridos (streaming)")
+        else:
+            sync_state.complete(plan.name, region.get('id'))
+            logger.info(f"{label}: nenhum pixel na região")
     
-    # Processar granules novos
-    for granule in new_granules:
+    return len(totals)
+
+def record_loaded(metrics, granule_name, region_id, pixels, streamed=False):
+    """Contadores de um par granule/região carregado"""
+    metrics.count('pairs_loaded', granule=granule_name, region=region_id)
+    metrics.count('pixels_loaded', pixels, granule=granule_name, region=region_id)
+    if STORE_PIXELS_IN_DATABASE:
+        metrics.count('rows_inserted', pixels, granule=granule_name, region=region_id)
+    if streamed:
+        metrics.count('pairs_streamed', granule=granule_name, region=region_id)
+
+def load_granule(decoded, downloader, database, registry, sync_state, metrics):
+    """Estágio de carga: inserir os pixels de cada região do granule"""
+    
+    plan, splits, stream = decoded
+    
+    if stream is not None:
+        file_path, directory = stream
         try:
-            granule_name = extract_granule_name(granule)
-            print(f"     {granule_name[:30]}...")
+            return stream_granule(plan, file_path, database, registry, sync_state, metrics)
+        finally:
+            release_download(downloader, plan, directory)
+    
+    processed = 0
+    
+    with database.connection() as db_conn:
+        for region, region_df in splits:
+            label = f"{plan.name[:30]}... {region['name']}"
             
-            # Download e processamento
-            with tempfile.TemporaryDirectory() as temp_dir:
-                files = downloader.download_data([granule], temp_dir)
+            if len(region_df) == 0:
+                sync_state.complete(plan.name, region.get('id'))
+                logger.info(f"{label}: nenhum pixel na região")
+                continue
+            
+            with metrics.timer('load', granule=plan.name, region=region.get('id')):
+                # Cópias fora do banco antes da carga: se ela falhar o granule é refeito e as cópias regravadas
+                if PIXEL_ARCHIVE_DIR:
+                    try:
+                        write_granule(region_df, plan.name, region.get('id'), plan.acquisition_start, PIXEL_ARCHIVE_DIR)
+                    except Exception as e:
+                        logger.error(f"{label}: erro no arquivo Parquet: {e}")
+                        metrics.count('load_failures', granule=plan.name, region=region.get('id'))
+                        record_failure(registry, metrics, plan, [region], e)
+                        continue
+                if PIXEL_STORE_DIR:
+                    try:
+                        store_granule(region_df, plan.name, region.get('id'), plan.acquisition_start, PIXEL_STORE_DIR)
+                    except Exception as e:
+                        logger.error(f"{label}: erro no armazenamento local: {e}")
+                        metrics.count('load_failures', granule=plan.name, region=region.get('id'))
+                        record_failure(registry, metrics, plan, [region], e)
+                        continue
                 
-                if files:
-                    df = process_netcdf_fixed(files[0], region)
-                    
-                    if df is not None and len(df) > 0:
-                        # Pular se muito grande
-                        if len(df) > MAX_PIXELS_PER_GRANULE:
-                            print(f"     Pulando (muito grande: {len(df)} pixels)")
-                            continue
-                        
-                        # Inserir no banco
-                        if insert_granule_data_optimized(df, granule_name, region, db_conn):
-                            print(f"     {len(df)} pixels inseridos")
-                            processed += 1
-                        else:
-                            print(f"     Erro na inserção")
-                    else:
-                        print(f"     Nenhum pixel válido")
-                        
-        except Exception as e:
-            print(f"     Erro: {str(e)[:50]}...")
-            continue
+                # Inserir no banco
+                inserted = insert_granule_data(region_df, plan.name, region, db_conn, plan.acquisition_start,
+                                               store_pixels=STORE_PIXELS_IN_DATABASE)
+            
+            if inserted:
+                registry.mark(plan.name, region.get('id'))
+                record_loaded(metrics, plan.name, region.get('id'), len(region_df))
+                logger.info(f"{label}: {len(region_df)} pixels inseridos")
+                processed += 1
+            else:
+                logger.error(f"{label}: erro na inserção")
+                metrics.count('load_failures', granule=plan.name, region=region.get('id'))
+                record_failure(registry, metrics, plan, [region], 'erro na inserção')
     
     return processed
 
-def process_netcdf_fixed(file_path, region):
+def build_pipeline(downloader, database, registry, sync_state, download_dir, decode_pool,
+                   window, searched, metrics, max_per_region=MAX_GRANULES_PER_REGION, profiler=None):
+    """Montar o pipeline busca -> plano -> download -> decodificação -> carga
+    
+    Com profiler (--profile) cada função de estágio roda sob o perfilador.
     """
-    Processamento de NetCDF
+    
+    def profiled(stage, func, granule_of=None, workers=1):
+        return func if profiler is None else profiler.wrap(stage, func, granule_of, workers)
+    
+    load_workers = 1
+    
+    return Pipeline([
+        Stage('search', profiled('search', lambda cluster: search_cluster(cluster, downloader, window, searched, metrics)),
+              workers=SEARCH_WORKERS, fan_out=True),
+        Stage('plan', profiled('plan', lambda region_results: plan_run(region_results, registry, metrics, max_per_region)),
+              collect=True, fan_out=True),
+        Stage('download', profiled('download', lambda plan: download_granule(plan, downloader, registry, download_dir, metrics)),
+              workers=DOWNLOAD_WORKERS, queue_size=DOWNLOAD_PREFETCH),
+        # Uma thread por processo do pool: a thread só espera o worker e desempacota
+        Stage('decode', profiled('decode', lambda downloaded: decode_granule(downloaded, downloader, decode_pool, registry, sync_state, metrics)),
+              workers=decode_pool.workers, queue_size=DOWNLOAD_PREFETCH),
+        # Carga com um único worker: transações do banco em ordem, uma conexão do pool por granule
+        Stage('load', profiled('load', lambda decoded: load_granule(decoded, downloader, database, registry, sync_state, metrics),
+                               granule_of=lambda decoded: decoded[0].name, workers=load_workers),
+              workers=load_workers, queue_size=LOAD_QUEUE_SIZE),
+    ])
+
+def print_pipeline_summary(pipeline):
+    """Mostrar contadores por estágio"""
+    
+    logger.info("Estágios:")
+    for stats in pipeline.summary():
+        logger.info(
+            f"{stats['stage']}: {stats['received']} recebidos, {stats['emitted']} emitidos, "
+            f"{stats['failed']} falhas, {stats['busy_seconds']:.1f}s ocupado, "
+            f"{stats['items_per_second']:.2f} itens/s, fila máx {stats['max_queue_depth']}"
+        )
+
+def advance_sync_state(sync_state, searched, registry):
+    """Avançar a marca d'água de cada região até o último granule concluído em sequência"""
+    
+    for region_id, results in searched.items():
+        mark = high_water_mark(
+            results,
+            lambda granule: (
+                registry.is_done(extract_granule_name(granule), region_id) or
+                sync_state.is_completed(extract_granule_name(granule), region_id)
+            ),
+            extract_acquisition_start
+        )
+        if sync_state.advance(region_id, mark):
+            logger.info(f"{region_id}: sincronizado até {mark}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Monitor SWOT de produção')
+    parser.add_argument('--backfill-from', type=lambda v: datetime.strptime(v, '%Y-%m-%d'),
+                        help='início do backfill (AAAA-MM-DD); sem ele a busca é incremental')
+    parser.add_argument('--backfill-to', type=lambda v: datetime.strptime(v, '%Y-%m-%d'),
+                        help='fim do backfill (AAAA-MM-DD, padrão: hoje)')
+    parser.add_argument('--chunk-days', type=int, default=BACKFILL_CHUNK_DAYS,
+                        help='tamanho de cada janela do backfill em dias')
+    parser.add_argument('--metrics-json', help=f'relatório JSON da execução (padrão: {METRICS_DIR}/run_<início>.json)')
+    parser.add_argument('--metrics-textfile', default=METRICS_TEXTFILE,
+                        help='gravar também as métricas no formato textfile do node_exporter (.prom)')
+    parser.add_argument('--profile', nargs='?', const='sample', choices=PROFILE_MODES,
+                        help=f'perfilar a execução (padrão: sample) e gravar pilhas folded e memória em {METRICS_DIR}/profile_<início>/; '
+                             'o pico de memória por granule liga o tracemalloc durante a decodificação e a carga, '
+                             'que ficam mais lentas no perfil')
+    return parser.parse_args()
+
+def process_netcdf_fixed(file_path, regions, max_pixels=None, decode_pool=None):
+    """
+    Processamento de NetCDF: lê só as variáveis usadas e só os trechos
+    do swath que caem nas regiões (com buffer). Com decode_pool a leitura
+    roda em um processo worker.
     """
     try:
-        print(f"     Processando arquivo: {file_path}")
-        
-        # CORREÇÃO: Tentar diferentes engines em ordem de preferência
-        engines_to_try = ['h5netcdf', 'netcdf4', 'scipy']
+        logger.info(f"Processando arquivo: {file_path}")
         
-        ds = None
-        used_engine = None
-        
-        for engine in engines_to_try:
-            try:
-                ds = xr.open_dataset(file_path, group='pixel_cloud', engine=engine)
-                used_engine = engine
-                print(f"     Usando engine: {engine}")
-                break
-            except Exception as e:
-                print(f"     Engine {engine} falhou: {str(e)[:30]}...")
-                continue
+        if decode_pool is not None:
+            df = decode_pool.decode(file_path, regions, max_pixels=max_pixels)
+        else:
+            df = read_pixel_cloud(file_path, regions, max_pixels=max_pixels)
         
-        if ds is None:
-            # Tentar sem especificar engine
-            try:
-                ds = xr.open_dataset(file_path, group='pixel_cloud')
-                used_engine = 'default'
-                print(f"     Usando engine padrão")
-            except Exception as e:
-                print(f"     Todos os engines falharam: {e}")
-                return None
+        logger.info(f"Recorte regional: {len(df)} pixels")
+        return df
         
-        # Processar dados usando context manager
-        with ds:
-            # Verificar variáveis disponíveis
-            available_vars = list(ds.variables.keys())
-            print(f"     Variáveis: {len(available_vars)} encontradas")
-            
-            required_vars = ['latitude', 'longitude']
-            if not all(var in ds.variables for var in required_vars):
-                print(f"     Variáveis obrigatórias não encontradas")
-                return None
-            
-            # Extrair dados de forma robusta
-            data = {}
-            
-            # Coordenadas (obrigatórias)
-            try:
-                # Achatar arrays multidimensionais
-                data['latitude'] = ds.latitude.values.flatten().astype('float32')
-                data['longitude'] = ds.longitude.values.flatten().astype('float32')
-                print(f"     Coordenadas extraídas: {len(data['latitude'])} pontos")
-            except Exception as e:
-                print(f"     Erro extraindo coordenadas: {e}")
-                return None
-            
-            # Variáveis opcionais com tratamento individual
-            optional_vars = {
-                'height': 'height',
-                'classification': 'classification', 
-                'coherent_power': 'coherent_power'
-            }
-            
-            for var_name, ds_var in optional_vars.items():
-                try:
-                    if ds_var in ds.variables:
-                        var_data = ds[ds_var].values.flatten()
-                        
-                        # Conversão de tipo específica
-                        if var_name == 'classification':
-                            data[var_name] = var_data.astype('uint8')
-                        else:
-                            data[var_name] = var_data.astype('float32')
-                        
-                        print(f"     Extraída variável: {var_name}")
-                except Exception as e:
-                    print(f"     Falha extraindo {var_name}: {str(e)[:30]}...")
-                    continue
-            
-            # Criar DataFrame
-            try:
-                df = pd.DataFrame(data)
-                print(f"     DataFrame criado com {len(df)} pixels")
-            except Exception as e:
-                print(f"     Erro criando DataFrame: {e}")
-                return None
-            
-            # Limpeza robusta
-            original_size = len(df)
-            
-            # Filtrar coordenadas válidas
-            df = df.dropna(subset=['latitude', 'longitude'])
-            
-            # Filtrar coordenadas dentro de limites razoáveis
-            df = df[
-                (df['latitude'] >= -90) & (df['latitude'] <= 90) &
-                (df['longitude'] >= -180) & (df['longitude'] <= 180)
-            ]
-            
-            cleaned_count = original_size - len(df)
-            if cleaned_count > 0:
-                print(f"     Limpeza: removidos {cleaned_count} pixels inválidos")
-            
-            # Filtro regional com buffer
-            if region and 'bbox' in region:
-                bbox = region['bbox']  # [min_lon, min_lat, max_lon, max_lat]
-                
-                # Buffer pequeno para compensar imprecisões
-                buffer = 0.05  # ~1km
-                mask = (
-                    (df['longitude'] >= (bbox[0] - buffer)) & 
-                    (df['longitude'] <= (bbox[2] + buffer)) &
-                    (df['latitude'] >= (bbox[1] - buffer)) & 
-                    (df['latitude'] <= (bbox[3] + buffer))
-                )
-                
-                df = df[mask]
-                print(f"     Filtro regional: {len(df)} pixels na região")
-            
-            return df
-            
+    except GranuleTooLarge:
+        raise
     except Exception as e:
-        print(f"     ERRO GERAL: {e}")
+        logger.error(f"ERRO GERAL: {e}")
         import traceback
         traceback.print_exc()
         return None
 
-def insert_granule_data_optimized(df, granule_name, region, db_connection):
-    """Inserção otimizada no banco"""
+def write_run_report(metrics, args, start_time, extra):
+    """Gravar o relatório JSON da execução e, se pedido, o textfile do Prometheus"""
     try:
-        cursor = db_connection.cursor()
-        
-        # Inserir granule
-        cursor.execute("""
-            INSERT INTO granules (granule_name, mission_id, region_id, total_pixels, created_at)
-            VALUES (%s, 1, %s, %s, %s)
-            RETURNING granule_id
-        """, (granule_name, region.get('id'), len(df), datetime.now()))
-        
-        granule_id = cursor.fetchone()[0]
-        
-        # Inserir pixels em lotes maiores
-        batch_size = 2000
-        for i in range(0, len(df), batch_size):
-            batch = df.iloc[i:i+batch_size]
-            
-            insert_data = []
-            for _, row in batch.iterrows():
-                insert_data.append((
-                    granule_id,
-                    float(row['latitude']),
-                    float(row['longitude']),
-                    float(row.get('height', None)) if 'height' in row and pd.notna(row['height']) else None,
-                    int(row.get('classification', None)) if 'classification' in row and pd.notna(row['classification']) and row['classification'] <= 7 else None,
-                    datetime.now()
-                ))
-            
-            cursor.executemany("""
-                INSERT INTO pixel_data (granule_id, latitude, longitude, height_m, classification_id, created_at)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, insert_data)
-        
-        db_connection.commit()
-        cursor.close()
-        return True
-        
+        path = metrics.write_json(
+            args.metrics_json or os.path.join(METRICS_DIR, f"run_{start_time:%Y%m%d_%H%M%S}.json"), extra
+        )
+        logger.info(f"Relatório de métricas: {path}")
+        if args.metrics_textfile:
+            metrics.write_prometheus(args.metrics_textfile)
     except Exception as e:
-        print(f"     Erro inserção: {e}")
-        db_connection.rollback()
-        return False
+        logger.error(f"Erro gravando métricas: {e}")
 
-def check_granule_exists(granule_name, db_connection):
-    """Verificar se granule existe"""
+def finish_profile(profiler, run_info):
+    """Juntar os perfis das threads e dos workers e gravar os arquivos em logs/"""
     try:
-        cursor = db_connection.cursor()
-        cursor.execute("SELECT COUNT(*) FROM granules WHERE granule_name = %s", (granule_name,))
-        count = cursor.fetchone()[0]
-        cursor.close()
-        return count > 0
-    except:
-        return False
-
-def extract_granule_name(granule):
-    """Extrair nome do granule"""
-    try:
-        if hasattr(granule, 'data_links'):
-            from pathlib import Path
-            filename = Path(granule.data_links()[0]).name
-            return filename.replace('.nc', '')
-        else:
-            import hashlib
-            granule_str = str(granule)
-            return f"granule_{hashlib.md5(granule_str.encode()).hexdigest()[:8]}"
-    except:
-        return f"unknown_granule_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        paths = profiler.finish()
+        run_info['profile'] = [str(path) for path in paths]
+        for path in paths:
+            logger.info(f"Perfil: {path}")
+    except Exception as e:
+        logger.error(f"Erro gravando perfil: {e}")
 
 def main():
     """Função principal otimizada"""
     
+    args = parse_args()
     start_time = datetime.now()
-    logger = setup_logger()
+    setup_logger()
+    metrics = RunMetrics()
+    run_info = {'budget_seconds': MAX_EXECUTION_TIME_MINUTES * 60, 'pipeline': [], 'status': 'erro'}
     
-    print(f" MONITOR SWOT PRODUÇÃO- {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"Timeout configurado: {MAX_EXECUTION_TIME_MINUTES} minutos")
+    profiler = None
+    if args.profile:
+        profiler = RunProfiler(args.profile, os.path.join(METRICS_DIR, f"profile_{start_time:%Y%m%d_%H%M%S}")).start()
+        logger.info(f"Perfil ({args.profile}) em {profiler.directory}")
+    
+    logger.info(f"MONITOR SWOT PRODUÇÃO- {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
+    logger.info(f"Timeout configurado: {MAX_EXECUTION_TIME_MINUTES} minutos")
     
     try:
         # Conectar ao banco
-        from dotenv import load_dotenv
-        load_dotenv()
-        
-        db_conn = psycopg2.connect(
-            host=os.getenv('DB_HOST'),
-            port=os.getenv('DB_PORT'),
-            database=os.getenv('DB_NAME'),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD')
-        )
+        database = DatabaseConnection()
+        if not database.test_connection():
+            return 1
         
-        print(" Conectado ao banco de dados")
+        logger.info("Conectado ao banco de dados")
+        registry = GranuleRegistry(database)
+        sync_state = RegionSyncState(database)
+        sync_state.load()
         
-        # Inicializar downloader
-        downloader = SWOTDownloader()
+        # Inicializar downloader com cache local de granules
+        cache = GranuleCache(GRANULE_CACHE_DIR, max_bytes=GRANULE_CACHE_MAX_GB * 1024 ** 3)
+        downloader = SWOTDownloader(cache=cache)
         
         # Obter regiões
         regions = get_regions()
         active_regions = [r for r in regions if r.get('active', True)]
         
-        print(f" Processando {len(active_regions)} regiões ativas")
+        clusters = merge_region_clusters(active_regions)
+        logger.info(f"Processando {len(active_regions)} regiões ativas em {len(clusters)} buscas")
+        
+        # Janelas de busca: incremental (uma por região, a partir da marca d'água)
+        # ou backfill (janelas fixas de chunk_days, sem limite por região)
+        if args.backfill_from:
+            backfill_to = args.backfill_to or datetime.utcnow()
+            runs = [
+                (lambda region, start=start, end=end: (start, end), None)
+                for start, end in backfill_windows(args.backfill_from, backfill_to, args.chunk_days)
+            ]
+            logger.info(f"Backfill de {args.backfill_from:%Y-%m-%d} a {backfill_to:%Y-%m-%d} em {len(runs)} janelas")
+        else:
+            runs = [(lambda region: sync_state.window(region.get('id')), MAX_GRANULES_PER_REGION)]
         
         total_processed = 0
         
-        # Processar cada região
-        for region in active_regions:
-            # Verificar timeout
-            elapsed = datetime.now() - start_time
-            if elapsed.total_seconds() > (MAX_EXECUTION_TIME_MINUTES * 60):
-                print(f"Timeout atingido ({MAX_EXECUTION_TIME_MINUTES}min)")
-                break
-            
-            try:
-                processed = process_region_optimized(region, downloader, db_conn)
-                total_processed += processed
+        # Pipeline: cada estágio roda em paralelo com filas limitadas entre eles
+        decode_profile = profiler.worker_profile('decode-worker') if profiler is not None else None
+        with tempfile.TemporaryDirectory() as download_dir, DecodePool(DECODE_PROCESSES, decode_profile) as decode_pool:
+            for window, max_per_region in runs:
+                budget = MAX_EXECUTION_TIME_MINUTES * 60 - (datetime.now() - start_time).total_seconds()
+                if budget <= 0:
+                    logger.warning(f"Timeout atingido ({MAX_EXECUTION_TIME_MINUTES}min); janelas restantes ficam para a próxima execução")
+                    break
                 
-            except Exception as e:
-                print(f" Erro na região {region['name']}: {e}")
-                continue
+                searched = {}
+                pipeline = build_pipeline(downloader, database, registry, sync_state, download_dir,
+                                          decode_pool, window, searched, metrics, max_per_region, profiler)
+                results = pipeline.run(clusters, timeout=budget)
+                total_processed += sum(results)
+                
+                print_pipeline_summary(pipeline)
+                run_info['pipeline'].append(pipeline.summary())
+                advance_sync_state(sync_state, searched, registry)
+                
+                if pipeline.cancelled.is_set():
+                    logger.warning(f"Timeout atingido ({MAX_EXECUTION_TIME_MINUTES}min)")
+                    run_info['timed_out'] = True
+                    break
+        
+        if profiler is not None:
+            profiler.record_workers(decode_pool.profile_info)
+        
+        logger.info(
+            f"cache: {cache.stats['hits']} hits, {cache.stats['misses']} misses, "
+            f"{cache.stats['evictions']} removidos, {cache.stats['bytes_stored'] / 1024 ** 2:.0f} MB novos"
+        )
+        run_info['cache'] = dict(cache.stats)
+        run_info['earthdata_logins'] = downloader.logins
+        metrics.count('search_failures', downloader.search_failures)
         
         # Resumo final
         execution_time = datetime.now() - start_time
         
-        print(f"\n EXECUÇÃO CONCLUÍDA:")
-        print(f"     {total_processed} granules processados")
-        print(f"    Tempo de execução: {execution_time}")
-        print(f"     {len(active_regions)} regiões verificadas")
+        logger.info("EXECUÇÃO CONCLUÍDA:")
+        logger.info(f"{total_processed} pares granule/região processados")
+        logger.info(f"Tempo de execução: {execution_time}")
+        logger.info(f"{len(active_regions)} regiões verificadas")
         
-        db_conn.close()
+        database.close()
         
+        run_info['status'] = 'ok'
+        run_info['pairs_processed'] = total_processed
         return 0
         
     except Exception as e:
-        print(f" ERRO CRÍTICO: {e}")
+        logger.error(f"ERRO CRÍTICO: {e}")
+        run_info['error'] = str(e)
         return 1
+    
+    finally:
+        if profiler is not None:
+            finish_profile(profiler, run_info)
+        write_run_report(metrics, args, start_time, run_info)
 
 if __name__ == "__main__":
     
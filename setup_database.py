@@ -3,11 +3,10 @@
 Configurar estrutura do banco de dados SWOT
 """
 import sys
-import os
 sys.path.append('src')
 
 from database.connection import DatabaseConnection
-import psycopg2
+from database.migrations import apply_migrations
 
 def create_tables():
     """Criar tabelas necessárias"""
@@ -73,7 +72,18 @@ def create_tables():
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         );
         """,
-        
+
+        # Um mesmo granule pode atender várias regiões: unicidade por (granule, região)
+        """
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'granules_name_region_key') THEN
+                ALTER TABLE granules DROP CONSTRAINT IF EXISTS granules_granule_name_key;
+                ALTER TABLE granules ADD CONSTRAINT granules_name_region_key UNIQUE (granule_name, region_id);
+            END IF;
+        END $$;
+        """,
+
         # Tabela de dados dos pixels
         """
         CREATE TABLE IF NOT EXISTS pixel_data (
@@ -88,28 +98,18 @@ def create_tables():
         );
         """,
         
-        # Índices para performance
+        # Índices para performance (os de pixel_data ficam com as migrações,
+        # que removem os de coordenadas e classificação)
         """
         CREATE INDEX IF NOT EXISTS idx_granules_name ON granules(granule_name);
         CREATE INDEX IF NOT EXISTS idx_granules_region ON granules(region_id);
-        CREATE INDEX IF NOT EXISTS idx_pixel_granule ON pixel_data(granule_id);
-        CREATE INDEX IF NOT EXISTS idx_pixel_coords ON pixel_data(latitude, longitude);
-        CREATE INDEX IF NOT EXISTS idx_pixel_classification ON pixel_data(classification_id);
         """
     ]
     
     try:
         # Conectar ao banco
-        from dotenv import load_dotenv
-        load_dotenv()
-        
-        conn = psycopg2.connect(
-            host=os.getenv('DB_HOST'),
-            port=os.getenv('DB_PORT'),
-            database=os.getenv('DB_NAME'),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD')
-        )
+        database = DatabaseConnection()
+        conn = database.getconn()
         
         cursor = conn.cursor()
         
@@ -124,7 +124,11 @@ def create_tables():
         
         conn.commit()
         cursor.close()
-        conn.close()
+        
+        # Levar o schema base até a versão mais recente
+        apply_migrations(conn)
+        database.putconn(conn)
+        database.close()
         
         print(" Estrutura do banco criada com sucesso!")
         return True
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Série de nível d'água (WSE) por região
+Uso: python show_water_levels.py [--region ID] [--from AAAA-MM-DD] [--to AAAA-MM-DD] [--rebuild]
+"""
+import sys
+import argparse
+from datetime import datetime
+sys.path.append('src')
+
+from database.connection import DatabaseConnection
+from database.water_levels import WaterLevels
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d')
+
+def main():
+    parser = argparse.ArgumentParser(description="Nível d'água por região")
+    parser.add_argument('--region', help='região (sem ela: último nível de cada região)')
+    parser.add_argument('--from', dest='start', type=parse_date, help='início (AAAA-MM-DD)')
+    parser.add_argument('--to', dest='end', type=parse_date, help='fim, exclusivo (AAAA-MM-DD)')
+    parser.add_argument('--rebuild', action='store_true', help='calcular níveis de granules antigos a partir de pixel_data e recalcular as passagens')
+    args = parser.parse_args()
+
+    database = DatabaseConnection()
+    levels = WaterLevels(database)
+
+    if args.rebuild:
+        print(f" {levels.rebuild(args.region)} níveis calculados")
+        print(f" {levels.rebuild_passes(args.region)} passagens recalculadas")
+
+    if args.region:
+        series = levels.series(args.region, args.start, args.end)
+        print(f" {args.region}: {len(series)} passagens")
+    else:
+        series = levels.latest()
+        print(f" Último nível de {len(series)} regiões")
+
+    if len(series):
+        print(series.to_string(index=False))
+
+    database.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,41 @@
+import logging
+import time
+
+
+class DownloadPool:
+    """Download de um granule com retry e backoff exponencial
+
+    O paralelismo vem dos workers do estágio de download do pipeline
+    (core.pipeline), cada um chamando fetch. download_func segue a
+    assinatura de earthaccess.download (lista de granules, diretório) ->
+    lista de arquivos, o que permite trocar o backend por um falso em
+    testes offline.
+    """
+
+    def __init__(self, download_func, max_retries=3, backoff_seconds=5.0, sleep=time.sleep):
+        self.download_func = download_func
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.sleep = sleep
+        self.logger = logging.getLogger('swot')
+
+    def fetch(self, granule, output_dir):
+        """Baixar um granule com retry e backoff exponencial"""
+        error = None
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                files = self.download_func([granule], output_dir)
+                if files:
+                    return files
+                error = 'nenhum arquivo retornado'
+            except Exception as e:
+                error = e
+
+            if attempt < self.max_retries:
+                delay = self.backoff_seconds * (2 ** attempt)
+                self.logger.warning(f"Download falhou ({error}), tentativa {attempt + 1}/{self.max_retries + 1}, nova tentativa em {delay:.1f}s")
+                self.sleep(delay)
+
+        self.logger.error(f"Download desistido após {self.max_retries + 1} tentativas: {error}")
+        return []
@@ -0,0 +1,106 @@
+from shapely.geometry import Polygon, box
+
+from .granule_planner import REGION_BUFFER_DEG, extract_acquisition_start
+from .region_index import region_geometry
+
+# Regiões cujos bbox ficam a menos disso (graus) são buscadas juntas no CMR
+CLUSTER_GAP_DEG = 1.0
+
+
+def _expand(bbox, margin):
+    return [bbox[0] - margin, bbox[1] - margin, bbox[2] + margin, bbox[3] + margin]
+
+
+def _overlaps(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def envelope(bboxes):
+    """Menor bbox que contém todos os bbox"""
+    return [
+        min(b[0] for b in bboxes),
+        min(b[1] for b in bboxes),
+        max(b[2] for b in bboxes),
+        max(b[3] for b in bboxes),
+    ]
+
+
+def merge_region_clusters(regions, gap=CLUSTER_GAP_DEG):
+    """Agrupar regiões próximas; cada grupo vira uma única busca pelo seu envelope
+
+    Grupos cujos envelopes (expandidos em gap/2) se tocam são unidos até
+    estabilizar, então regiões distantes não inflam o envelope umas das outras.
+    """
+    clusters = [([region], list(region['bbox'])) for region in regions]
+
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(clusters)):
+            for j in range(i + 1, len(clusters)):
+                if _overlaps(_expand(clusters[i][1], gap / 2), _expand(clusters[j][1], gap / 2)):
+                    members = clusters[i][0] + clusters[j][0]
+                    clusters[i] = (members, envelope([clusters[i][1], clusters[j][1]]))
+                    del clusters[j]
+                    merged = True
+                    break
+            if merged:
+                break
+
+    return [members for members, _ in clusters]
+
+
+def granule_footprint(granule):
+    """Footprint do granule (shapely) a partir do UMM, ou None se não informado"""
+    try:
+        geometry = granule['umm']['SpatialExtent']['HorizontalSpatialDomain']['Geometry']
+    except (KeyError, TypeError):
+        return None
+
+    shapes = []
+    for polygon in geometry.get('GPolygons', []):
+        points = polygon['Boundary']['Points']
+        shapes.append(Polygon([(p['Longitude'], p['Latitude']) for p in points]))
+    for rect in geometry.get('BoundingRectangles', []):
+        shapes.append(box(
+            rect['WestBoundingCoordinate'], rect['SouthBoundingCoordinate'],
+            rect['EastBoundingCoordinate'], rect['NorthBoundingCoordinate']
+        ))
+
+    if not shapes:
+        return None
+
+    footprint = shapes[0]
+    for shape in shapes[1:]:
+        footprint = footprint.union(shape)
+    return footprint
+
+
+def assign_granules(granules, regions, windows=None, buffer=REGION_BUFFER_DEG):
+    """Distribuir os granules de uma busca combinada entre as regiões
+
+    Um granule vai para cada região cujo polígono (ou bbox com buffer)
+    intercepta o footprint e, com windows ({region_id: (início, fim)}),
+    cuja janela contém a aquisição. Sem footprint no UMM o granule vai
+    para todas.
+    """
+    region_shapes = []
+    for region in regions:
+        geometry = region_geometry(region)
+        region_shapes.append(geometry if geometry is not None else box(*_expand(region['bbox'], buffer)))
+    assigned = [[] for _ in regions]
+
+    for granule in granules:
+        footprint = granule_footprint(granule)
+        acquired = extract_acquisition_start(granule) if windows else None
+
+        for i, region in enumerate(regions):
+            if footprint is not None and not footprint.intersects(region_shapes[i]):
+                continue
+            if acquired is not None:
+                start, end = windows[region.get('id')]
+                if not start <= acquired <= end:
+                    continue
+            assigned[i].append(granule)
+
+    return list(zip(regions, assigned))
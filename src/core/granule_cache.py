@@ -0,0 +1,225 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import Counter
+from pathlib import Path
+
+DEFAULT_CACHE_DIR = 'data/cache'
+DEFAULT_MAX_BYTES = 50 * 1024 ** 3  # 50 GB
+
+# Metadados de cada entrada; o mtime deste arquivo marca o último acesso (LRU)
+META_FILE = 'cache_entry.json'
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class GranuleCache:
+    """Cache local de granules em disco, endereçado pelo native-id
+
+    Cada entrada é publicada com um rename atômico de um diretório de
+    staging, então processos concorrentes nunca veem entradas pela metade.
+    Quando o total passa de max_bytes as entradas menos usadas são removidas,
+    exceto as reservadas por fetch(pin=True) e ainda não liberadas (reserva
+    só dentro deste processo).
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, verify_checksum=False):
+        self.root = Path(root)
+        self.entries_dir = self.root / 'entries'
+        self.staging_dir = self.root / 'staging'
+        self.max_bytes = max_bytes
+        self.verify_checksum = verify_checksum
+        self.logger = logging.getLogger('swot')
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'corrupt': 0,
+            'stores': 0,
+            'evictions': 0,
+            'bytes_stored': 0,
+            'bytes_evicted': 0,
+        }
+        self._lock = threading.Lock()
+        self._pins = Counter()  # entrada -> leitores que ainda vão usar os arquivos
+        self._pin_lock = threading.Lock()
+
+        self.entries_dir.mkdir(parents=True, exist_ok=True)
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def _entry_path(self, key):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return self.entries_dir / digest[:2] / digest
+
+    def _read_meta(self, entry):
+        try:
+            with open(entry / META_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _is_valid(self, entry, meta):
+        """Conferir tamanho (e opcionalmente sha256) de cada arquivo da entrada"""
+        for record in meta['files']:
+            path = entry / record['name']
+            try:
+                if path.stat().st_size != record['size']:
+                    return False
+            except OSError:
+                return False
+            if self.verify_checksum and _sha256(path) != record['sha256']:
+                return False
+        return True
+
+    def _remove(self, entry):
+        """Tirar a entrada do caminho publicado antes de apagar"""
+        trash = Path(tempfile.mkdtemp(prefix='trash_', dir=self.staging_dir))
+        try:
+            os.replace(entry, trash / entry.name)
+        except OSError:
+            pass
+        shutil.rmtree(trash, ignore_errors=True)
+
+    def get(self, key):
+        """Arquivos em cache para o granule, ou None"""
+        entry = self._entry_path(key)
+        meta = self._read_meta(entry)
+
+        if meta is None:
+            self._count('misses')
+            return None
+
+        if not self._is_valid(entry, meta):
+            self.logger.warning(f"Cache corrompido para {key}, descartando")
+            self._count('corrupt')
+            self._count('misses')
+            self._remove(entry)
+            return None
+
+        try:
+            os.utime(entry / META_FILE)
+        except OSError:
+            pass
+
+        self._count('hits')
+        return [str(entry / record['name']) for record in meta['files']]
+
+    def put(self, key, files):
+        """Mover arquivos baixados para o cache e devolver os novos caminhos"""
+        staging = Path(tempfile.mkdtemp(prefix='put_', dir=self.staging_dir))
+        records = []
+
+        for file_path in files:
+            target = staging / Path(file_path).name
+            shutil.move(str(file_path), target)
+            records.append({
+                'name': target.name,
+                'size': target.stat().st_size,
+                'sha256': _sha256(target),
+            })
+
+        with open(staging / META_FILE, 'w', encoding='utf-8') as f:
+            json.dump({'key': key, 'files': records}, f)
+
+        entry = self._entry_path(key)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+
+        try:
+            os.rename(staging, entry)
+            self._count('stores')
+            self._count('bytes_stored', sum(r['size'] for r in records))
+        except OSError:
+            # Outro processo publicou a mesma entrada primeiro
+            shutil.rmtree(staging, ignore_errors=True)
+
+        self.evict(keep=entry)
+        return [str(entry / record['name']) for record in records]
+
+    def fetch(self, key, download_func, pin=False):
+        """Devolver do cache ou baixar com download_func(diretório) e guardar
+
+        Com pin a entrada fica reservada até release(key): evict não a
+        remove enquanto os arquivos esperam para ser lidos.
+        """
+        if pin:
+            with self._pin_lock:
+                self._pins[self._entry_path(key)] += 1
+
+        files = []
+        try:
+            files = self._fetch(key, download_func)
+        finally:
+            if pin and not files:
+                self.release(key)
+        return files
+
+    def release(self, key):
+        """Liberar uma reserva feita por fetch(pin=True)"""
+        entry = self._entry_path(key)
+        with self._pin_lock:
+            self._pins[entry] -= 1
+            if self._pins[entry] <= 0:
+                del self._pins[entry]
+
+    def _fetch(self, key, download_func):
+        files = self.get(key)
+        if files is not None:
+            return files
+
+        download_dir = tempfile.mkdtemp(prefix='download_', dir=self.staging_dir)
+        try:
+            files = download_func(download_dir)
+            if not files:
+                return []
+            return self.put(key, files)
+        finally:
+            shutil.rmtree(download_dir, ignore_errors=True)
+
+    def entries(self):
+        """(último acesso, bytes, caminho) de cada entrada publicada"""
+        result = []
+        for meta_path in self.entries_dir.glob(f"*/*/{META_FILE}"):
+            entry = meta_path.parent
+            meta = self._read_meta(entry)
+            if meta is None:
+                continue
+            try:
+                accessed = meta_path.stat().st_mtime
+            except OSError:
+                continue
+            result.append((accessed, sum(r['size'] for r in meta['files']), entry))
+        return result
+
+    def size_bytes(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep=None):
+        """Remover entradas menos usadas (e não reservadas) até caber em max_bytes"""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            if entry == keep:
+                continue
+            with self._pin_lock:
+                if self._pins[entry]:
+                    continue
+                self._remove(entry)
+            total -= size
+            self._count('evictions')
+            self._count('bytes_evicted', size)
@@ -0,0 +1,84 @@
+from datetime import datetime
+from pathlib import Path
+import hashlib
+import re
+
+# Buffer em graus aplicado ao bbox das regiões (~1km)
+REGION_BUFFER_DEG = 0.05
+
+
+class GranulePlan:
+    """Um granule a ser baixado uma única vez e as regiões que ele atende"""
+
+    def __init__(self, name, granule):
+        self.name = name
+        self.granule = granule
+        self.acquisition_start = extract_acquisition_start(granule)
+        self.regions = []
+
+    def __repr__(self):
+        region_ids = [r.get('id') for r in self.regions]
+        return f"GranulePlan({self.name!r}, regions={region_ids})"
+
+
+def extract_granule_name(granule):
+    """Extrair nome do granule"""
+    try:
+        if hasattr(granule, 'data_links'):
+            filename = Path(granule.data_links()[0]).name
+            return filename.replace('.nc', '')
+        else:
+            granule_str = str(granule)
+            return f"granule_{hashlib.md5(granule_str.encode()).hexdigest()[:8]}"
+    except:
+        return f"unknown_granule_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+
+def extract_native_id(granule):
+    """native-id do CMR (chave estável do granule), ou o nome derivado do arquivo"""
+    try:
+        return granule['meta']['native-id']
+    except (KeyError, TypeError):
+        return extract_granule_name(granule)
+
+
+def extract_acquisition_start(granule):
+    """Início da aquisição: TemporalExtent do UMM ou o primeiro carimbo no nome do arquivo"""
+    try:
+        begin = granule['umm']['TemporalExtent']['RangeDateTime']['BeginningDateTime']
+        return datetime.fromisoformat(begin.replace('Z', '+00:00')).replace(tzinfo=None)
+    except (KeyError, TypeError, ValueError, AttributeError):
+        pass
+
+    match = re.search(r'(\d{8}T\d{6})', extract_granule_name(granule))
+    if match:
+        return datetime.strptime(match.group(1), '%Y%m%dT%H%M%S')
+    return None
+
+
+def plan_granules(region_results, max_per_region=None, is_processed=None):
+    """Agrupar resultados de busca de todas as regiões por granule
+
+    max_per_region limita só os granules ainda não processados de cada
+    região: os já carregados não ocupam o limite.
+    """
+    plans = {}
+
+    for region, results in region_results:
+        planned = 0
+        for granule in results:
+            if max_per_region is not None and planned >= max_per_region:
+                break
+
+            name = extract_granule_name(granule)
+
+            if is_processed is not None and is_processed(name, region):
+                continue
+            planned += 1
+
+            plan = plans.get(name)
+            if plan is None:
+                plan = plans[name] = GranulePlan(name, granule)
+            plan.regions.append(region)
+
+    return list(plans.values())
@@ -0,0 +1,129 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from .pixc_reader import read_pixel_cloud
+
+# No Windows um segmento some quando o último handle fecha, antes de o
+# processo pai conseguir abri-lo; lá o buffer volta como bytes.
+USE_SHARED_MEMORY = os.name != 'nt'
+
+_ALIGNMENT = 8
+
+
+class PackedPixels:
+    """Colunas de pixels empacotadas em um único buffer contíguo
+
+    Só o layout (nome, dtype, offset, tamanho) e o nome do segmento de
+    memória compartilhada atravessam o limite entre processos.
+    """
+
+    def __init__(self, layout, nbytes, shm_name=None, payload=None):
+        self.layout = layout
+        self.nbytes = nbytes
+        self.shm_name = shm_name
+        self.payload = payload
+
+    def __len__(self):
+        return self.layout[0][3] if self.layout else 0
+
+
+def _column_layout(columns):
+    layout = []
+    offset = 0
+    for name, values in columns.items():
+        layout.append((name, values.dtype.str, offset, len(values)))
+        offset += values.nbytes
+        offset += -offset % _ALIGNMENT
+    return layout, offset
+
+
+def pack_columns(columns, use_shared_memory=USE_SHARED_MEMORY):
+    """Copiar colunas NumPy para um buffer (memória compartilhada ou bytes)"""
+    columns = {name: np.ascontiguousarray(values) for name, values in columns.items()}
+    layout, nbytes = _column_layout(columns)
+
+    if use_shared_memory and nbytes > 0:
+        shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        buffer = shm.buf
+    else:
+        shm = None
+        buffer = bytearray(nbytes)
+
+    try:
+        for name, dtype, offset, length in layout:
+            np.ndarray(length, dtype=dtype, buffer=buffer, offset=offset)[:] = columns[name]
+    except Exception:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+        raise
+
+    if shm is not None:
+        shm.close()
+        return PackedPixels(layout, nbytes, shm_name=shm.name)
+    return PackedPixels(layout, nbytes, payload=bytes(buffer))
+
+
+def unpack_columns(packed):
+    """Reconstruir o DataFrame a partir do buffer e liberar a memória compartilhada"""
+    if packed.shm_name is None:
+        buffer = packed.payload or b''
+        return pd.DataFrame({
+            name: np.frombuffer(buffer, dtype=dtype, count=length, offset=offset).copy()
+            for name, dtype, offset, length in packed.layout
+        })
+
+    shm = shared_memory.SharedMemory(name=packed.shm_name)
+    try:
+        return pd.DataFrame({
+            name: np.ndarray(length, dtype=dtype, buffer=shm.buf, offset=offset).copy()
+            for name, dtype, offset, length in packed.layout
+        })
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def decode_granule_file(file_path, regions, max_pixels=None):
+    """Executado no processo worker: ler o recorte regional e empacotar as colunas"""
+    df = read_pixel_cloud(file_path, regions, max_pixels=max_pixels)
+    return pack_columns({name: df[name].to_numpy() for name in df.columns})
+
+
+class DecodePool:
+    """Decodificação de granules em um pool de processos
+
+    Com profile (objeto serializável com call(func, *args) -> (resultado,
+    info), ex.: utils.profiling.WorkerProfile) cada tarefa roda sob o
+    perfilador no worker e o info fica em profile_info[file_path].
+    """
+
+    def __init__(self, workers=None, profile=None):
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.profile = profile
+        self.profile_info = {}
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def decode(self, file_path, regions, max_pixels=None):
+        """Decodificar em um processo worker e devolver o DataFrame ao chamador"""
+        if self.profile is None:
+            future = self._executor.submit(decode_granule_file, file_path, regions, max_pixels)
+            return unpack_columns(future.result())
+
+        future = self._executor.submit(self.profile.call, decode_granule_file, file_path, regions, max_pixels)
+        packed, info = future.result()
+        self.profile_info[str(file_path)] = info
+        return unpack_columns(packed)
@@ -0,0 +1,227 @@
+import logging
+import queue
+import threading
+import time
+
+# Marca de fim de fluxo entre estágios
+_END = object()
+
+
+class Stage:
+    """Estágio do pipeline: função aplicada por um pool de threads
+
+    func recebe um item e devolve o resultado para o próximo estágio
+    (None descarta o item). Com fan_out=True o retorno é iterável e cada
+    elemento segue separado. Com collect=True o estágio espera o fim do
+    estágio anterior e recebe a lista de todos os itens de uma vez.
+    """
+
+    def __init__(self, name, func, workers=1, queue_size=4, fan_out=False, collect=False):
+        self.name = name
+        self.func = func
+        self.workers = 1 if collect else max(1, workers)
+        self.queue_size = queue_size
+        self.fan_out = fan_out
+        self.collect = collect
+
+
+class StageStats:
+    """Contadores de um estágio"""
+
+    def __init__(self, name):
+        self.name = name
+        self.received = 0
+        self.emitted = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.max_queue_depth = 0
+        self.lock = threading.Lock()
+
+    def as_dict(self, elapsed_seconds, queue_depth):
+        return {
+            'stage': self.name,
+            'received': self.received,
+            'emitted': self.emitted,
+            'failed': self.failed,
+            'busy_seconds': round(self.busy_seconds, 3),
+            'items_per_second': round(self.received / elapsed_seconds, 3) if elapsed_seconds > 0 else 0.0,
+            'queue_depth': queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+        }
+
+
+class Pipeline:
+    """Estágios sobrepostos ligados por filas limitadas (backpressure)"""
+
+    def __init__(self, stages):
+        self.stages = stages
+        self.queues = [queue.Queue(maxsize=stage.queue_size) for stage in stages]
+        self.stats = [StageStats(stage.name) for stage in stages]
+        self.results = []
+        self.cancelled = threading.Event()
+        self.logger = logging.getLogger('swot')
+        self._results_lock = threading.Lock()
+        self._remaining = [stage.workers for stage in stages]
+        self._remaining_lock = threading.Lock()
+        self._errors = []
+        self._started = None
+        self._finished = None
+
+    def cancel(self):
+        """Cancelar: nenhum item novo entra e as filas são esvaziadas"""
+        if not self.cancelled.is_set():
+            self.logger.warning("Pipeline cancelado")
+            self.cancelled.set()
+
+    def _put(self, index, item):
+        """Enfileirar item no estágio, bloqueando enquanto a fila está cheia"""
+        q = self.queues[index]
+        while True:
+            if self.cancelled.is_set() and item is not _END:
+                return False
+            try:
+                q.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+
+        if item is not _END:
+            stats = self.stats[index]
+            with stats.lock:
+                stats.max_queue_depth = max(stats.max_queue_depth, q.qsize())
+        return True
+
+    def _emit(self, index, result):
+        """Passar resultado do estágio index adiante"""
+        if result is None:
+            return
+
+        outputs = result if self.stages[index].fan_out else [result]
+        for output in outputs:
+            with self.stats[index].lock:
+                self.stats[index].emitted += 1
+
+            if index == len(self.stages) - 1:
+                with self._results_lock:
+                    self.results.append(output)
+            elif not self._put(index + 1, output):
+                return
+
+    def _finish_worker(self, index):
+        """Último worker do estágio a terminar avisa o próximo estágio"""
+        with self._remaining_lock:
+            self._remaining[index] -= 1
+            last = self._remaining[index] == 0
+
+        if last and index < len(self.stages) - 1:
+            for _ in range(self.stages[index + 1].workers):
+                self._put(index + 1, _END)
+
+    def _call(self, index, item):
+        stage = self.stages[index]
+        stats = self.stats[index]
+        start = time.perf_counter()
+        try:
+            result = stage.func(item)
+        except Exception as e:
+            self.logger.error(f"Erro no estágio {stage.name}: {e}")
+            with stats.lock:
+                stats.failed += 1
+            return
+        finally:
+            with stats.lock:
+                stats.busy_seconds += time.perf_counter() - start
+
+        self._emit(index, result)
+
+    def _fail(self, where, error):
+        """Erro fora do tratamento por item: cancela o pipeline e é relançado em run()"""
+        self.logger.exception(f"Erro fatal em {where}: {error}")
+        with self._results_lock:
+            self._errors.append(error)
+        self.cancel()
+
+    def _worker(self, index):
+        stage = self.stages[index]
+        stats = self.stats[index]
+        collected = []
+        item = None
+
+        try:
+            while True:
+                item = self.queues[index].get()
+
+                if item is _END:
+                    if stage.collect and not self.cancelled.is_set():
+                        self._call(index, collected)
+                    break
+
+                if self.cancelled.is_set():
+                    continue
+
+                with stats.lock:
+                    stats.received += 1
+
+                if stage.collect:
+                    collected.append(item)
+                else:
+                    self._call(index, item)
+        except BaseException as e:
+            self._fail(f"estágio {stage.name}", e)
+            # Continuar consumindo a fila até a marca de fim para o estágio
+            # anterior não ficar bloqueado em put()
+            while item is not _END:
+                item = self.queues[index].get()
+        finally:
+            # Sempre avisar o próximo estágio, senão ele espera em get() para sempre
+            self._finish_worker(index)
+
+    def _feed(self, items):
+        try:
+            for item in items:
+                if not self._put(0, item):
+                    break
+        except BaseException as e:
+            self._fail("entrada do pipeline", e)
+        finally:
+            for _ in range(self.stages[0].workers):
+                self._put(0, _END)
+
+    def run(self, items, timeout=None):
+        """Executar o pipeline sobre items e devolver as saídas do último estágio
+
+        Erros de um item ficam em StageStats.failed; um erro que escapa do
+        worker (ex.: gerador de fan_out que falha) cancela o pipeline e é
+        relançado aqui depois que todas as threads terminam.
+        """
+        self._started = time.perf_counter()
+
+        threads = [threading.Thread(target=self._feed, args=(items,), name='pipeline-feed', daemon=True)]
+        for index, stage in enumerate(self.stages):
+            for n in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._worker, args=(index,), name=f"{stage.name}-{n}", daemon=True
+                ))
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(0.5)
+                if timeout is not None and time.perf_counter() - self._started > timeout:
+                    self.cancel()
+
+        self._finished = time.perf_counter()
+        if self._errors:
+            raise self._errors[0]
+        return self.results
+
+    def summary(self):
+        """Contadores por estágio: vazão, tempo ocupado e profundidade das filas"""
+        end = self._finished or time.perf_counter()
+        elapsed = end - self._started if self._started else 0.0
+        return [
+            stats.as_dict(elapsed, self.queues[index].qsize())
+            for index, stats in enumerate(self.stats)
+        ]
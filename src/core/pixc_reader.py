@@ -0,0 +1,119 @@
+import logging
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from .granule_planner import REGION_BUFFER_DEG
+from .region_index import RegionIndex
+
+# Engines tentados em ordem de preferência
+ENGINES = ('h5netcdf', 'netcdf4', 'scipy')
+
+# Variáveis lidas além de latitude/longitude, com o dtype de saída
+OPTIONAL_VARIABLES = {
+    'height': 'float32',
+    'classification': 'uint8',
+    'coherent_power': 'float32',
+    'pixel_area': 'float32',  # m², para a área por classe do resumo
+}
+
+# Pixels de latitude/longitude lidos por vez na varredura
+SCAN_CHUNK_PIXELS = 1000000
+
+logger = logging.getLogger('swot')
+
+
+def open_pixel_cloud(file_path):
+    """Abrir o grupo pixel_cloud de forma preguiçosa, tentando cada engine"""
+    for engine in ENGINES:
+        try:
+            return xr.open_dataset(file_path, group='pixel_cloud', engine=engine)
+        except Exception as e:
+            logger.debug(f"Engine {engine} falhou: {str(e)[:30]}...")
+
+    return xr.open_dataset(file_path, group='pixel_cloud')
+
+
+def iter_region_ranges(ds, regions, buffer=REGION_BUFFER_DEG, chunk_pixels=SCAN_CHUNK_PIXELS):
+    """Varrer lat/lon em blocos e gerar (início, fim, máscara) dos trechos nas regiões"""
+    total = ds.sizes[ds['latitude'].dims[0]]
+    index = RegionIndex(regions, buffer) if regions else None
+
+    for start in range(0, total, chunk_pixels):
+        stop = min(start + chunk_pixels, total)
+        latitude = ds['latitude'][start:stop].values
+        longitude = ds['longitude'][start:stop].values
+
+        if regions:
+            inside = index.contains_any(longitude, latitude)
+        else:
+            inside = (
+                (latitude >= -90) & (latitude <= 90) &
+                (longitude >= -180) & (longitude <= 180)
+            )
+
+        hits = np.flatnonzero(inside)
+        if len(hits) == 0:
+            continue
+
+        first, last = hits[0], hits[-1] + 1
+        yield start + first, start + last, inside[first:last]
+
+
+def _present_variables(ds, variables):
+    """Variáveis opcionais existentes no arquivo; falha sem latitude/longitude"""
+    if 'latitude' not in ds.variables or 'longitude' not in ds.variables:
+        raise ValueError("Variáveis obrigatórias (latitude/longitude) não encontradas")
+
+    if ds['latitude'].ndim != 1:
+        raise ValueError(f"pixel_cloud com latitude {ds['latitude'].ndim}-D não suportado")
+
+    return {name: dtype for name, dtype in variables.items() if name in ds.variables}
+
+
+def iter_pixel_cloud(file_path, regions, variables=OPTIONAL_VARIABLES,
+                     buffer=REGION_BUFFER_DEG, chunk_pixels=SCAN_CHUNK_PIXELS):
+    """Gerar o recorte regional em DataFrames de no máximo chunk_pixels linhas
+
+    Memória constante qualquer que seja o tamanho do granule.
+    """
+    with open_pixel_cloud(file_path) as ds:
+        present = _present_variables(ds, variables)
+        columns = {'latitude': 'float32', 'longitude': 'float32', **present}
+
+        for start, stop, mask in iter_region_ranges(ds, regions, buffer, chunk_pixels):
+            yield pd.DataFrame({
+                name: ds[name][start:stop].values[mask].astype(dtype)
+                for name, dtype in columns.items()
+            })
+
+
+class GranuleTooLarge(Exception):
+    """Recorte regional maior que o limite para leitura em memória"""
+
+
+def read_pixel_cloud(file_path, regions, variables=OPTIONAL_VARIABLES,
+                     buffer=REGION_BUFFER_DEG, chunk_pixels=SCAN_CHUNK_PIXELS, max_pixels=None):
+    """Ler só as variáveis necessárias e só os trechos do swath dentro das regiões
+
+    Memória de pico proporcional ao recorte regional (mais um bloco de
+    varredura), e não ao swath inteiro. Se o recorte passar de max_pixels
+    levanta GranuleTooLarge para o chamador usar iter_pixel_cloud.
+    """
+    chunks = []
+    total = 0
+
+    for chunk in iter_pixel_cloud(file_path, regions, variables, buffer, chunk_pixels):
+        total += len(chunk)
+        if max_pixels is not None and total > max_pixels:
+            raise GranuleTooLarge(f"mais de {max_pixels} pixels no recorte regional")
+        chunks.append(chunk)
+
+    if not chunks:
+        return pd.DataFrame({
+            'latitude': np.empty(0, dtype='float32'),
+            'longitude': np.empty(0, dtype='float32'),
+        })
+
+    return pd.concat(chunks, ignore_index=True)
@@ -0,0 +1,208 @@
+import json
+import os
+from datetime import date, datetime, time
+from pathlib import Path
+
+import numpy as np
+
+# Arquivo colunar dos pixels recortados: Parquet (zstd) particionado no
+# estilo Hive, raiz/region_id=<id>/date=<AAAA-MM-DD>/<granule>.parquet.
+# As linhas são ordenadas por latitude antes de gravar, então as
+# estatísticas de cada row group (min/max) deixam o leitor pular blocos
+# fora do bbox pedido.
+ARCHIVE_ROOT = 'data/archive'
+ARCHIVE_ROW_GROUP_ROWS = 131072
+ARCHIVE_COMPRESSION = 'zstd'
+
+ARCHIVE_COLUMNS = {
+    'latitude': 'float32',
+    'longitude': 'float32',
+    'height': 'float32',
+    'classification': 'uint8',
+    'coherent_power': 'float32',
+    'pixel_area': 'float32',
+}
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        import pyarrow.dataset as ds
+    except ImportError as e:
+        raise ImportError("Arquivo Parquet requer o pacote pyarrow (pip install pyarrow)") from e
+    return pa, pq, ds
+
+
+def partition_dir(root, region_id, acquired_on):
+    return Path(root) / f"region_id={region_id}" / f"date={acquired_on:%Y-%m-%d}"
+
+
+def _arrow_schema(pa, geometry):
+    fields = [pa.field('acquired_at', pa.timestamp('ms'))]
+    fields += [pa.field(name, pa.from_numpy_dtype(np.dtype(dtype))) for name, dtype in ARCHIVE_COLUMNS.items()]
+    if geometry:
+        fields.append(pa.field('geometry', pa.binary()))
+    return pa.schema(fields)
+
+
+def _geo_metadata():
+    """Metadados GeoParquet (1.0) para a coluna geometry em WKB"""
+    return {b'geo': json.dumps({
+        'version': '1.0.0',
+        'primary_column': 'geometry',
+        'columns': {'geometry': {'encoding': 'WKB', 'geometry_types': ['Point'], 'crs': None}},
+    }).encode()}
+
+
+class GranuleArchive:
+    """Arquivos Parquet de um granule, um por região, gravados em blocos
+
+    Cada região escreve em um arquivo temporário que só é renomeado para o
+    nome final em close(); abort() descarta tudo. Regravar o mesmo granule
+    substitui os arquivos anteriores.
+    """
+
+    def __init__(self, granule_name, acquisition_start=None, root=ARCHIVE_ROOT,
+                 geometry=False, row_group_rows=ARCHIVE_ROW_GROUP_ROWS):
+        self.pa, self.pq, _ = _pyarrow()
+        self.granule_name = granule_name
+        self.acquired_at = acquisition_start or datetime.now()
+        self.root = root
+        self.geometry = geometry
+        self.row_group_rows = row_group_rows
+        self.schema = _arrow_schema(self.pa, geometry)
+        if geometry:
+            self.schema = self.schema.with_metadata(_geo_metadata())
+        self._writers = {}
+        self.rows = {}
+
+    def _writer(self, region_id):
+        entry = self._writers.get(region_id)
+        if entry is None:
+            directory = partition_dir(self.root, region_id, self.acquired_at.date())
+            directory.mkdir(parents=True, exist_ok=True)
+            final = directory / f"{self.granule_name}.parquet"
+            temporary = directory / f".{self.granule_name}.parquet.tmp"
+            writer = self.pq.ParquetWriter(
+                temporary, self.schema,
+                compression=ARCHIVE_COMPRESSION,
+                write_statistics=True
+            )
+            entry = self._writers[region_id] = (writer, temporary, final)
+            self.rows[region_id] = 0
+        return entry[0]
+
+    def _table(self, df):
+        size = len(df)
+        order = np.argsort(np.asarray(df['latitude']), kind='stable')
+        arrays = {'acquired_at': self.pa.array(np.full(size, np.datetime64(self.acquired_at, 'ms')))}
+
+        for name, dtype in ARCHIVE_COLUMNS.items():
+            if name in df:
+                values = np.asarray(df[name])[order]
+                if name == 'classification':
+                    invalid = np.isnan(values) if values.dtype.kind == 'f' else None
+                    arrays[name] = self.pa.array(np.nan_to_num(values).astype(dtype), mask=invalid)
+                else:
+                    arrays[name] = self.pa.array(values.astype(dtype))
+            else:
+                arrays[name] = self.pa.nulls(size, self.pa.from_numpy_dtype(np.dtype(dtype)))
+
+        if self.geometry:
+            import shapely
+            points = shapely.points(np.asarray(df['longitude'])[order], np.asarray(df['latitude'])[order])
+            arrays['geometry'] = self.pa.array(shapely.to_wkb(points), type=self.pa.binary())
+
+        return self.pa.table(arrays, schema=self.schema)
+
+    def write(self, region_id, df):
+        """Acrescentar pixels (DataFrame) da região ao arquivo do granule"""
+        if len(df) == 0:
+            return 0
+        self._writer(region_id).write_table(self._table(df), row_group_size=self.row_group_rows)
+        self.rows[region_id] += len(df)
+        return len(df)
+
+    def close(self):
+        """Finalizar os arquivos e publicá-los com o nome definitivo"""
+        for writer, temporary, final in self._writers.values():
+            writer.close()
+            os.replace(temporary, final)
+        self._writers = {}
+        return self.rows
+
+    def abort(self):
+        for writer, temporary, _ in self._writers.values():
+            try:
+                writer.close()
+            finally:
+                temporary.unlink(missing_ok=True)
+        self._writers = {}
+
+
+def write_granule(df, granule_name, region_id, acquisition_start=None, root=ARCHIVE_ROOT, geometry=False):
+    """Gravar os pixels de um granule/região em um único arquivo"""
+    archive = GranuleArchive(granule_name, acquisition_start, root, geometry)
+    try:
+        archive.write(region_id, df)
+        return archive.close().get(region_id, 0)
+    except Exception:
+        archive.abort()
+        raise
+
+
+def archive_chunks(region_chunks, archive):
+    """Repassar blocos (região, pixels) gravando cada um também no arquivo"""
+    for region, df in region_chunks:
+        archive.write(region.get('id'), df)
+        yield region, df
+
+
+def read_archive(root=ARCHIVE_ROOT, regions=None, start=None, end=None, bbox=None,
+                 classes=None, columns=None):
+    """Ler pixels do arquivo com filtros empurrados para o Parquet
+
+    regions (ids) e o intervalo [start, end) podam diretórios; bbox
+    ([min_lon, min_lat, max_lon, max_lat]) e classes usam as estatísticas
+    dos row groups para pular blocos. Devolve um DataFrame.
+    """
+    pa, _, ds = _pyarrow()
+
+    if isinstance(start, date) and not isinstance(start, datetime):
+        start = datetime.combine(start, time.min)
+    if isinstance(end, date) and not isinstance(end, datetime):
+        end = datetime.combine(end, time.min)
+
+    if not Path(root).exists():
+        return pa.table({}).to_pandas()
+
+    dataset = ds.dataset(
+        root,
+        format='parquet',
+        partitioning=ds.partitioning(pa.schema([('region_id', pa.string()), ('date', pa.date32())]), flavor='hive'),
+        ignore_prefixes=['.', '_']  # temporários de escrita
+    )
+
+    conditions = []
+    if regions is not None:
+        conditions.append(ds.field('region_id').isin(list(regions)))
+    if start is not None:
+        conditions.append(ds.field('date') >= pa.scalar(start.date(), pa.date32()))
+        conditions.append(ds.field('acquired_at') >= pa.scalar(start, pa.timestamp('ms')))
+    if end is not None:
+        conditions.append(ds.field('date') <= pa.scalar(end.date(), pa.date32()))
+        conditions.append(ds.field('acquired_at') < pa.scalar(end, pa.timestamp('ms')))
+    if bbox is not None:
+        conditions += [
+            ds.field('longitude') >= bbox[0], ds.field('longitude') <= bbox[2],
+            ds.field('latitude') >= bbox[1], ds.field('latitude') <= bbox[3],
+        ]
+    if classes is not None:
+        conditions.append(ds.field('classification').isin([int(c) for c in classes]))
+
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
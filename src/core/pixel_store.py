@@ -0,0 +1,297 @@
+import json
+import os
+import shutil
+from datetime import date, datetime, time
+from pathlib import Path
+
+import numpy as np
+
+from .pixel_archive import ARCHIVE_COLUMNS
+
+# Armazenamento local dos pixels para reanálise sem o banco:
+# raiz/<region_id>/<granule>/<coluna>.npy, um arquivo .npy de tipo fixo por
+# coluna, e raiz/<region_id>/index.json com aquisição, linhas, bbox e a faixa
+# de linhas de cada classe. As linhas de um granule ficam ordenadas por
+# classificação, então filtrar por classe é fatiar o memmap (sem cópia).
+STORE_ROOT = 'data/pixels'
+STORE_INDEX = 'index.json'
+STORE_COLUMNS = ARCHIVE_COLUMNS
+
+# Classificação inválida/ausente (fora de 0..7) é gravada com este valor
+STORE_CLASS_MISSING = 255
+
+# Linhas lidas por vez ao ordenar um granule por classe (limita a memória)
+STORE_BLOCK_ROWS = 1000000
+
+
+def _as_datetime(value):
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return datetime.combine(value, time.min)
+    return value
+
+
+def _store_classification(values):
+    values = np.asarray(values)
+    valid = (values >= 0) & (values <= 7)
+    if values.dtype.kind == 'f':
+        valid &= ~np.isnan(values)
+    return np.where(valid, np.nan_to_num(values), STORE_CLASS_MISSING).astype('uint8')
+
+
+class GranuleStore:
+    """Colunas de um granule no armazenamento local, um diretório por região
+
+    Os blocos recebidos em write() vão para arquivos brutos temporários;
+    close() ordena cada região por classificação, grava os .npy finais,
+    publica o diretório e atualiza o índice da região. abort() descarta tudo.
+    """
+
+    def __init__(self, granule_name, acquisition_start=None, root=STORE_ROOT):
+        self.granule_name = granule_name
+        self.acquired_at = acquisition_start or datetime.now()
+        self.root = Path(root)
+        self._files = {}
+        self.rows = {}
+
+    def _temporary(self, region_id):
+        return self.root / str(region_id) / f".{self.granule_name}.tmp"
+
+    def _open(self, region_id):
+        files = self._files.get(region_id)
+        if files is None:
+            directory = self._temporary(region_id)
+            shutil.rmtree(directory, ignore_errors=True)
+            directory.mkdir(parents=True)
+            files = self._files[region_id] = {
+                name: open(directory / f"{name}.bin", 'wb') for name in STORE_COLUMNS
+            }
+            self.rows[region_id] = 0
+        return files
+
+    def write(self, region_id, df):
+        """Acrescentar pixels (DataFrame) da região aos arquivos do granule"""
+        if len(df) == 0:
+            return 0
+
+        files = self._open(region_id)
+        for name, dtype in STORE_COLUMNS.items():
+            if name == 'classification':
+                values = _store_classification(df[name]) if name in df else np.full(len(df), STORE_CLASS_MISSING, 'uint8')
+            elif name in df:
+                values = np.asarray(df[name]).astype(dtype)
+            else:
+                values = np.full(len(df), np.nan, dtype=dtype)
+            files[name].write(values.tobytes())
+
+        self.rows[region_id] += len(df)
+        return len(df)
+
+    def _finish(self, region_id, directory):
+        """Ordenar a região por classificação e gravar os .npy; devolve a entrada do índice
+
+        Ordenação por contagem em blocos de STORE_BLOCK_ROWS: a primeira
+        passada conta as classes (início da faixa de cada uma), a segunda
+        espalha cada bloco nas faixas. A memória usada é a de um bloco,
+        qualquer que seja o tamanho do granule.
+        """
+        rows = self.rows[region_id]
+
+        def read_block(name, start):
+            dtype = np.dtype(STORE_COLUMNS[name])
+            return np.fromfile(directory / f"{name}.bin", dtype=dtype,
+                               count=min(STORE_BLOCK_ROWS, rows - start), offset=start * dtype.itemsize)
+
+        counts = np.zeros(STORE_CLASS_MISSING + 1, dtype='int64')
+        for start in range(0, rows, STORE_BLOCK_ROWS):
+            counts += np.bincount(read_block('classification', start), minlength=len(counts))
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+
+        # .npy com o cabeçalho gravado; os dados entram por escrita posicionada
+        targets = {}
+        for name, dtype in STORE_COLUMNS.items():
+            target = np.lib.format.open_memmap(directory / f"{name}.npy", mode='w+', dtype=dtype, shape=(rows,))
+            data_offset = target.offset
+            del target
+            targets[name] = (open(directory / f"{name}.npy", 'r+b'), data_offset, np.dtype(dtype).itemsize)
+
+        position = offsets[:-1].copy()
+        bbox = [np.inf, np.inf, -np.inf, -np.inf]
+        try:
+            for start in range(0, rows, STORE_BLOCK_ROWS):
+                block = read_block('classification', start)
+                order = np.argsort(block, kind='stable')
+                block_counts = np.bincount(block, minlength=len(counts))
+                present = np.flatnonzero(block_counts)
+                block_offsets = np.concatenate([[0], np.cumsum(block_counts[present])])
+
+                for name, (handle, data_offset, itemsize) in targets.items():
+                    values = read_block(name, start)[order]
+                    for i, class_id in enumerate(present):
+                        handle.seek(data_offset + int(position[class_id]) * itemsize)
+                        handle.write(values[block_offsets[i]:block_offsets[i + 1]].tobytes())
+
+                    if name in ('longitude', 'latitude') and np.isfinite(values).any():
+                        axis = 0 if name == 'longitude' else 1
+                        bbox[axis] = min(bbox[axis], float(np.nanmin(values)))
+                        bbox[axis + 2] = max(bbox[axis + 2], float(np.nanmax(values)))
+
+                position[present] += block_counts[present]
+        finally:
+            for handle, _, _ in targets.values():
+                handle.close()
+
+        for name in STORE_COLUMNS:
+            (directory / f"{name}.bin").unlink()
+
+        return {
+            'acquired_at': self.acquired_at.isoformat(),
+            'rows': rows,
+            'bbox': [value if np.isfinite(value) else float('nan') for value in bbox],
+            'classes': {
+                str(class_id): [int(offsets[class_id]), int(offsets[class_id + 1])]
+                for class_id in np.flatnonzero(counts)
+            },
+        }
+
+    def close(self):
+        """Finalizar os arquivos, publicar os diretórios e atualizar os índices"""
+        for region_id, files in self._files.items():
+            for handle in files.values():
+                handle.close()
+
+            directory = self._temporary(region_id)
+            entry = self._finish(region_id, directory)
+
+            final = self.root / str(region_id) / self.granule_name
+            if final.exists():
+                shutil.rmtree(final)
+            os.replace(directory, final)
+            _update_index(self.root / str(region_id), self.granule_name, entry)
+
+        self._files = {}
+        return self.rows
+
+    def abort(self):
+        for region_id, files in self._files.items():
+            for handle in files.values():
+                handle.close()
+            shutil.rmtree(self._temporary(region_id), ignore_errors=True)
+        self._files = {}
+
+
+def _update_index(region_dir, granule_name, entry):
+    path = region_dir / STORE_INDEX
+    index = json.loads(path.read_text()) if path.exists() else {}
+    index[granule_name] = entry
+
+    temporary = region_dir / f".{STORE_INDEX}.tmp"
+    temporary.write_text(json.dumps(index, indent=1, sort_keys=True))
+    os.replace(temporary, path)
+
+
+def store_granule(df, granule_name, region_id, acquisition_start=None, root=STORE_ROOT):
+    """Gravar os pixels de um granule/região de uma vez"""
+    store = GranuleStore(granule_name, acquisition_start, root)
+    try:
+        store.write(region_id, df)
+        return store.close().get(region_id, 0)
+    except Exception:
+        store.abort()
+        raise
+
+
+class PixelStore:
+    """Leitura do armazenamento local com memmap do NumPy (sem cópia e sem parsing)"""
+
+    def __init__(self, root=STORE_ROOT):
+        self.root = Path(root)
+
+    def regions(self):
+        if not self.root.exists():
+            return []
+        return sorted(p.name for p in self.root.iterdir() if (p / STORE_INDEX).exists())
+
+    def index(self, region_id):
+        """Entradas do índice da região ({granule: entrada})"""
+        path = self.root / str(region_id) / STORE_INDEX
+        return json.loads(path.read_text()) if path.exists() else {}
+
+    def has(self, region_id, granule_name):
+        return granule_name in self.index(region_id)
+
+    def granules(self, region_id, start=None, end=None):
+        """Granules da região com aquisição em [start, end), em ordem de aquisição"""
+        start, end = _as_datetime(start), _as_datetime(end)
+        selected = []
+        for name, entry in self.index(region_id).items():
+            acquired_at = datetime.fromisoformat(entry['acquired_at'])
+            if start is not None and acquired_at < start:
+                continue
+            if end is not None and acquired_at >= end:
+                continue
+            selected.append(dict(entry, granule=name, acquired_at=acquired_at))
+        return sorted(selected, key=lambda entry: entry['acquired_at'])
+
+    def open(self, region_id, granule_name, columns=None):
+        """Colunas do granule como memmap somente leitura"""
+        directory = self.root / str(region_id) / granule_name
+        return {
+            name: np.load(directory / f"{name}.npy", mmap_mode='r')
+            for name in (columns or STORE_COLUMNS)
+        }
+
+    def frame(self, region_id, granule_name, columns=None):
+        """Um granule/região inteiro como DataFrame (cópia das colunas)"""
+        import pandas as pd
+
+        return pd.DataFrame({
+            name: np.asarray(values) for name, values in self.open(region_id, granule_name, columns).items()
+        })
+
+    def query(self, region_id, start=None, end=None, classes=None, columns=None):
+        """Pixels da região filtrados por tempo e classe, como fatias dos memmaps
+
+        Gera (entrada do índice, {coluna: view}) por faixa contígua de linhas:
+        uma por granule sem classes, ou uma por sequência de classes vizinhas
+        presentes no granule. Nada é copiado para a memória.
+        """
+        wanted = None if classes is None else {int(c) for c in classes}
+
+        for entry in self.granules(region_id, start, end):
+            ranges = sorted(
+                (int(class_id), bounds) for class_id, bounds in entry['classes'].items()
+                if wanted is None or int(class_id) in wanted
+            )
+            if not ranges:
+                continue
+
+            # Classes consecutivas no arquivo viram uma única fatia
+            slices = []
+            for _, (first, last) in ranges:
+                if slices and slices[-1][1] == first:
+                    slices[-1][1] = last
+                else:
+                    slices.append([first, last])
+
+            arrays = self.open(region_id, entry['granule'], columns)
+            for first, last in slices:
+                yield entry, {name: values[first:last] for name, values in arrays.items()}
+
+    def load(self, region_id, start=None, end=None, classes=None, columns=None):
+        """Conveniência: query() concatenada em um DataFrame (aqui sim há cópia)"""
+        import pandas as pd
+
+        names = list(columns or STORE_COLUMNS)
+        parts = {name: [] for name in names}
+        acquired = []
+        for entry, views in self.query(region_id, start, end, classes, names):
+            for name in names:
+                parts[name].append(views[name])
+            acquired.append(np.full(len(views[names[0]]), np.datetime64(entry['acquired_at'], 'ms')))
+
+        if not acquired:
+            return pd.DataFrame(columns=['acquired_at'] + names)
+
+        data = {'acquired_at': np.concatenate(acquired)}
+        data.update({name: np.concatenate(parts[name]) for name in names})
+        return pd.DataFrame(data)
@@ -0,0 +1,241 @@
+import threading
+
+import numpy as np
+import shapely
+from shapely.geometry import shape
+
+from .granule_planner import REGION_BUFFER_DEG
+
+try:
+    from shapely import contains_xy
+except ImportError:  # shapely < 2.0
+    from shapely.vectorized import contains as contains_xy
+
+# Lado da célula da grade (graus); cada célula guarda as regiões que a tocam
+REGION_INDEX_CELL_DEG = 0.25
+# Até esse número de células a localização usa uma tabela direta; acima, busca binária
+MAX_DENSE_CELLS = 4000000
+
+# Máscara raster dos polígonos (~200 m); a resolução cresce para caber no limite de células
+POLYGON_MASK_RESOLUTION_DEG = 0.002
+POLYGON_MASK_MAX_CELLS = 250000
+
+_mask_cache = {}
+_mask_lock = threading.Lock()
+
+
+def region_geometry(region):
+    """Geometria (shapely) da região, se ela tiver polígono; None para regiões só com bbox"""
+    geometry = region.get('geometry')
+    if geometry is None:
+        return None
+    if isinstance(geometry, dict):
+        geometry = shape(geometry)
+    return geometry
+
+
+def region_bounds(region, buffer=REGION_BUFFER_DEG):
+    """[min_lon, min_lat, max_lon, max_lat] da região; o buffer vale só para bbox"""
+    geometry = region_geometry(region)
+    if geometry is not None:
+        return list(geometry.bounds)
+
+    bbox = region['bbox']
+    return [bbox[0] - buffer, bbox[1] - buffer, bbox[2] + buffer, bbox[3] + buffer]
+
+
+class PolygonMask:
+    """Máscara raster de um polígono sobre o seu bbox
+
+    Células inteiramente dentro ou fora resolvem o pixel só por indexação;
+    o teste exato (contains_xy) fica para os pixels das células da borda.
+    Para trechos de rio longos e finos quase todo o bbox é fora.
+    """
+
+    OUTSIDE, INSIDE, EDGE = 0, 1, 2
+
+    def __init__(self, geometry, resolution=POLYGON_MASK_RESOLUTION_DEG, max_cells=POLYGON_MASK_MAX_CELLS):
+        self.geometry = geometry
+        min_lon, min_lat, max_lon, max_lat = geometry.bounds
+        width, height = max_lon - min_lon, max_lat - min_lat
+
+        self.resolution = max(resolution, np.sqrt(width * height / max_cells))
+        self.origin = (min_lon, min_lat)
+        nx = int(width / self.resolution) + 1
+        ny = int(height / self.resolution) + 1
+
+        xs = min_lon + np.arange(nx) * self.resolution
+        ys = min_lat + np.arange(ny) * self.resolution
+        cells = shapely.box(xs[None, :], ys[:, None], xs[None, :] + self.resolution, ys[:, None] + self.resolution)
+
+        shapely.prepare(geometry)
+        self.state = np.full((ny, nx), self.EDGE, dtype='uint8')
+        self.state[~shapely.intersects(geometry, cells)] = self.OUTSIDE
+        self.state[shapely.contains_properly(geometry, cells)] = self.INSIDE
+
+    def contains(self, longitude, latitude):
+        ny, nx = self.state.shape
+        ix = np.floor((longitude - self.origin[0]) / self.resolution).astype('int64')
+        iy = np.floor((latitude - self.origin[1]) / self.resolution).astype('int64')
+        valid = (ix >= 0) & (ix < nx) & (iy >= 0) & (iy < ny)
+
+        state = np.full(len(longitude), self.OUTSIDE, dtype='uint8')
+        state[valid] = self.state[iy[valid], ix[valid]]
+
+        inside = state == self.INSIDE
+        edge = np.flatnonzero(state == self.EDGE)
+        inside[edge] = contains_xy(self.geometry, longitude[edge], latitude[edge])
+        return inside
+
+
+def polygon_mask(geometry):
+    """PolygonMask da geometria, construída uma vez por processo"""
+    if not hasattr(shapely, 'contains_properly'):  # shapely < 2.0: só o teste exato
+        return None
+
+    key = geometry.wkb
+    with _mask_lock:
+        mask = _mask_cache.get(key)
+    if mask is None:
+        mask = PolygonMask(geometry)
+        with _mask_lock:
+            _mask_cache[key] = mask
+    return mask
+
+
+class RegionIndex:
+    """Índice espacial das regiões em uma grade ordenada
+
+    Cada pixel cai em uma célula (divisão inteira) e a célula é localizada
+    por tabela direta (ou busca binária nas células ocupadas, em grades
+    muito grandes); só as regiões daquela célula
+    são testadas (bbox e, se houver, polígono). O custo por pixel depende
+    das regiões que se sobrepõem ali, não do tamanho do catálogo.
+    """
+
+    def __init__(self, regions, buffer=REGION_BUFFER_DEG, cell_deg=REGION_INDEX_CELL_DEG):
+        self.regions = list(regions)
+        self.cell_deg = cell_deg
+        self.geometries = [region_geometry(region) for region in self.regions]
+        self.bounds = np.array(
+            [region_bounds(region, buffer) for region in self.regions], dtype='float64'
+        ).reshape(-1, 4)
+
+        self.masks = [polygon_mask(geometry) if geometry is not None else None for geometry in self.geometries]
+
+        self._build()
+
+    def _build(self):
+        if len(self.regions) == 0:
+            self.origin = (0.0, 0.0)
+            self.nx = self.ny = 1
+            self._cell_table = None
+            self._cell_keys = np.empty(0, dtype='int64')
+            self._cell_start = np.empty(0, dtype='int64')
+            self._cell_count = np.empty(0, dtype='int64')
+            self._owners = np.empty(0, dtype='int64')
+            return
+
+        self.origin = (self.bounds[:, 0].min(), self.bounds[:, 1].min())
+        self.nx = int(np.floor((self.bounds[:, 2].max() - self.origin[0]) / self.cell_deg)) + 1
+        self.ny = int(np.floor((self.bounds[:, 3].max() - self.origin[1]) / self.cell_deg)) + 1
+
+        keys, owners = [], []
+        for i, (min_lon, min_lat, max_lon, max_lat) in enumerate(self.bounds):
+            ix = np.arange(self._cell(min_lon, self.origin[0]), self._cell(max_lon, self.origin[0]) + 1)
+            iy = np.arange(self._cell(min_lat, self.origin[1]), self._cell(max_lat, self.origin[1]) + 1)
+            cells = (iy[:, None] * self.nx + ix[None, :]).ravel()
+            keys.append(cells)
+            owners.append(np.full(len(cells), i, dtype='int64'))
+
+        keys = np.concatenate(keys)
+        owners = np.concatenate(owners)
+        order = np.lexsort((owners, keys))
+
+        self._owners = owners[order]
+        self._cell_keys, self._cell_start, self._cell_count = np.unique(
+            keys[order], return_index=True, return_counts=True
+        )
+
+        # Grade pequena: posição de cada célula ocupada direto por índice
+        self._cell_table = None
+        if self.nx * self.ny <= MAX_DENSE_CELLS:
+            self._cell_table = np.full(self.nx * self.ny, -1, dtype='int64')
+            self._cell_table[self._cell_keys] = np.arange(len(self._cell_keys))
+
+    def _cell(self, value, origin):
+        return int(np.floor((value - origin) / self.cell_deg))
+
+    def candidates(self, longitude, latitude):
+        """Pares (pixel, região) cujo bbox contém o pixel"""
+        longitude = np.asarray(longitude, dtype='float64')
+        latitude = np.asarray(latitude, dtype='float64')
+
+        # Descartar de saída o que está fora do envelope de todas as regiões (e NaN)
+        pixel = np.flatnonzero(
+            (longitude >= self.origin[0]) & (longitude < self.origin[0] + self.nx * self.cell_deg) &
+            (latitude >= self.origin[1]) & (latitude < self.origin[1] + self.ny * self.cell_deg)
+        )
+        ix = ((longitude[pixel] - self.origin[0]) / self.cell_deg).astype('int64')
+        iy = ((latitude[pixel] - self.origin[1]) / self.cell_deg).astype('int64')
+        cell = iy * self.nx + ix
+
+        if self._cell_table is not None:
+            pos = self._cell_table[cell]
+            hit = pos >= 0
+        else:
+            pos = np.searchsorted(self._cell_keys, cell)
+            hit = pos < len(self._cell_keys)
+            hit[hit] = self._cell_keys[pos[hit]] == cell[hit]
+        pixel, pos = pixel[hit], pos[hit]
+
+        # Expandir cada pixel nas regiões da sua célula
+        counts = self._cell_count[pos]
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        region = self._owners[np.repeat(self._cell_start[pos], counts) + offsets]
+        pixel = np.repeat(pixel, counts)
+
+        b = self.bounds[region]
+        x, y = longitude[pixel], latitude[pixel]
+        inside = (x >= b[:, 0]) & (x <= b[:, 2]) & (y >= b[:, 1]) & (y <= b[:, 3])
+        return pixel[inside], region[inside]
+
+    def split_indices(self, longitude, latitude):
+        """Índices (ordenados) dos pixels de cada região, na ordem de self.regions"""
+        longitude = np.asarray(longitude, dtype='float64')
+        latitude = np.asarray(latitude, dtype='float64')
+
+        # candidates já vem em ordem de pixel; ordenação estável por região mantém isso
+        pixel, region = self.candidates(longitude, latitude)
+        order = np.argsort(region, kind='stable')
+        pixel, region = pixel[order], region[order]
+        edges = np.searchsorted(region, np.arange(len(self.regions) + 1))
+
+        parts = []
+        for i, geometry in enumerate(self.geometries):
+            indices = pixel[edges[i]:edges[i + 1]]
+            if geometry is not None and len(indices):
+                if self.masks[i] is not None:
+                    inside = self.masks[i].contains(longitude[indices], latitude[indices])
+                else:
+                    inside = contains_xy(geometry, longitude[indices], latitude[indices])
+                indices = indices[inside]
+            parts.append(indices)
+        return parts
+
+    def contains_any(self, longitude, latitude):
+        """Máscara dos pixels que caem em pelo menos uma região"""
+        inside = np.zeros(len(longitude), dtype=bool)
+        for indices in self.split_indices(longitude, latitude):
+            inside[indices] = True
+        return inside
+
+
+def split_by_region(df, regions, buffer=REGION_BUFFER_DEG, index=None):
+    """Distribuir os pixels de um granule entre as regiões em uma só passada"""
+    if not regions:
+        return []
+
+    index = index or RegionIndex(regions, buffer)
+    parts = index.split_indices(df['longitude'].to_numpy(), df['latitude'].to_numpy())
+    return [(region, df.iloc[indices]) for region, indices in zip(index.regions, parts)]
@@ -1,65 +1,220 @@
 import earthaccess
 from datetime import datetime, timedelta
 import logging
+import threading
+
+from .download_pool import DownloadPool
+from .granule_planner import extract_native_id
+from .footprints import CLUSTER_GAP_DEG, assign_granules, envelope, merge_region_clusters
+
+# Validade assumida da sessão quando o token não informa expiração
+SESSION_MAX_AGE = timedelta(hours=12)
+# Renovar um pouco antes de expirar
+SESSION_RENEW_MARGIN = timedelta(minutes=10)
+
+AUTH_ERROR_MARKERS = ('401', '403', 'unauthorized', 'forbidden', 'expired')
+
+
+def is_auth_error(error):
+    """Erro de sessão/token (vale autenticar de novo e repetir)"""
+    message = str(error).lower()
+    return any(marker in message for marker in AUTH_ERROR_MARKERS)
+
 
 class SWOTDownloader:
-    def __init__(self):
+    """Busca e download no Earthdata com uma sessão por execução
+
+    O login é feito sob demanda, uma única vez, e reaproveitado por todas
+    as buscas e downloads (inclusive das threads do pipeline). A sessão é
+    renovada quando o token expira ou quando uma chamada falha por
+    autenticação. backend é o módulo earthaccess por padrão; qualquer
+    objeto com login, search_data e download serve (ex.: um mock).
+    """
+    
+    def __init__(self, cache=None, backend=None, session_max_age=SESSION_MAX_AGE, clock=datetime.utcnow):
         self.logger = logging.getLogger('swot')
         self.auth = None
+        self.cache = cache  # GranuleCache opcional
+        self.backend = backend or earthaccess
+        self.session_max_age = session_max_age
+        self.clock = clock
+        self.expires_at = None
+        self.logins = 0
+        self.search_failures = 0
+        self._auth_lock = threading.Lock()
     
-    def authenticate(self):
-        """Autenticar com NASA Earthdata"""
+    def _token_expiration(self):
+        """Expiração informada pelo token do Earthdata, se houver"""
         try:
-            self.auth = earthaccess.login()
-            if self.auth:
-                self.logger.info("Autenticado com NASA Earthdata")
+            return datetime.strptime(self.auth.token['expiration_date'], '%m/%d/%Y')
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return None
+    
+    def session_valid(self):
+        return (
+            self.auth is not None and
+            self.expires_at is not None and
+            self.clock() < self.expires_at - SESSION_RENEW_MARGIN
+        )
+    
+    def invalidate(self):
+        """Descartar a sessão atual (próxima chamada autentica de novo)"""
+        with self._auth_lock:
+            self.auth = None
+            self.expires_at = None
+    
+    def authenticate(self, force=False):
+        """Autenticar com NASA Earthdata (reaproveita a sessão enquanto válida)"""
+        with self._auth_lock:
+            if not force and self.session_valid():
                 return True
-            else:
-                self.logger.error("Falha na autenticacao")
+            
+            try:
+                self.auth = self.backend.login()
+                self.logins += 1
+                if self.auth:
+                    now = self.clock()
+                    self.expires_at = min(self._token_expiration() or now + self.session_max_age,
+                                          now + self.session_max_age)
+                    self.logger.info("Autenticado com NASA Earthdata")
+                    return True
+                else:
+                    self.auth = None
+                    self.logger.error("Falha na autenticacao")
+                    return False
+            except Exception as e:
+                self.auth = None
+                self.logger.error(f"Erro na autenticacao: {e}")
                 return False
+    
+    def _call(self, func, *args, **kwargs):
+        """Chamar o backend com sessão válida; em erro de autenticação renova e repete uma vez"""
+        if not self.authenticate():
+            raise RuntimeError("Sem sessão Earthdata")
+        
+        try:
+            return func(*args, **kwargs)
         except Exception as e:
-            self.logger.error(f"Erro na autenticacao: {e}")
-            return False
+            if not is_auth_error(e):
+                raise
+            self.logger.warning(f"Sessão Earthdata recusada ({e}), autenticando novamente")
+            self.invalidate()
+            if not self.authenticate():
+                raise
+            return func(*args, **kwargs)
     
-    def search_data(self, region, days_back=2):
-        """Buscar dados SWOT para uma região - VERSÃO CORRIGIDA"""
+    def _search_bbox(self, bbox, start, end):
+        """Uma consulta ao CMR por bbox e intervalo de aquisição"""
+        start_date = start.strftime('%Y-%m-%dT%H:%M:%SZ')
+        end_date = end.strftime('%Y-%m-%dT%H:%M:%SZ')
+        
+        self.logger.info(f"Buscando dados de {start_date} ate {end_date}")
+        
+        return self._call(
+            self.backend.search_data,
+            short_name='SWOT_L2_HR_PIXC_2.0',  
+            bounding_box=(bbox[0], bbox[1], bbox[2], bbox[3]),  
+            temporal=(start_date, end_date)
+        )
+    
+    def _search_failed(self):
+        with self._auth_lock:
+            self.search_failures += 1
+    
+    def search_data(self, region, days_back=2, start=None, end=None):
+        """Buscar dados SWOT para uma região entre start e end (padrão: últimos days_back dias)"""
         if not self.authenticate():
             return []
         
         try:
+            end = end or datetime.utcnow()
+            start = start or end - timedelta(days=days_back)
             
-            start_date = '2023-11-01'
-            end_date = '2023-11-30'
-            
-            print(f"   Buscando dados de {start_date} ate {end_date}")
-            
-            
-            bbox = region['bbox']
-            
-           
-            results = earthaccess.search_data(
-                short_name='SWOT_L2_HR_PIXC_2.0',  
-                bounding_box=(bbox[0], bbox[1], bbox[2], bbox[3]),  
-                temporal=(start_date, end_date)
-            )
+            results = self._search_bbox(region['bbox'], start, end)
             
             self.logger.info(f"Encontrados {len(results)} granules para {region['name']}")
             return results
             
         except Exception as e:
-            self.logger.error(f"Erro na busca: {e}")
+            self.logger.exception(f"Erro na busca: {e}")
+            self._search_failed()
             return []
     
+    def search_cluster(self, regions, window=None, days_back=2):
+        """Uma única busca para um grupo de regiões, pelo envelope dos bbox
+        
+        window(region) -> (início, fim) define a janela de cada região; a
+        busca cobre a união das janelas e os granules são atribuídos às
+        regiões localmente (footprint e janela). Devolve [(região, granules)].
+        """
+        if not self.authenticate():
+            return [(region, []) for region in regions]
+        
+        now = datetime.utcnow()
+        windows = {
+            region.get('id'): window(region) if window else (now - timedelta(days=days_back), now)
+            for region in regions
+        }
+        
+        try:
+            results = self._search_bbox(
+                envelope([region['bbox'] for region in regions]),
+                min(start for start, _ in windows.values()),
+                max(end for _, end in windows.values())
+            )
+        except Exception as e:
+            self.logger.exception(f"Erro na busca: {e}")
+            self._search_failed()
+            return [(region, []) for region in regions]
+        
+        self.logger.info(f"Encontrados {len(results)} granules para {len(regions)} regiões")
+        return assign_granules(results, regions, windows)
+    
+    def search_regions(self, regions, window=None, days_back=2, cluster_gap_deg=CLUSTER_GAP_DEG):
+        """Buscar todas as regiões com uma consulta por grupo de regiões próximas"""
+        region_results = []
+        for cluster in merge_region_clusters(regions, cluster_gap_deg):
+            region_results.extend(self.search_cluster(cluster, window, days_back))
+        return region_results
+    
+    def _download(self, granules, output_dir, pin=False):
+        """earthaccess.download passando pelo cache local quando configurado"""
+        if self.cache is None:
+            return self._call(self.backend.download, granules, output_dir)
+        
+        files = []
+        for granule in granules:
+            files.extend(self.cache.fetch(
+                extract_native_id(granule),
+                lambda directory: self._call(self.backend.download, [granule], directory),
+                pin=pin
+            ))
+        return files
+    
     def download_data(self, results, output_dir='data/raw'):
         """Download dos dados"""
         try:
             if not results:
                 return []
             
-            files = earthaccess.download(results, output_dir)
+            files = self._download(results, output_dir)
             self.logger.info(f"Baixados {len(files)} arquivos")
             return files
             
         except Exception as e:
             self.logger.error(f"Erro no download: {e}")
-            return []
\ No newline at end of file
+            return []
+    
+    def download_with_retry(self, granule, output_dir, max_retries=3, pin=False):
+        """Baixar um único granule com retry e backoff
+        
+        Com pin os arquivos no cache ficam reservados até release(granule).
+        """
+        pool = DownloadPool(lambda granules, directory: self._download(granules, directory, pin),
+                            max_retries=max_retries)
+        return pool.fetch(granule, output_dir)
+    
+    def release(self, granule):
+        """Liberar os arquivos reservados por download_with_retry(pin=True)"""
+        if self.cache is not None:
+            self.cache.release(extract_native_id(granule))
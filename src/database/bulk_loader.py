@@ -0,0 +1,341 @@
+import io
+import logging
+from datetime import datetime, date
+
+import numpy as np
+
+from .partitions import ensure_partition
+from .pixel_summary import SUMMARY_TABLE, PixelSummary, write_summary
+from .water_levels import (WATER_LEVEL_TABLE, PASS_LEVEL_TABLE, SCANNED_TABLE, WaterLevelAccumulator,
+                           write_water_level)
+from .ingest_stats import STATS_TABLE, existing_tables, record_ingest
+
+# Tabelas derivadas gravadas junto com os pixels, quando a migração já criou
+DERIVED_TABLES = (SUMMARY_TABLE, WATER_LEVEL_TABLE, PASS_LEVEL_TABLE, SCANNED_TABLE, STATS_TABLE)
+
+# Colunas gravadas pelo COPY (created_at fica com o DEFAULT da tabela)
+PIXEL_COLUMNS = ('granule_id', 'latitude', 'longitude', 'height_m',
+                 'classification_id', 'coherent_power')
+
+# Schema particionado (migração 2): acquired_on logo após granule_id
+PARTITIONED_PIXEL_COLUMNS = ('granule_id', 'acquired_on') + PIXEL_COLUMNS[1:]
+
+# Época das datas no formato binário do PostgreSQL
+PG_EPOCH = date(2000, 1, 1)
+
+# Classificações fora de 0..MAX_CLASSIFICATION são gravadas como NULL
+MAX_CLASSIFICATION = 7
+
+# Linhas enviadas por comando COPY - limita o buffer em memória
+COPY_CHUNK_ROWS = 100000
+
+COPY_NULL = '\\N'
+
+logger = logging.getLogger('swot')
+
+
+def extract_pixel_columns(data):
+    """Extrair colunas NumPy de um DataFrame ou dict de arrays"""
+    latitude = np.asarray(data['latitude'], dtype='float64')
+    size = len(latitude)
+
+    columns = {
+        'latitude': latitude,
+        'longitude': np.asarray(data['longitude'], dtype='float64'),
+    }
+
+    for name in ('height', 'coherent_power', 'pixel_area'):
+        if name in data:
+            columns[name] = np.asarray(data[name], dtype='float64')
+        else:
+            columns[name] = np.full(size, np.nan)
+
+    if 'classification' in data:
+        classification = np.asarray(data['classification'])
+        valid = (classification >= 0) & (classification <= MAX_CLASSIFICATION)
+        if classification.dtype.kind == 'f':
+            valid &= ~np.isnan(classification)
+        columns['classification'] = np.where(valid, classification, 0).astype('int16')
+        columns['classification_valid'] = valid
+    else:
+        columns['classification'] = np.zeros(size, dtype='int16')
+        columns['classification_valid'] = np.zeros(size, dtype=bool)
+
+    return columns
+
+
+def _format_column(values, fmt, null_mask):
+    """Formatar coluna como texto do COPY, trocando nulos por \\N"""
+    text = np.char.mod(fmt, values)
+    if null_mask.any():
+        text = np.where(null_mask, COPY_NULL, text)
+    return text.tolist()
+
+
+def build_copy_buffer(granule_id, columns, start=0, stop=None, acquired_on=None):
+    """Montar buffer texto (formato COPY) para um intervalo de linhas"""
+    window = slice(start, stop)
+
+    latitude = columns['latitude'][window]
+    longitude = columns['longitude'][window]
+    height = columns['height'][window]
+    classification = columns['classification'][window]
+    classification_valid = columns['classification_valid'][window]
+    coherent_power = columns['coherent_power'][window]
+
+    fields = [
+        [str(granule_id)] * len(latitude),
+        _format_column(latitude, '%.6f', np.isnan(latitude)),
+        _format_column(longitude, '%.6f', np.isnan(longitude)),
+        _format_column(height, '%.3f', np.isnan(height)),
+        _format_column(classification, '%d', ~classification_valid),
+        _format_column(coherent_power, '%.6f', np.isnan(coherent_power)),
+    ]
+    if acquired_on is not None:
+        fields.insert(1, [acquired_on.isoformat()] * len(latitude))
+
+    lines = '\n'.join(map('\t'.join, zip(*fields)))
+    return io.StringIO(lines + '\n' if lines else '')
+
+
+# Cabeçalho e fim do formato binário do COPY
+PGCOPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + b'\x00\x00\x00\x00' + b'\x00\x00\x00\x00'
+PGCOPY_TRAILER = b'\xff\xff'
+
+
+def build_copy_binary(granule_id, columns, start=0, stop=None, acquired_on=None):
+    """Montar buffer binário do COPY (schema compacto float4/int2)
+
+    Cada linha tem tamanho fixo para um dado padrão de NULLs, então as
+    linhas são agrupadas por padrão e cada grupo vira um array estruturado.
+    """
+    window = slice(start, stop)
+
+    nullable = [
+        ('height_m', columns['height'][window], '>f4', np.isnan(columns['height'][window])),
+        ('classification_id', columns['classification'][window], '>i2', ~columns['classification_valid'][window]),
+        ('coherent_power', columns['coherent_power'][window], '>f4', np.isnan(columns['coherent_power'][window])),
+    ]
+    latitude = columns['latitude'][window]
+    longitude = columns['longitude'][window]
+
+    pattern = np.zeros(len(latitude), dtype='uint8')
+    for bit, (_, _, _, is_null) in enumerate(nullable):
+        pattern |= is_null.astype('uint8') << bit
+
+    parts = [PGCOPY_HEADER]
+    for code in np.unique(pattern):
+        rows = pattern == code
+
+        fields = [
+            ('field_count', '>i2'),
+            ('granule_id_len', '>i4'), ('granule_id', '>i4'),
+        ]
+        if acquired_on is not None:
+            fields += [('acquired_on_len', '>i4'), ('acquired_on', '>i4')]
+        fields += [
+            ('latitude_len', '>i4'), ('latitude', '>f4'),
+            ('longitude_len', '>i4'), ('longitude', '>f4'),
+        ]
+        for bit, (name, _, dtype, _) in enumerate(nullable):
+            fields.append((f'{name}_len', '>i4'))
+            if not code & (1 << bit):
+                fields.append((name, dtype))
+
+        record = np.empty(int(rows.sum()), dtype=np.dtype(fields))
+        record['field_count'] = len(PIXEL_COLUMNS) + (acquired_on is not None)
+        record['granule_id_len'] = 4
+        record['granule_id'] = granule_id
+        if acquired_on is not None:
+            record['acquired_on_len'] = 4
+            record['acquired_on'] = (acquired_on - PG_EPOCH).days
+        record['latitude_len'] = 4
+        record['latitude'] = latitude[rows]
+        record['longitude_len'] = 4
+        record['longitude'] = longitude[rows]
+
+        for bit, (name, values, dtype, _) in enumerate(nullable):
+            if code & (1 << bit):
+                record[f'{name}_len'] = -1
+            else:
+                record[f'{name}_len'] = np.dtype(dtype).itemsize
+                record[name] = values[rows]
+
+        parts.append(record.tobytes())
+
+    parts.append(PGCOPY_TRAILER)
+    return io.BytesIO(b''.join(parts))
+
+
+def pixel_table_layout(cursor):
+    """Formato do COPY e particionamento conforme o schema atual de pixel_data
+
+    Layout compacto (REAL) aceita COPY binário; com acquired_on a tabela
+    é particionada por mês (migração 2).
+    """
+    cursor.execute("""
+        SELECT column_name, data_type FROM information_schema.columns
+        WHERE table_name = 'pixel_data' AND column_name IN ('latitude', 'acquired_on')
+    """)
+    types = dict(cursor.fetchall())
+    return {
+        'copy_format': 'binary' if types.get('latitude') == 'real' else 'text',
+        'partitioned': 'acquired_on' in types,
+    }
+
+
+def copy_pixels(cursor, granule_id, data, chunk_rows=COPY_CHUNK_ROWS, copy_format='text',
+                table='pixel_data', acquired_on=None):
+    """Enviar pixels via COPY FROM STDIN (acquired_on só no schema particionado)"""
+    return copy_columns(cursor, granule_id, extract_pixel_columns(data), chunk_rows,
+                        copy_format, table, acquired_on)
+
+
+def copy_columns(cursor, granule_id, columns, chunk_rows=COPY_CHUNK_ROWS, copy_format='text',
+                 table='pixel_data', acquired_on=None):
+    """COPY de colunas já extraídas por extract_pixel_columns"""
+    total = len(columns['latitude'])
+
+    names = PIXEL_COLUMNS if acquired_on is None else PARTITIONED_PIXEL_COLUMNS
+    sql = f"COPY {table} ({', '.join(names)}) FROM STDIN"
+    build = build_copy_buffer
+    if copy_format == 'binary':
+        sql += " WITH (FORMAT binary)"
+        build = build_copy_binary
+
+    for start in range(0, total, chunk_rows):
+        cursor.copy_expert(sql, build(granule_id, columns, start, start + chunk_rows, acquired_on))
+
+    return total
+
+
+def prepare_copy(db_connection, cursor, acquisition_start):
+    """Definir formato, tabela de destino e data de aquisição do COPY
+
+    No schema particionado a carga vai direto para a partição do mês,
+    criada antes (em transação própria) se ainda não existir.
+    """
+    layout = pixel_table_layout(cursor)
+    options = {'copy_format': layout['copy_format']}
+
+    if layout['partitioned']:
+        acquired_on = (acquisition_start or datetime.now()).date()
+        options['table'] = ensure_partition(db_connection, acquired_on)
+        options['acquired_on'] = acquired_on
+
+    return options
+
+
+def create_granule(cursor, granule_name, region, total_pixels, acquisition_start=None):
+    """Inserir a linha do granule para a região e devolver o granule_id"""
+    cursor.execute("""
+        INSERT INTO granules (granule_name, mission_id, region_id, total_pixels, acquisition_start, created_at)
+        VALUES (%s, 1, %s, %s, %s, %s)
+        RETURNING granule_id
+    """, (granule_name, region.get('id'), total_pixels, acquisition_start, datetime.now()))
+
+    return cursor.fetchone()[0]
+
+
+def insert_granule_data(df, granule_name, region, db_connection, acquisition_start=None, store_pixels=True):
+    """Inserir granule, seus pixels (COPY), o resumo por classe e o nível d'água em uma única transação
+
+    Com store_pixels=False os pixels não vão para pixel_data (ficam só no
+    arquivo Parquet); granule, resumo, nível e contadores são gravados igual.
+    """
+    try:
+        cursor = db_connection.cursor()
+        if store_pixels:
+            copy_options = prepare_copy(db_connection, cursor, acquisition_start)
+
+        derived = existing_tables(cursor, DERIVED_TABLES)
+
+        columns = extract_pixel_columns(df)
+        granule_id = create_granule(cursor, granule_name, region, len(df), acquisition_start)
+        if store_pixels:
+            copy_columns(cursor, granule_id, columns, **copy_options)
+
+        if SUMMARY_TABLE in derived:
+            summary = PixelSummary()
+            summary.add(columns)
+            write_summary(cursor, granule_id, region.get('id'), acquisition_start, summary)
+
+        if WATER_LEVEL_TABLE in derived:
+            water = WaterLevelAccumulator()
+            water.add(columns)
+            write_water_level(cursor, granule_id, region.get('id'), acquisition_start, water.level(),
+                              granule_name, passes=PASS_LEVEL_TABLE in derived, scanned=SCANNED_TABLE in derived)
+
+        if STATS_TABLE in derived:
+            record_ingest(cursor, region.get('id'), len(df) if store_pixels else 0, acquisition_start)
+
+        db_connection.commit()
+        cursor.close()
+        return True
+
+    except Exception as e:
+        logger.exception(f"Erro inserção {granule_name} ({region.get('id')}): {e}")
+        db_connection.rollback()
+        return False
+
+
+def insert_granule_stream(region_chunks, granule_name, db_connection, acquisition_start=None, store_pixels=True):
+    """Inserir um granule a partir de blocos (região, pixels) em uma única transação
+
+    Cada região ganha sua linha em granules no primeiro bloco não vazio;
+    total_pixels é acertado no final. Devolve {region_id: pixels} ou None.
+    """
+    try:
+        cursor = db_connection.cursor()
+        if store_pixels:
+            copy_options = prepare_copy(db_connection, cursor, acquisition_start)
+        derived = existing_tables(cursor, DERIVED_TABLES)
+        with_summary = SUMMARY_TABLE in derived
+        with_levels = WATER_LEVEL_TABLE in derived
+        granule_ids = {}
+        totals = {}
+        summaries = {}
+        levels = {}
+
+        for region, df in region_chunks:
+            if len(df) == 0:
+                continue
+
+            region_id = region.get('id')
+            if region_id not in granule_ids:
+                granule_ids[region_id] = create_granule(cursor, granule_name, region, 0, acquisition_start)
+                totals[region_id] = 0
+                summaries[region_id] = PixelSummary()
+                levels[region_id] = WaterLevelAccumulator()
+
+            columns = extract_pixel_columns(df)
+            if store_pixels:
+                copy_columns(cursor, granule_ids[region_id], columns, **copy_options)
+            totals[region_id] += len(columns['latitude'])
+            if with_summary:
+                summaries[region_id].add(columns)
+            if with_levels:
+                levels[region_id].add(columns)
+
+        for region_id, total in totals.items():
+            cursor.execute(
+                "UPDATE granules SET total_pixels = %s WHERE granule_id = %s",
+                (total, granule_ids[region_id])
+            )
+            if with_summary:
+                write_summary(cursor, granule_ids[region_id], region_id, acquisition_start, summaries[region_id])
+            if with_levels:
+                write_water_level(cursor, granule_ids[region_id], region_id, acquisition_start,
+                                  levels[region_id].level(), granule_name, passes=PASS_LEVEL_TABLE in derived,
+                                  scanned=SCANNED_TABLE in derived)
+            if STATS_TABLE in derived:
+                record_ingest(cursor, region_id, total if store_pixels else 0, acquisition_start)
+
+        db_connection.commit()
+        cursor.close()
+        return totals
+
+    except Exception as e:
+        logger.exception(f"Erro inserção (streaming) {granule_name}: {e}")
+        db_connection.rollback()
+        return None
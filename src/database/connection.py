@@ -1,36 +1,146 @@
+import logging
 import os
+import threading
+import time
+from contextlib import contextmanager
+
 import psycopg2
+from psycopg2 import pool as pg_pool
 from sqlalchemy import create_engine
 from dotenv import load_dotenv
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
+logger = logging.getLogger('swot')
+
 class DatabaseConnection:
-    def __init__(self):
+    """Camada única de acesso ao banco, com pool de conexões
+
+    Conexões são verificadas ao sair do pool (SELECT 1) e recriadas se
+    estiverem quebradas; quando o pool está cheio getconn espera uma
+    conexão ser devolvida em vez de falhar.
+    """
+
+    def __init__(self, min_connections=None, max_connections=None, health_check=True,
+                 max_retries=3, retry_delay=2.0):
         self.host = os.getenv('DB_HOST', 'localhost')
         self.port = os.getenv('DB_PORT', '5432')
         self.database = os.getenv('DB_NAME', 'swot_database')
         self.username = os.getenv('DB_USER', 'swot_user')
         self.password = os.getenv('DB_PASSWORD')
-        
+
+        self.min_connections = min_connections or int(os.getenv('DB_POOL_MIN', '1'))
+        self.max_connections = max_connections or int(os.getenv('DB_POOL_MAX', '8'))
+        self.health_check = health_check
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+        self._pool = None
+        self._engine = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_connections)
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = pg_pool.ThreadedConnectionPool(
+                    self.min_connections,
+                    self.max_connections,
+                    host=self.host,
+                    port=self.port,
+                    database=self.database,
+                    user=self.username,
+                    password=self.password
+                )
+            return self._pool
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        if not self.health_check:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        """Obter conexão saudável do pool (reconecta se necessário)"""
+        self._slots.acquire()
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    conn = self._get_pool().getconn()
+                except psycopg2.OperationalError:
+                    if attempt == self.max_retries:
+                        raise
+                    time.sleep(self.retry_delay * (2 ** attempt))
+                    continue
+
+                if self._is_healthy(conn):
+                    return conn
+                self._get_pool().putconn(conn, close=True)
+
+            raise psycopg2.OperationalError("Não foi possível obter conexão saudável do pool")
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn, close=False):
+        """Devolver conexão ao pool"""
+        try:
+            self._get_pool().putconn(conn, close=close or bool(conn.closed))
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Conexão emprestada do pool: commit ao sair, rollback em erro"""
+        conn = self.getconn()
+        try:
+            yield conn
+            if not conn.closed:
+                conn.commit()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self.putconn(conn)
+
     def test_connection(self):
         """Testar conexão com banco"""
         try:
-            conn = psycopg2.connect(
-                host=self.host,
-                port=self.port,
-                database=self.database,
-                user=self.username,
-                password=self.password
-            )
-            conn.close()
+            with self.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
             return True
         except Exception as e:
-            print(f"Erro de conexão: {e}")
+            logger.error(f"Erro de conexão: {e}")
             return False
-    
+
     def get_engine(self):
-        """Obter engine SQLAlchemy"""
-        url = f"postgresql://{self.username}:{self.password}@{self.host}:{self.port}/{self.database}"
-        return create_engine(url)
\ No newline at end of file
+        """Obter engine SQLAlchemy (criada uma vez, com pool próprio)"""
+        with self._lock:
+            if self._engine is None:
+                url = f"postgresql://{self.username}:{self.password}@{self.host}:{self.port}/{self.database}"
+                self._engine = create_engine(
+                    url,
+                    pool_size=self.max_connections,
+                    pool_pre_ping=True
+                )
+            return self._engine
+
+    def close(self):
+        """Fechar todas as conexões do pool e da engine"""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+            if self._engine is not None:
+                self._engine.dispose()
+                self._engine = None
@@ -0,0 +1,125 @@
+import threading
+
+from .ingest_stats import existing_tables
+
+# Tentativas que falharam por granule/região (migração 7)
+FAILURE_TABLE = 'granule_failures'
+
+# Depois de tantas falhas o par granule/região é dado como perdido: sai do
+# plano e a marca d'água da região passa por ele
+MAX_GRANULE_ATTEMPTS = 3
+
+
+class GranuleRegistry:
+    """Granules já gravados, resolvidos em lote com uma consulta por execução
+
+    Mantém em memória os pares (granule, região) vistos no banco e os
+    inseridos durante a execução, além das falhas de cada par. Erros de
+    banco propagam: tratar falha como "não existe" faria baixar tudo de novo.
+    """
+
+    def __init__(self, database, max_attempts=MAX_GRANULE_ATTEMPTS):
+        self.database = database  # DatabaseConnection (pool)
+        self.max_attempts = max_attempts
+        self._regions = {}  # granule_name -> {region_id}
+        self._failures = {}  # (granule_name, region_id) -> tentativas
+        self._resolved = set()
+        self._with_failures = None
+        self._lock = threading.Lock()
+
+    def resolve(self, granule_names):
+        """Consultar de uma vez todos os nomes ainda não conhecidos"""
+        with self._lock:
+            pending = sorted(set(granule_names) - self._resolved)
+
+        if not pending:
+            return
+
+        failures = []
+        with self.database.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT granule_name, region_id FROM granules WHERE granule_name = ANY(%s)",
+                    (pending,)
+                )
+                rows = cursor.fetchall()
+
+                if self._with_failures is None:
+                    self._with_failures = FAILURE_TABLE in existing_tables(cursor, [FAILURE_TABLE])
+                if self._with_failures:
+                    cursor.execute(
+                        f"SELECT granule_name, region_id, attempts FROM {FAILURE_TABLE} WHERE granule_name = ANY(%s)",
+                        (pending,)
+                    )
+                    failures = cursor.fetchall()
+
+        with self._lock:
+            for granule_name, region_id in rows:
+                self._regions.setdefault(granule_name, set()).add(region_id)
+            for granule_name, region_id, attempts in failures:
+                self._failures[(granule_name, region_id or None)] = attempts
+            self._resolved.update(pending)
+
+    def exists(self, granule_name, region_id=None):
+        """Granule já gravado (para a região, ou para qualquer região)"""
+        with self._lock:
+            known = granule_name in self._resolved
+        if not known:
+            self.resolve([granule_name])
+
+        with self._lock:
+            regions = self._regions.get(granule_name, set())
+            return bool(regions) if region_id is None else region_id in regions
+
+    def mark(self, granule_name, region_id):
+        """Registrar um granule inserido nesta execução"""
+        with self._lock:
+            self._regions.setdefault(granule_name, set()).add(region_id)
+            self._resolved.add(granule_name)
+
+    def attempts(self, granule_name, region_id):
+        """Tentativas que falharam para o par granule/região"""
+        with self._lock:
+            known = granule_name in self._resolved
+        if not known:
+            self.resolve([granule_name])
+
+        with self._lock:
+            return self._failures.get((granule_name, region_id), 0)
+
+    def abandoned(self, granule_name, region_id):
+        """Par que já falhou max_attempts vezes e não é mais tentado"""
+        return self.attempts(granule_name, region_id) >= self.max_attempts
+
+    def is_done(self, granule_name, region_id):
+        """Nada mais a fazer com o par: gravado ou perdido"""
+        return self.exists(granule_name, region_id) or self.abandoned(granule_name, region_id)
+
+    def record_failure(self, granule_name, region_id, error=None):
+        """Somar uma tentativa que falhou; devolve o total de tentativas do par
+
+        Sem a tabela granule_failures (migração 7) a contagem fica só em
+        memória e o par volta a ser tentado na próxima execução.
+        """
+        attempts = None
+        if self._with_failures is None:
+            self.resolve([granule_name])
+
+        if self._with_failures:
+            with self.database.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(f"""
+                        INSERT INTO {FAILURE_TABLE} (granule_name, region_id, attempts, last_error, last_attempt_at)
+                        VALUES (%s, %s, 1, %s, CURRENT_TIMESTAMP)
+                        ON CONFLICT (granule_name, region_id) DO UPDATE SET
+                            attempts = {FAILURE_TABLE}.attempts + 1,
+                            last_error = EXCLUDED.last_error,
+                            last_attempt_at = EXCLUDED.last_attempt_at
+                        RETURNING attempts
+                    """, (granule_name, region_id or '', None if error is None else str(error)[:1000]))
+                    attempts = cursor.fetchone()[0]
+
+        with self._lock:
+            key = (granule_name, region_id)
+            self._failures[key] = attempts if attempts is not None else self._failures.get(key, 0) + 1
+            return self._failures[key]
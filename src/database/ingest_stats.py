@@ -0,0 +1,84 @@
+from datetime import datetime
+
+# Contadores por região (migração 6) mantidos pela carga na mesma transação
+# dos pixels; o dashboard lê só essa tabela em vez de COUNT(*) em pixel_data.
+# pixels conta só o que está em pixel_data: a carga sem pixels no banco
+# (STORE_PIXELS_IN_DATABASE=0) soma 0 e a retenção de partições subtrai o
+# que apaga (subtract_partition).
+STATS_TABLE = 'region_ingest_stats'
+
+
+def existing_tables(cursor, tables):
+    """Subconjunto de tables que existe no banco (uma consulta só)"""
+    cursor.execute(
+        "SELECT name FROM unnest(%s::text[]) AS name WHERE to_regclass(name) IS NOT NULL",
+        (list(tables),)
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def record_ingest(cursor, region_id, pixels, acquisition_start=None):
+    """Somar um granule carregado aos contadores da região (na transação do chamador)"""
+    cursor.execute(f"""
+        INSERT INTO {STATS_TABLE} (region_id, granules, pixels, last_ingest_at, last_acquisition)
+        VALUES (%s, 1, %s, %s, %s)
+        ON CONFLICT (region_id) DO UPDATE SET
+            granules = {STATS_TABLE}.granules + 1,
+            pixels = {STATS_TABLE}.pixels + EXCLUDED.pixels,
+            last_ingest_at = EXCLUDED.last_ingest_at,
+            last_acquisition = GREATEST({STATS_TABLE}.last_acquisition, EXCLUDED.last_acquisition)
+    """, (region_id, pixels, datetime.now(), acquisition_start))
+
+
+def subtract_partition(cursor, partition):
+    """Tirar dos contadores os pixels de uma partição que vai ser desanexada/apagada
+
+    Conta a partição por região (varre só ela), na transação do chamador.
+    """
+    cursor.execute(f"""
+        UPDATE {STATS_TABLE} s
+        SET pixels = GREATEST(s.pixels - removed.pixels, 0)
+        FROM (
+            SELECT COALESCE(g.region_id, '') AS region_id, COUNT(*) AS pixels
+            FROM {partition} p
+            JOIN granules g ON g.granule_id = p.granule_id
+            GROUP BY COALESCE(g.region_id, '')
+        ) removed
+        WHERE s.region_id = removed.region_id
+    """)
+
+
+def refresh_ingest_stats(cursor):
+    """Recalcular os contadores do zero (ex.: após apagar dados à mão)
+
+    granules e datas vêm de granules; pixels é contado em pixel_data por
+    região, então a operação varre pixel_data inteira (lenta em bases
+    grandes, só para manutenção).
+    """
+    cursor.execute(f"DELETE FROM {STATS_TABLE}")
+    cursor.execute(f"""
+        INSERT INTO {STATS_TABLE} (region_id, granules, pixels, last_ingest_at, last_acquisition)
+        SELECT COALESCE(g.region_id, ''), COUNT(*), COALESCE(SUM(p.pixels), 0),
+               MAX(g.created_at), MAX(g.acquisition_start)
+        FROM granules g
+        LEFT JOIN (
+            SELECT granule_id, COUNT(*) AS pixels FROM pixel_data GROUP BY granule_id
+        ) p ON p.granule_id = g.granule_id
+        GROUP BY COALESCE(g.region_id, '')
+    """)
+
+
+def estimated_rows(cursor, table):
+    """Linhas estimadas pelo planner (pg_class.reltuples), somando as partições
+
+    Custo constante, qualquer que seja o tamanho da tabela; a precisão
+    depende do último ANALYZE/autovacuum. None se nunca foi analisada.
+    """
+    cursor.execute("""
+        SELECT SUM(c.reltuples) FILTER (WHERE c.reltuples >= 0)
+        FROM pg_class c
+        WHERE c.oid = to_regclass(%s)
+           OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(%s))
+    """, (table, table))
+    estimate = cursor.fetchone()[0]
+    return int(estimate) if estimate is not None else None
@@ -0,0 +1,338 @@
+# Migrações versionadas do schema. Cada uma roda em sua própria transação
+# e fica registrada em schema_migrations; setup_database.py cria o schema
+# base e em seguida aplica todas as pendentes.
+#
+# Versão 1 - pixel_data compacto
+#   Antes: pixel_id BIGSERIAL, DECIMAL em lat/lon/altura/potência,
+#   classification INTEGER e created_at por linha. Depois: float4/int2, sem
+#   id nem timestamp por linha. O horário fica só em granules.
+#   Medido com benchmarks/benchmark_schema.py (1.000.000 pixels sintéticos,
+#   COPY, mesmos 3 índices nas duas versões; PostgreSQL 16, 1 vCPU, média
+#   de 3 execuções):
+#
+#                heap                   pg_total_relation_size   inserção
+#     original   96,7 MB (97 B/linha)   184,4 MB (184 B/linha)   ~60.800 linhas/s
+#     compacto   56,2 MB (56 B/linha)    99,9 MB (100 B/linha)   ~190.900 linhas/s
+#
+#   Tamanho 1,8x menor e carga ~3,1x mais rápida (COPY binário).
+#
+# Versão 2 - pixel_data particionada por mês de aquisição
+#   Nova coluna acquired_on (DATE, 4 bytes) com RANGE mensal; partições
+#   pixel_data_AAAAMM criadas sob demanda (database/partitions.py). Só o
+#   índice por granule_id é mantido: consultas por período podam partições
+#   e cada carga atualiza um índice só, na partição do mês. Leituras por
+#   granule devem filtrar também acquired_on (COALESCE(acquisition_start,
+#   created_at)::date, a data usada na carga), senão todas as partições são
+#   varridas. EXPLAIN com três meses carregados (PostgreSQL 16):
+#
+#     WHERE granule_id = 4 ...
+#       Append -> Index Scan on pixel_data_202501 / _202502 / _202503
+#     WHERE acquired_on = '2025-02-01' AND granule_id = 4 ...
+#       Index Scan using pixel_data_202502_granule_id_idx on pixel_data_202502
+#
+# Versão 3 - region_sync_state
+#   Marca d'água por região: aquisição mais recente já ingerida. A busca
+#   no CMR começa nela (menos uma sobreposição) em vez de varrer tudo de
+#   novo a cada execução (database/sync_state.py).
+#
+# Versão 4 - granule_class_summary
+#   Uma linha por granule/região e classificação: pixels, área (pixel_area),
+#   percentis de altura e potência média. Gravada pela carga na mesma
+#   transação dos pixels (database/pixel_summary.py); os granules já
+#   carregados são resumidos a partir de pixel_data (sem área).
+#
+# Versão 5 - water_surface_elevation
+#   Nível d'água robusto (classes 3/4, outliers cortados pelo MAD) por
+#   granule/região, gravado pela carga (database/water_levels.py). Dados
+#   antigos: WaterLevels.rebuild().
+#
+# Versão 6 - region_ingest_stats
+#   Contadores por região (granules, pixels, última carga) atualizados pela
+#   carga (database/ingest_stats.py), para o dashboard não contar pixel_data.
+#
+# Versão 7 - granule_failures
+#   Tentativas que falharam por granule/região (download, leitura ou carga).
+#   Depois de MAX_GRANULE_ATTEMPTS o par é dado como perdido: sai do plano e
+#   a marca d'água da região passa por ele (database/granule_registry.py).
+#
+# Versão 8 - water_level_pass
+#   Nível d'água por passagem (ciclo + passagem do nome do PIXC), que pode
+#   cruzar a região em vários granules. water_surface_elevation ganha a
+#   passagem e uma amostra de quantis das alturas de cada granule; o nível
+#   da passagem é calculado sobre as amostras juntas. As passagens de dados
+#   antigos (sem amostra) vêm de show_water_levels.py --rebuild.
+#
+# Versão 9 - water_level_scanned
+#   Granules já lidos que não deram nível (poucos pixels de água), gravados
+#   pela carga e por WaterLevels.rebuild. Sem eles o rebuild relia esses
+#   granules em pixel_data a cada execução.
+
+MIGRATIONS = [
+    (1, 'pixel_data compacto (REAL/SMALLINT, sem pixel_id e created_at)', [
+        """
+        CREATE TABLE pixel_data_compact (
+            granule_id INTEGER NOT NULL REFERENCES granules(granule_id) ON DELETE CASCADE,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            height_m REAL,
+            classification_id SMALLINT REFERENCES classification_types(class_id),
+            coherent_power REAL
+        );
+        """,
+        """
+        INSERT INTO pixel_data_compact
+            (granule_id, latitude, longitude, height_m, classification_id, coherent_power)
+        SELECT granule_id, latitude::real, longitude::real, height_m::real,
+               classification_id::smallint, coherent_power::real
+        FROM pixel_data;
+        """,
+        "DROP TABLE pixel_data;",
+        "ALTER TABLE pixel_data_compact RENAME TO pixel_data;",
+        """
+        CREATE INDEX idx_pixel_granule ON pixel_data(granule_id);
+        CREATE INDEX idx_pixel_coords ON pixel_data(latitude, longitude);
+        CREATE INDEX idx_pixel_classification ON pixel_data(classification_id);
+        """,
+    ]),
+    (2, 'pixel_data particionada por mês de aquisição', [
+        """
+        CREATE TABLE pixel_data_partitioned (
+            granule_id INTEGER NOT NULL REFERENCES granules(granule_id) ON DELETE CASCADE,
+            acquired_on DATE NOT NULL,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            height_m REAL,
+            classification_id SMALLINT REFERENCES classification_types(class_id),
+            coherent_power REAL
+        ) PARTITION BY RANGE (acquired_on);
+        """,
+        """
+        DO $$
+        DECLARE
+            month DATE;
+        BEGIN
+            FOR month IN
+                SELECT DISTINCT date_trunc('month', COALESCE(g.acquisition_start, g.created_at))::date
+                FROM granules g
+                WHERE EXISTS (SELECT 1 FROM pixel_data p WHERE p.granule_id = g.granule_id)
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF pixel_data_partitioned FOR VALUES FROM (%L) TO (%L)',
+                    'pixel_data_' || to_char(month, 'YYYYMM'), month, (month + interval '1 month')::date
+                );
+            END LOOP;
+        END $$;
+        """,
+        """
+        INSERT INTO pixel_data_partitioned
+            (granule_id, acquired_on, latitude, longitude, height_m, classification_id, coherent_power)
+        SELECT p.granule_id, COALESCE(g.acquisition_start, g.created_at)::date,
+               p.latitude, p.longitude, p.height_m, p.classification_id, p.coherent_power
+        FROM pixel_data p
+        JOIN granules g ON g.granule_id = p.granule_id;
+        """,
+        "DROP TABLE pixel_data;",
+        "ALTER TABLE pixel_data_partitioned RENAME TO pixel_data;",
+        "CREATE INDEX idx_pixel_granule ON pixel_data(granule_id);",
+    ]),
+    (3, 'region_sync_state (marca d\'água de aquisição por região)', [
+        """
+        CREATE TABLE IF NOT EXISTS region_sync_state (
+            region_id VARCHAR(50) PRIMARY KEY,
+            last_acquisition TIMESTAMP NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+    ]),
+    (4, 'granule_class_summary (resumo por granule/região e classificação)', [
+        """
+        CREATE TABLE granule_class_summary (
+            granule_id INTEGER NOT NULL REFERENCES granules(granule_id) ON DELETE CASCADE,
+            region_id VARCHAR(50),
+            acquired_on DATE NOT NULL,
+            classification_id SMALLINT,
+            pixel_count INTEGER NOT NULL,
+            water_area_m2 DOUBLE PRECISION,
+            height_p10 REAL,
+            height_median REAL,
+            height_p90 REAL,
+            coherent_power_mean REAL
+        );
+        """,
+        """
+        INSERT INTO granule_class_summary
+            (granule_id, region_id, acquired_on, classification_id, pixel_count,
+             height_p10, height_median, height_p90, coherent_power_mean)
+        SELECT g.granule_id, g.region_id, COALESCE(g.acquisition_start, g.created_at)::date,
+               p.classification_id, COUNT(*),
+               percentile_cont(0.1) WITHIN GROUP (ORDER BY p.height_m),
+               percentile_cont(0.5) WITHIN GROUP (ORDER BY p.height_m),
+               percentile_cont(0.9) WITHIN GROUP (ORDER BY p.height_m),
+               AVG(p.coherent_power)
+        FROM pixel_data p
+        JOIN granules g ON g.granule_id = p.granule_id
+        GROUP BY g.granule_id, g.region_id, g.acquisition_start, g.created_at, p.classification_id;
+        """,
+        """
+        CREATE INDEX idx_summary_granule ON granule_class_summary(granule_id);
+        CREATE INDEX idx_summary_region_date ON granule_class_summary(region_id, acquired_on);
+        """,
+    ]),
+    (5, 'water_surface_elevation (nível d\'água por região e passagem)', [
+        """
+        CREATE TABLE water_surface_elevation (
+            granule_id INTEGER PRIMARY KEY REFERENCES granules(granule_id) ON DELETE CASCADE,
+            region_id VARCHAR(50) NOT NULL,
+            acquired_at TIMESTAMP NOT NULL,
+            wse_m REAL NOT NULL,
+            wse_std_m REAL,
+            water_pixels INTEGER NOT NULL,
+            used_pixels INTEGER NOT NULL
+        );
+        """,
+        "CREATE INDEX idx_wse_region_time ON water_surface_elevation(region_id, acquired_at);",
+    ]),
+    (6, 'region_ingest_stats (contadores por região para o dashboard)', [
+        """
+        CREATE TABLE region_ingest_stats (
+            region_id VARCHAR(50) PRIMARY KEY,
+            granules BIGINT NOT NULL DEFAULT 0,
+            pixels BIGINT NOT NULL DEFAULT 0,
+            last_ingest_at TIMESTAMP,
+            last_acquisition TIMESTAMP
+        );
+        """,
+        """
+        INSERT INTO region_ingest_stats (region_id, granules, pixels, last_ingest_at, last_acquisition)
+        SELECT COALESCE(region_id, ''), COUNT(*), COALESCE(SUM(total_pixels), 0),
+               MAX(created_at), MAX(acquisition_start)
+        FROM granules
+        GROUP BY COALESCE(region_id, '');
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_granules_created ON granules(created_at);",
+    ]),
+    (7, 'granule_failures (tentativas que falharam por granule/região)', [
+        """
+        CREATE TABLE granule_failures (
+            granule_name VARCHAR(200) NOT NULL,
+            region_id VARCHAR(50) NOT NULL DEFAULT '',
+            attempts INTEGER NOT NULL DEFAULT 1,
+            last_error TEXT,
+            last_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (granule_name, region_id)
+        );
+        """,
+    ]),
+    (8, 'water_level_pass (nível d\'água por região e passagem)', [
+        """
+        ALTER TABLE water_surface_elevation
+            ADD COLUMN pass_id VARCHAR(200),
+            ADD COLUMN height_sample REAL[];
+        """,
+        """
+        UPDATE water_surface_elevation w
+        SET pass_id = COALESCE(substring(g.granule_name from '_PIXC_([0-9]{3}_[0-9]{3})_'), g.granule_name)
+        FROM granules g
+        WHERE g.granule_id = w.granule_id;
+        """,
+        "CREATE INDEX idx_wse_region_pass ON water_surface_elevation(region_id, pass_id);",
+        """
+        CREATE TABLE water_level_pass (
+            region_id VARCHAR(50) NOT NULL,
+            pass_id VARCHAR(200) NOT NULL,
+            cycle SMALLINT,
+            pass_number SMALLINT,
+            acquired_at TIMESTAMP NOT NULL,
+            wse_m REAL NOT NULL,
+            wse_std_m REAL,
+            water_pixels INTEGER NOT NULL,
+            used_pixels INTEGER NOT NULL,
+            granules SMALLINT NOT NULL,
+            PRIMARY KEY (region_id, pass_id)
+        );
+        """,
+        "CREATE INDEX idx_pass_region_time ON water_level_pass(region_id, acquired_at);",
+    ]),
+    (9, 'water_level_scanned (granules lidos sem nível d\'água)', [
+        """
+        CREATE TABLE water_level_scanned (
+            granule_id INTEGER PRIMARY KEY REFERENCES granules(granule_id) ON DELETE CASCADE,
+            scanned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+    ]),
+]
+
+# Coluna de geometria opcional (requer a extensão PostGIS no servidor).
+# Gerada a partir de lat/lon, então o COPY do loader não muda.
+POSTGIS_COMMANDS = [
+    "CREATE EXTENSION IF NOT EXISTS postgis;",
+    """
+    ALTER TABLE pixel_data ADD COLUMN IF NOT EXISTS geom geometry(Point, 4326)
+        GENERATED ALWAYS AS (ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)) STORED;
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_pixel_geom ON pixel_data USING GIST (geom);",
+]
+
+
+def ensure_migrations_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+
+def current_version(cursor):
+    """Última versão de migração aplicada (0 se nenhuma)"""
+    ensure_migrations_table(cursor)
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+    return cursor.fetchone()[0]
+
+
+def apply_migrations(conn, target=None):
+    """Aplicar migrações pendentes até target (todas por padrão)"""
+    cursor = conn.cursor()
+    version = current_version(cursor)
+    conn.commit()
+
+    applied = []
+    for number, description, commands in MIGRATIONS:
+        if number <= version or (target is not None and number > target):
+            continue
+
+        print(f" Migração {number}: {description}")
+        try:
+            for sql in commands:
+                cursor.execute(sql)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                (number, description)
+            )
+            conn.commit()
+            applied.append(number)
+        except Exception as e:
+            conn.rollback()
+            print(f" Migração {number} falhou: {e}")
+            break
+
+    cursor.close()
+    return applied
+
+
+def enable_postgis(conn):
+    """Adicionar a coluna geom (PostGIS) em pixel_data"""
+    cursor = conn.cursor()
+    try:
+        for sql in POSTGIS_COMMANDS:
+            cursor.execute(sql)
+        conn.commit()
+        return True
+    except Exception as e:
+        conn.rollback()
+        print(f" PostGIS indisponível: {e}")
+        return False
+    finally:
+        cursor.close()
@@ -0,0 +1,110 @@
+import re
+import threading
+from datetime import date
+
+from .ingest_stats import STATS_TABLE, existing_tables, subtract_partition
+
+# pixel_data particionada por mês de aquisição (RANGE em acquired_on).
+# Partições são criadas sob demanda pela carga, uma por mês.
+PARTITION_PATTERN = re.compile(r'^pixel_data_(\d{4})(\d{2})$')
+
+_known_partitions = set()
+_known_lock = threading.Lock()
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def next_month(day):
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def partition_name(day):
+    """Nome da partição mensal que contém day"""
+    return f"pixel_data_{day:%Y%m}"
+
+
+def partition_month(name):
+    """Primeiro dia do mês de uma partição, ou None se o nome não segue o padrão"""
+    match = PARTITION_PATTERN.match(name)
+    if not match:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def ensure_partition(db_connection, day):
+    """Garantir a partição do mês de day, em transação própria e curta
+
+    A criação trava pixel_data, então não deve ficar presa à transação
+    longa da carga.
+    """
+    name = partition_name(day)
+    with _known_lock:
+        if name in _known_partitions:
+            return name
+
+    start = month_start(day)
+    cursor = db_connection.cursor()
+    try:
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {name}
+            PARTITION OF pixel_data FOR VALUES FROM (%s) TO (%s)
+        """, (start, next_month(start)))
+        db_connection.commit()
+    except Exception:
+        db_connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    with _known_lock:
+        _known_partitions.add(name)
+    return name
+
+
+def list_partitions(cursor):
+    """Partições mensais anexadas a pixel_data, em ordem"""
+    cursor.execute("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = 'pixel_data'
+        ORDER BY child.relname
+    """)
+    return [row[0] for row in cursor.fetchall() if partition_month(row[0]) is not None]
+
+
+def retire_partitions(db_connection, before, drop=False):
+    """Desanexar (e opcionalmente apagar) partições de meses anteriores a before
+
+    Os pixels de cada partição saem dos contadores por região na mesma
+    transação do DETACH.
+    """
+    cursor = db_connection.cursor()
+    retired = []
+
+    try:
+        with_stats = STATS_TABLE in existing_tables(cursor, [STATS_TABLE])
+        for name in list_partitions(cursor):
+            if partition_month(name) >= month_start(before):
+                continue
+
+            if with_stats:
+                subtract_partition(cursor, name)
+            cursor.execute(f"ALTER TABLE pixel_data DETACH PARTITION {name}")
+            if drop:
+                cursor.execute(f"DROP TABLE {name}")
+            db_connection.commit()
+            retired.append(name)
+
+            with _known_lock:
+                _known_partitions.discard(name)
+    except Exception:
+        db_connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    return retired
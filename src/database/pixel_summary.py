@@ -0,0 +1,125 @@
+from datetime import datetime
+
+import numpy as np
+
+# Resumo por granule/região e classificação (migração 4), calculado na carga
+# enquanto os pixels ainda estão em NumPy e gravado na mesma transação.
+SUMMARY_TABLE = 'granule_class_summary'
+
+# Alturas guardadas por classe para os percentis; acima disso a amostra é
+# rarefeita (1 a cada 2, 4, ...) para granules em streaming
+SUMMARY_SAMPLE_SIZE = 1000000
+
+
+class HeightSample:
+    """Amostra limitada de alturas acumulada em blocos
+
+    Guarda tudo até sample_size; acima disso rarefaz a amostra (1 a cada
+    2, 4, ...) e passa a guardar os blocos seguintes com o mesmo passo.
+    """
+
+    def __init__(self, sample_size=SUMMARY_SAMPLE_SIZE):
+        self.sample_size = sample_size
+        self.parts = []
+        self.kept = 0
+        self.stride = 1
+
+    def add(self, heights):
+        kept = np.asarray(heights)[::self.stride].astype('float32')
+        self.parts.append(kept)
+        self.kept += len(kept)
+
+        while self.kept > self.sample_size:
+            thinned = np.concatenate(self.parts)[::2]
+            self.parts = [thinned]
+            self.kept = len(thinned)
+            self.stride *= 2
+
+    def values(self):
+        return np.concatenate(self.parts) if self.parts else np.empty(0, dtype='float32')
+
+
+class PixelSummary:
+    """Acumulador por classificação: pixels, área, potência média e amostra de alturas
+
+    Recebe as colunas de extract_pixel_columns, inteiras ou em blocos.
+    Classificação inválida entra como None (NULL no banco).
+    """
+
+    def __init__(self, sample_size=SUMMARY_SAMPLE_SIZE):
+        self.sample_size = sample_size
+        self.classes = {}
+
+    def _entry(self, class_id):
+        entry = self.classes.get(class_id)
+        if entry is None:
+            entry = self.classes[class_id] = {
+                'pixels': 0,
+                'area': 0.0,
+                'area_pixels': 0,
+                'power_sum': 0.0,
+                'power_pixels': 0,
+                'heights': HeightSample(self.sample_size),
+            }
+        return entry
+
+    def add(self, columns):
+        keys = np.where(columns['classification_valid'], columns['classification'], -1)
+
+        for key in np.unique(keys):
+            rows = keys == key
+            entry = self._entry(None if key < 0 else int(key))
+            entry['pixels'] += int(rows.sum())
+
+            area = columns['pixel_area'][rows]
+            area = area[~np.isnan(area)]
+            entry['area'] += float(area.sum())
+            entry['area_pixels'] += len(area)
+
+            power = columns['coherent_power'][rows]
+            power = power[~np.isnan(power)]
+            entry['power_sum'] += float(power.sum())
+            entry['power_pixels'] += len(power)
+
+            heights = columns['height'][rows]
+            entry['heights'].add(heights[~np.isnan(heights)])
+
+    def rows(self):
+        """Uma linha por classificação, em ordem (NULL por último)"""
+        for class_id in sorted(self.classes, key=lambda c: (c is None, c)):
+            entry = self.classes[class_id]
+            heights = entry['heights'].values()
+
+            if len(heights):
+                p10, p50, p90 = (float(v) for v in np.percentile(heights, [10, 50, 90]))
+            else:
+                p10 = p50 = p90 = None
+
+            yield {
+                'classification_id': class_id,
+                'pixel_count': entry['pixels'],
+                'water_area_m2': entry['area'] if entry['area_pixels'] else None,
+                'height_p10': p10,
+                'height_median': p50,
+                'height_p90': p90,
+                'coherent_power_mean': (
+                    entry['power_sum'] / entry['power_pixels'] if entry['power_pixels'] else None
+                ),
+            }
+
+
+def write_summary(cursor, granule_id, region_id, acquisition_start, summary):
+    """Gravar as linhas do resumo do granule/região (na transação do chamador)"""
+    acquired_on = (acquisition_start or datetime.now()).date()
+
+    cursor.executemany(f"""
+        INSERT INTO {SUMMARY_TABLE}
+            (granule_id, region_id, acquired_on, classification_id, pixel_count, water_area_m2,
+             height_p10, height_median, height_p90, coherent_power_mean)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """, [
+        (granule_id, region_id, acquired_on, row['classification_id'], row['pixel_count'],
+         row['water_area_m2'], row['height_p10'], row['height_median'], row['height_p90'],
+         row['coherent_power_mean'])
+        for row in summary.rows()
+    ])
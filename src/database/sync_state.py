@@ -0,0 +1,105 @@
+import threading
+from datetime import datetime, timedelta
+
+# Janela de busca incremental por região. A marca d'água (region_sync_state)
+# guarda a aquisição mais recente já ingerida; cada execução busca a partir
+# dela menos SYNC_OVERLAP, para pegar granules publicados com atraso no CMR.
+SYNC_OVERLAP = timedelta(hours=12)
+INITIAL_DAYS_BACK = 2  # Regiões sem marca d'água
+BACKFILL_CHUNK_DAYS = 7
+
+
+def backfill_windows(start, end, chunk_days=BACKFILL_CHUNK_DAYS):
+    """Dividir [start, end) em janelas de chunk_days dias, da mais antiga para a mais recente"""
+    step = timedelta(days=chunk_days)
+    current = start
+    while current < end:
+        yield current, min(current + step, end)
+        current += step
+
+
+def high_water_mark(granules, is_done, acquisition_of):
+    """Aquisição do último granule de um prefixo contínuo já concluído
+
+    Os granules são ordenados por aquisição; a marca só avança até o
+    primeiro pendente, para que um granule que falhou (ou ficou de fora
+    pelo limite por região) seja buscado de novo na próxima execução.
+    is_done deve contar como concluído o granule que falhou vezes demais
+    (GranuleRegistry.is_done), senão ele prende a marca para sempre.
+    """
+    mark = None
+    dated = [(acquisition_of(g), g) for g in granules]
+    for acquired, granule in sorted((pair for pair in dated if pair[0] is not None), key=lambda pair: pair[0]):
+        if not is_done(granule):
+            break
+        mark = acquired
+    return mark
+
+
+class RegionSyncState:
+    """Marca d'água de aquisição por região (tabela region_sync_state)"""
+
+    def __init__(self, database, overlap=SYNC_OVERLAP, initial_days=INITIAL_DAYS_BACK):
+        self.database = database  # DatabaseConnection (pool)
+        self.overlap = overlap
+        self.initial_days = initial_days
+        self._marks = None
+        self._completed = set()  # (granule_name, region_id) concluídos sem linha em granules
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Ler todas as marcas d'água de uma vez"""
+        with self.database.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT region_id, last_acquisition FROM region_sync_state")
+                rows = cursor.fetchall()
+
+        with self._lock:
+            self._marks = dict(rows)
+        return dict(rows)
+
+    def last_acquisition(self, region_id):
+        if self._marks is None:
+            self.load()
+        with self._lock:
+            return self._marks.get(region_id)
+
+    def window(self, region_id, now=None):
+        """Intervalo (início, fim) da próxima busca para a região"""
+        now = now or datetime.utcnow()
+        last = self.last_acquisition(region_id)
+
+        if last is None:
+            return now - timedelta(days=self.initial_days), now
+        return min(last - self.overlap, now), now
+
+    def complete(self, granule_name, region_id):
+        """Registrar par granule/região processado sem gerar linha (ex.: nenhum pixel na região)"""
+        with self._lock:
+            self._completed.add((granule_name, region_id))
+
+    def is_completed(self, granule_name, region_id):
+        with self._lock:
+            return (granule_name, region_id) in self._completed
+
+    def advance(self, region_id, acquired_until):
+        """Avançar a marca d'água da região (nunca recua)"""
+        if acquired_until is None:
+            return False
+
+        with self.database.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO region_sync_state (region_id, last_acquisition)
+                    VALUES (%s, %s)
+                    ON CONFLICT (region_id) DO UPDATE SET
+                        last_acquisition = GREATEST(region_sync_state.last_acquisition, EXCLUDED.last_acquisition),
+                        updated_at = CURRENT_TIMESTAMP
+                    RETURNING last_acquisition
+                """, (region_id, acquired_until))
+                stored = cursor.fetchone()[0]
+
+        with self._lock:
+            if self._marks is not None:
+                self._marks[region_id] = stored
+        return True
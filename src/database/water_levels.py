@@ -0,0 +1,317 @@
+import re
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .ingest_stats import existing_tables
+from .pixel_summary import HeightSample
+
+# Nível d'água (WSE) por região e passagem. Uma passagem (ciclo + número
+# da passagem no nome do PIXC) cruza a região em um ou mais tiles, cada um
+# um granule: water_surface_elevation (migração 5) guarda uma linha por
+# granule/região com uma amostra de quantis das alturas de água, e
+# water_level_pass (migração 8) o nível da passagem, calculado sobre as
+# amostras de todos os seus granules. Consultas não tocam em pixel_data.
+# Granules lidos que não deram nível (poucos pixels de água) ficam em
+# water_level_scanned (migração 9), para WaterLevels.rebuild não relê-los.
+WATER_LEVEL_TABLE = 'water_surface_elevation'
+PASS_LEVEL_TABLE = 'water_level_pass'
+SCANNED_TABLE = 'water_level_scanned'
+
+# Ciclo e passagem no nome do granule (SWOT_L2_HR_PIXC_<ciclo>_<passagem>_<tile>_...)
+PASS_PATTERN = re.compile(r'_PIXC_(\d{3})_(\d{3})_')
+
+# Quantis das alturas de água guardados por granule/região para o nível da passagem
+PASS_SAMPLE_SIZE = 4096
+
+# Água aberta e água escura
+WATER_CLASSES = (3, 4)
+
+# Pixels fora de mediana ± MAD_CUTOFF * desvio robusto são descartados
+MAD_CUTOFF = 3.0
+MAD_TO_STD = 1.4826
+
+# Menos pixels de água que isso não gera nível
+MIN_WATER_PIXELS = 20
+
+LEVEL_COLUMNS = ('acquired_at', 'cycle', 'pass_number', 'wse_m', 'wse_std_m', 'water_pixels', 'used_pixels', 'granules')
+
+
+def pass_key(granule_name):
+    """(pass_id, ciclo, passagem) do granule; sem o padrão do PIXC o granule é a própria passagem"""
+    match = PASS_PATTERN.search(granule_name or '')
+    if match is None:
+        return granule_name, None, None
+    return f"{match.group(1)}_{match.group(2)}", int(match.group(1)), int(match.group(2))
+
+
+def quantile_sample(heights, size=PASS_SAMPLE_SIZE):
+    """Até size quantis igualmente espaçados das alturas (ordenados)"""
+    heights = np.sort(np.asarray(heights, dtype='float32'))
+    if len(heights) <= size:
+        return heights
+    return heights[np.linspace(0, len(heights) - 1, size).round().astype(int)]
+
+
+def pool_samples(samples, size=PASS_SAMPLE_SIZE):
+    """Juntar amostras de quantis [(alturas, pixels de água)] com peso proporcional aos pixels
+
+    Cada granule entra com uma parte de size proporcional aos seus pixels
+    de água, reamostrada dos seus quantis.
+    """
+    samples = [(np.asarray(heights, dtype='float32'), pixels) for heights, pixels in samples if len(heights) and pixels]
+    total = sum(pixels for _, pixels in samples)
+    if not total:
+        return np.empty(0, dtype='float32')
+
+    parts = []
+    for heights, pixels in samples:
+        count = max(1, round(size * pixels / total))
+        parts.append(heights[np.linspace(0, len(heights) - 1, count).round().astype(int)])
+    return np.concatenate(parts)
+
+
+def robust_elevation(heights, cutoff=MAD_CUTOFF, min_pixels=MIN_WATER_PIXELS):
+    """Nível robusto: mediana das alturas após descartar outliers pelo MAD
+
+    Devolve dict com wse_m, wse_std_m e used_pixels, ou None se não há
+    pixels suficientes.
+    """
+    heights = np.asarray(heights, dtype='float64')
+    heights = heights[np.isfinite(heights)]
+    if len(heights) < min_pixels:
+        return None
+
+    median = np.median(heights)
+    spread = MAD_TO_STD * np.median(np.abs(heights - median))
+    if spread > 0:
+        heights = heights[np.abs(heights - median) <= cutoff * spread]
+    if len(heights) < min_pixels:
+        return None
+
+    return {
+        'wse_m': float(np.median(heights)),
+        'wse_std_m': float(np.std(heights)),
+        'used_pixels': int(len(heights)),
+    }
+
+
+class WaterLevelAccumulator:
+    """Alturas de água (classes 3/4) de um granule/região, em blocos"""
+
+    def __init__(self):
+        self.heights = HeightSample()
+        self.water_pixels = 0
+
+    def add(self, columns):
+        water = columns['classification_valid'] & np.isin(columns['classification'], WATER_CLASSES)
+        heights = columns['height'][water]
+        heights = heights[~np.isnan(heights)]
+        self.water_pixels += len(heights)
+        self.heights.add(heights)
+
+    def level(self):
+        heights = self.heights.values()
+        level = robust_elevation(heights)
+        if level is not None:
+            level['water_pixels'] = self.water_pixels
+            level['sample'] = quantile_sample(heights)
+        return level
+
+
+def write_water_level(cursor, granule_id, region_id, acquisition_start, level, granule_name=None, passes=False,
+                      scanned=False):
+    """Gravar o nível do granule/região (na transação do chamador); False se não há nível
+
+    Com passes (tabela water_level_pass existente) grava também a passagem
+    do granule e recalcula o nível dela. Com scanned (tabela
+    water_level_scanned existente) um granule sem nível fica registrado
+    como já lido.
+    """
+    if level is None:
+        if scanned:
+            cursor.execute(
+                f"INSERT INTO {SCANNED_TABLE} (granule_id) VALUES (%s) ON CONFLICT (granule_id) DO NOTHING",
+                (granule_id,)
+            )
+        return False
+
+    values = (granule_id, region_id, acquisition_start or datetime.now(), level['wse_m'],
+              level['wse_std_m'], level['water_pixels'], level['used_pixels'])
+    if not passes:
+        cursor.execute(f"""
+            INSERT INTO {WATER_LEVEL_TABLE}
+                (granule_id, region_id, acquired_at, wse_m, wse_std_m, water_pixels, used_pixels)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (granule_id) DO UPDATE SET
+                wse_m = EXCLUDED.wse_m,
+                wse_std_m = EXCLUDED.wse_std_m,
+                water_pixels = EXCLUDED.water_pixels,
+                used_pixels = EXCLUDED.used_pixels
+        """, values)
+        return True
+
+    pass_id, cycle, pass_number = pass_key(granule_name)
+    sample = level.get('sample')
+    cursor.execute(f"""
+        INSERT INTO {WATER_LEVEL_TABLE}
+            (granule_id, region_id, acquired_at, wse_m, wse_std_m, water_pixels, used_pixels, pass_id, height_sample)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (granule_id) DO UPDATE SET
+            wse_m = EXCLUDED.wse_m,
+            wse_std_m = EXCLUDED.wse_std_m,
+            water_pixels = EXCLUDED.water_pixels,
+            used_pixels = EXCLUDED.used_pixels,
+            pass_id = EXCLUDED.pass_id,
+            height_sample = EXCLUDED.height_sample
+    """, values + (pass_id, None if sample is None else [float(h) for h in sample]))
+
+    update_pass_level(cursor, region_id, pass_id, cycle, pass_number)
+    return True
+
+
+def update_pass_level(cursor, region_id, pass_id, cycle=None, pass_number=None):
+    """Recalcular o nível da passagem com as amostras de todos os seus granules
+
+    Granules gravados antes da migração 8 não têm amostra: entram com o
+    próprio nível, com o peso dos pixels usados.
+    """
+    cursor.execute(f"""
+        SELECT acquired_at, wse_m, water_pixels, used_pixels, height_sample
+        FROM {WATER_LEVEL_TABLE}
+        WHERE region_id = %s AND pass_id = %s
+    """, (region_id, pass_id))
+    rows = cursor.fetchall()
+    if not rows:
+        return False
+
+    samples = [
+        (sample, water_pixels) if sample else ([wse_m], used_pixels)
+        for _, wse_m, water_pixels, used_pixels, sample in rows
+    ]
+    # O mínimo de pixels já foi exigido em cada granule
+    level = robust_elevation(pool_samples(samples), min_pixels=1)
+    if level is None:
+        return False
+
+    cursor.execute(f"""
+        INSERT INTO {PASS_LEVEL_TABLE}
+            (region_id, pass_id, cycle, pass_number, acquired_at, wse_m, wse_std_m,
+             water_pixels, used_pixels, granules)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (region_id, pass_id) DO UPDATE SET
+            acquired_at = EXCLUDED.acquired_at,
+            wse_m = EXCLUDED.wse_m,
+            wse_std_m = EXCLUDED.wse_std_m,
+            water_pixels = EXCLUDED.water_pixels,
+            used_pixels = EXCLUDED.used_pixels,
+            granules = EXCLUDED.granules
+    """, (region_id, pass_id, cycle, pass_number, min(row[0] for row in rows),
+          level['wse_m'], level['wse_std_m'], sum(row[2] for row in rows),
+          sum(row[3] for row in rows), len(rows)))
+    return True
+
+
+class WaterLevels:
+    """Consulta e manutenção da série de níveis por região"""
+
+    def __init__(self, database):
+        self.database = database  # DatabaseConnection (pool)
+
+    def series(self, region_id, start=None, end=None):
+        """Série temporal da região entre start e end, uma linha por passagem (ordenada por aquisição)"""
+        with self.database.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"""
+                    SELECT {', '.join(LEVEL_COLUMNS)}
+                    FROM {PASS_LEVEL_TABLE}
+                    WHERE region_id = %s
+                      AND (%s::timestamp IS NULL OR acquired_at >= %s)
+                      AND (%s::timestamp IS NULL OR acquired_at < %s)
+                    ORDER BY acquired_at
+                """, (region_id, start, start, end, end))
+                rows = cursor.fetchall()
+
+        return pd.DataFrame(rows, columns=LEVEL_COLUMNS)
+
+    def latest(self, region_ids=None):
+        """Nível da última passagem de cada região (todas, ou só region_ids)"""
+        with self.database.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"""
+                    SELECT DISTINCT ON (region_id) region_id, {', '.join(LEVEL_COLUMNS)}
+                    FROM {PASS_LEVEL_TABLE}
+                    WHERE %s::text[] IS NULL OR region_id = ANY(%s)
+                    ORDER BY region_id, acquired_at DESC
+                """, (region_ids, region_ids))
+                rows = cursor.fetchall()
+
+        return pd.DataFrame(rows, columns=('region_id',) + LEVEL_COLUMNS)
+
+    def rebuild(self, region_id=None):
+        """Calcular o nível dos granules já carregados que ainda não têm um
+
+        Lê as alturas de água de pixel_data granule a granule; a carga normal
+        já grava o nível, então isso só é preciso para dados antigos. O nível
+        de cada passagem afetada é recalculado junto. Granules sem nível são
+        marcados em water_level_scanned e não são lidos de novo.
+        """
+        with self.database.connection() as conn:
+            with conn.cursor() as cursor:
+                scanned = SCANNED_TABLE in existing_tables(cursor, [SCANNED_TABLE])
+                not_scanned = (
+                    f"AND NOT EXISTS (SELECT 1 FROM {SCANNED_TABLE} s WHERE s.granule_id = g.granule_id)"
+                    if scanned else ""
+                )
+                cursor.execute(f"""
+                    SELECT g.granule_id, g.granule_name, g.region_id, COALESCE(g.acquisition_start, g.created_at),
+                           COALESCE(g.acquisition_start, g.created_at)::date
+                    FROM granules g
+                    WHERE NOT EXISTS (SELECT 1 FROM {WATER_LEVEL_TABLE} w WHERE w.granule_id = g.granule_id)
+                      {not_scanned}
+                      AND (%s::text IS NULL OR g.region_id = %s)
+                    ORDER BY g.granule_id
+                """, (region_id, region_id))
+                pending = cursor.fetchall()
+
+        written = 0
+        for granule_id, granule_name, granule_region, acquired_at, acquired_on in pending:
+            with self.database.connection() as conn:
+                with conn.cursor() as cursor:
+                    # acquired_on (mesma data usada na carga) poda as outras partições
+                    cursor.execute("""
+                        SELECT height_m FROM pixel_data
+                        WHERE acquired_on = %s AND granule_id = %s
+                          AND classification_id = ANY(%s) AND height_m IS NOT NULL
+                    """, (acquired_on, granule_id, list(WATER_CLASSES)))
+                    heights = np.array([row[0] for row in cursor.fetchall()], dtype='float64')
+
+                    level = robust_elevation(heights)
+                    if level is not None:
+                        level['water_pixels'] = len(heights)
+                        level['sample'] = quantile_sample(heights)
+                    written += write_water_level(cursor, granule_id, granule_region, acquired_at, level,
+                                                 granule_name, passes=True, scanned=scanned)
+
+        return written
+
+    def rebuild_passes(self, region_id=None):
+        """Recalcular o nível de todas as passagens a partir das linhas por granule"""
+        with self.database.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"""
+                    SELECT w.region_id, w.pass_id, MIN(g.granule_name)
+                    FROM {WATER_LEVEL_TABLE} w
+                    JOIN granules g ON g.granule_id = w.granule_id
+                    WHERE w.pass_id IS NOT NULL AND (%s::text IS NULL OR w.region_id = %s)
+                    GROUP BY w.region_id, w.pass_id
+                """, (region_id, region_id))
+                passes = cursor.fetchall()
+
+                written = 0
+                for pass_region, pass_id, granule_name in passes:
+                    _, cycle, pass_number = pass_key(granule_name)
+                    written += update_pass_level(cursor, pass_region, pass_id, cycle, pass_number)
+
+        return written
@@ -1,7 +1,10 @@
 import json
+import logging
 import os
 from pathlib import Path
 
+logger = logging.getLogger('swot')
+
 def load_config():
     """Carregar configurações do projeto"""
     config_file = Path('config/regions.json')
@@ -12,7 +15,71 @@ def load_config():
     else:
         return {"regions": []}
 
+def load_region_geometry(region):
+    """Polígono da região: GeoJSON em 'geometry' ou arquivo em 'geometry_file'
+    
+    'geometry_file' aceita qualquer formato lido pelo geopandas (shapefile,
+    GeoJSON, GeoPackage); as feições são reprojetadas para EPSG:4326 e unidas.
+    Sem nenhum dos dois a região continua só com o bbox.
+    """
+    if region.get('geometry_file'):
+        import geopandas as gpd
+        
+        features = gpd.read_file(region['geometry_file'])
+        if features.crs is not None:
+            features = features.to_crs(epsg=4326)
+        if hasattr(features, 'union_all'):
+            return features.union_all()
+        return features.unary_union
+    
+    if region.get('geometry'):
+        from shapely.geometry import shape
+        return shape(region['geometry'])
+    
+    return None
+
+def covering_bbox(bbox, bounds):
+    """Menor bbox que contém bbox e bounds ([min_lon, min_lat, max_lon, max_lat])"""
+    return [
+        min(bbox[0], bounds[0]), min(bbox[1], bounds[1]),
+        max(bbox[2], bounds[2]), max(bbox[3], bounds[3]),
+    ]
+
 def get_regions():
-    """Obter regiões ativas"""
+    """Obter regiões ativas (com o polígono carregado, quando configurado)
+    
+    O bbox define o envelope da busca no CMR e o polígono o recorte, então
+    com geometria o bbox passa a cobrir o polígono inteiro (um bbox
+    configurado menor é ampliado, com aviso).
+    """
     config = load_config()
-    return [r for r in config.get('regions', []) if r.get('active', True)]
\ No newline at end of file
+    regions = []
+    
+    for region in config.get('regions', []):
+        if not region.get('active', True):
+            continue
+        
+        try:
+            geometry = load_region_geometry(region)
+        except Exception as e:
+            logger.warning(f"Geometria da região {region.get('id')} ignorada: {e}")
+            geometry = None
+        
+        if geometry is not None:
+            region['geometry'] = geometry
+            bounds = list(geometry.bounds)
+            bbox = region.get('bbox') or bounds
+            covering = covering_bbox(bbox, bounds)
+            if covering != list(bbox):
+                logger.warning(f"bbox da região {region.get('id')} não cobre a geometria; ampliado para {covering}")
+            region['bbox'] = covering
+        else:
+            region.pop('geometry', None)
+        
+        if 'bbox' not in region:
+            logger.warning(f"Região {region.get('id')} sem bbox nem geometria, ignorada")
+            continue
+        
+        regions.append(region)
+    
+    return regions
@@ -0,0 +1,151 @@
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+# Prefixo das métricas no formato textfile do node_exporter
+METRICS_PREFIX = 'swot'
+
+# Taxas derivadas em cada escopo: nome -> (contador, timer)
+RATES = {
+    'download_bytes_per_second': ('bytes_downloaded', 'download'),
+    'decode_pixels_per_second': ('pixels_decoded', 'decode'),
+    'load_rows_per_second': ('rows_inserted', 'load'),
+}
+
+
+class RunMetrics:
+    """Contadores e timers de uma execução, por granule e por região
+
+    Cada escopo (execução, granule, região) é um dict plano: contadores
+    somam em <nome>, timers em <nome>_seconds e <nome>_count. Seguro para
+    as threads do pipeline.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.started_at = datetime.now()
+        self._start = clock()
+        self._lock = threading.Lock()
+        self.totals = {}
+        self.granules = {}
+        self.regions = {}
+
+    def _scopes(self, granule, region):
+        scopes = [self.totals]
+        if granule is not None:
+            scopes.append(self.granules.setdefault(granule, {}))
+        if region is not None:
+            scopes.append(self.regions.setdefault(region, {}))
+        return scopes
+
+    def count(self, name, amount=1, granule=None, region=None):
+        """Somar amount ao contador name (na execução e no granule/região informados)"""
+        with self._lock:
+            for scope in self._scopes(granule, region):
+                scope[name] = scope.get(name, 0) + amount
+
+    def observe(self, name, seconds, granule=None, region=None):
+        """Registrar uma duração do timer name"""
+        with self._lock:
+            for scope in self._scopes(granule, region):
+                scope[f"{name}_seconds"] = scope.get(f"{name}_seconds", 0.0) + seconds
+                scope[f"{name}_count"] = scope.get(f"{name}_count", 0) + 1
+
+    @contextmanager
+    def timer(self, name, granule=None, region=None):
+        """Medir o bloco com o timer name (a duração conta mesmo se o bloco falhar)"""
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.observe(name, self.clock() - start, granule, region)
+
+    def elapsed(self):
+        return self.clock() - self._start
+
+    @staticmethod
+    def _with_rates(scope):
+        scope = dict(scope)
+        for rate, (counter, timer) in RATES.items():
+            seconds = scope.get(f"{timer}_seconds")
+            if counter in scope and seconds:
+                scope[rate] = round(scope[counter] / seconds, 1)
+        for key, value in scope.items():
+            if isinstance(value, float):
+                scope[key] = round(value, 3)
+        return scope
+
+    def report(self, extra=None):
+        """Relatório da execução (dict serializável em JSON)"""
+        with self._lock:
+            report = {
+                'started_at': self.started_at.isoformat(timespec='seconds'),
+                'finished_at': datetime.now().isoformat(timespec='seconds'),
+                'duration_seconds': round(self.elapsed(), 3),
+                'totals': self._with_rates(self.totals),
+                'regions': {region: self._with_rates(scope) for region, scope in sorted(self.regions.items())},
+                'granules': {granule: self._with_rates(scope) for granule, scope in sorted(self.granules.items())},
+            }
+        if extra:
+            report.update(extra)
+        return report
+
+    def write_json(self, path, extra=None):
+        """Gravar o relatório em JSON; devolve o caminho"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(extra), f, indent=2, default=str)
+        return path
+
+    def prometheus_lines(self):
+        """Métricas da execução e por região no formato texto do Prometheus
+
+        Granules ficam só no JSON (um por execução, cardinalidade alta demais).
+        """
+        report = self.report()
+        lines = []
+
+        def family(name, samples):
+            metric = f"{METRICS_PREFIX}_{_metric_name(name)}"
+            lines.append(f"# TYPE {metric} gauge")
+            for labels, value in samples:
+                label_text = ','.join(f'{k}="{_label_value(v)}"' for k, v in labels.items())
+                lines.append(f"{metric}{{{label_text}}} {value}" if label_text else f"{metric} {value}")
+
+        family('run_timestamp_seconds', [({}, int(self.started_at.timestamp()))])
+        family('run_duration_seconds', [({}, report['duration_seconds'])])
+
+        for name, value in sorted(report['totals'].items()):
+            family(f"run_{name}", [({}, value)])
+
+        region_names = sorted({name for scope in report['regions'].values() for name in scope})
+        for name in region_names:
+            family(f"region_{name}", [
+                ({'region': region}, scope[name])
+                for region, scope in report['regions'].items() if name in scope
+            ])
+
+        return lines
+
+    def write_prometheus(self, path):
+        """Gravar o textfile do node_exporter (troca atômica do arquivo)"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        temporary.write_text('\n'.join(self.prometheus_lines()) + '\n', encoding='utf-8')
+        os.replace(temporary, path)
+        return path
+
+
+def _metric_name(name):
+    return re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,384 @@
+import cProfile
+import io
+import itertools
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from pathlib import Path
+
+# Modos do --profile: 'sample' (amostragem de pilhas, baixo custo) ou
+# 'cprofile' (determinístico, mais caro, com contagem de chamadas)
+PROFILE_MODES = ('sample', 'cprofile')
+
+# Intervalo entre amostras de pilha (segundos)
+SAMPLE_INTERVAL = 0.005
+
+# Pilhas cuja função do topo é uma destas estão esperando (fila, lock,
+# resultado de outro processo) e não entram no flamegraph
+IDLE_FRAMES = {
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('threading.py', 'join'),
+    ('queue.py', 'get'),
+    ('queue.py', 'put'),
+    ('selectors.py', 'select'),
+}
+
+# Funções mostradas no resumo texto do cProfile
+PROFILE_TOP_FUNCTIONS = 40
+
+# Arquivos gravados pelos workers de processo, juntados por RunProfiler.finish
+WORKER_PREFIX = 'worker-'
+
+_task_counter = itertools.count()
+
+
+def _frame_label(name, filename, line):
+    return f"{name} ({os.path.basename(filename)}:{line})".replace(';', ':')
+
+
+def _stage_of(thread_name):
+    """Nome do estágio a partir do nome da thread do pipeline ('load-0' -> 'load')"""
+    base, _, suffix = thread_name.rpartition('-')
+    return base if base and suffix.isdigit() else thread_name
+
+
+class StackSampler:
+    """Amostragem periódica das pilhas das threads (sys._current_frames)
+
+    Guarda contagens no formato "collapsed"/folded do flamegraph: a pilha
+    da raiz ao topo separada por ';', com o estágio (nome da thread) como
+    raiz. Com thread_ids só amostra essas threads.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL, thread_ids=None, root=None):
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.root = root
+        self.counts = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own = threading.get_ident()
+
+        for ident, frame in sys._current_frames().items():
+            if ident == own or (self.thread_ids is not None and ident not in self.thread_ids):
+                continue
+
+            code = frame.f_code
+            if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                continue
+
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(_frame_label(code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            stack.append(self.root or _stage_of(names.get(ident, str(ident))))
+            self.counts[';'.join(reversed(stack))] += 1
+
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.counts
+
+
+def write_folded(counts, path):
+    """Gravar pilhas folded (uma por linha: 'a;b;c contagem'), ordenadas"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for stack, count in sorted(counts.items()):
+            if count > 0:
+                f.write(f"{stack} {int(count)}\n")
+    return path
+
+
+def read_folded(path):
+    counts = Counter()
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            if stack:
+                counts[stack] += int(count)
+    return counts
+
+
+def pstats_to_folded(stats, root='cprofile', max_depth=64, min_microseconds=50):
+    """Converter estatísticas do cProfile em pilhas folded (microssegundos)
+
+    O cProfile só guarda pares chamador/chamado, então o tempo de uma
+    função é repartido entre os caminhos na proporção do tempo de cada
+    aresta (a mesma aproximação do flameprof).
+    """
+    entries = stats.stats
+    children = defaultdict(list)
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, edge in callers.items():
+            children[caller].append((func, edge[3]))
+
+    counts = Counter()
+
+    def label(func):
+        filename, line, name = func
+        return _frame_label(name, filename, line) if filename != '~' else name.replace(';', ':')
+
+    def walk(func, path, on_path, scale):
+        _, _, own_time, total_time, _ = entries[func]
+        path = path + [label(func)]
+        counts[';'.join(path)] += own_time * scale * 1e6
+        if len(path) >= max_depth:
+            return
+        for child, edge_time in children.get(func, ()):
+            child_total = entries[child][3]
+            share = scale * edge_time
+            if child in on_path or child_total <= 0 or share * 1e6 < min_microseconds:
+                continue
+            walk(child, path, on_path | {child}, share / child_total)
+
+    for func, (_, _, _, _, callers) in entries.items():
+        if not callers:
+            walk(func, [root], {func}, 1.0)
+
+    return Counter({stack: round(value) for stack, value in counts.items() if round(value) > 0})
+
+
+def _peak_mb(nbytes):
+    return round(nbytes / 1024 ** 2, 1) if nbytes is not None else None
+
+
+class WorkerProfile:
+    """Perfil de uma tarefa em processo worker (ex.: DecodePool)
+
+    Objeto pequeno e serializável: o processo pai o envia junto com a
+    tarefa e call() roda func sob o perfilador, grava o resultado em
+    directory (um arquivo por tarefa) e devolve (resultado, info), com o
+    pico de memória alocada durante a tarefa (tracemalloc ligado só
+    enquanto ela roda).
+    """
+
+    def __init__(self, mode, directory, interval=SAMPLE_INTERVAL, root='worker'):
+        self.mode = mode
+        self.directory = str(directory)
+        self.interval = interval
+        self.root = root
+
+    def call(self, func, *args, **kwargs):
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+
+        name = f"{WORKER_PREFIX}{os.getpid()}-{next(_task_counter)}"
+        profile = sampler = None
+        if self.mode == 'cprofile':
+            profile = cProfile.Profile()
+            profile.enable()
+        else:
+            sampler = StackSampler(self.interval, thread_ids={threading.get_ident()}, root=self.root).start()
+
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+            if started:
+                tracemalloc.stop()
+            if profile is not None:
+                profile.disable()
+                profile.dump_stats(os.path.join(self.directory, f"{name}.prof"))
+            else:
+                write_folded(sampler.stop(), os.path.join(self.directory, f"{name}.folded"))
+
+        return result, {
+            'pid': os.getpid(),
+            'seconds': round(seconds, 3),
+            'peak_bytes': peak_bytes,
+        }
+
+
+class RunProfiler:
+    """Perfil de uma execução do monitor
+
+    No modo 'sample' uma thread amostra as pilhas de todas as threads do
+    pipeline; no 'cprofile' cada thread de estágio tem seu próprio
+    cProfile.Profile, ligado só durante as chamadas do estágio (no Python
+    3.12+ só um perfilador fica ativo por vez; chamadas que coincidem
+    ficam de fora e são contadas em skipped_calls). Os workers de
+    processo gravam um arquivo por tarefa (WorkerProfile) e finish()
+    junta tudo em directory:
+
+    - stacks.folded: pilhas folded (flamegraph.pl, speedscope, inferno)
+    - profile.prof e profile.txt: só no modo cprofile (pstats / snakeviz)
+    - memory.json: picos do tracemalloc por granule. decode_peak_mb é da
+      tarefa no worker; <estágio>_process_peak_mb é do processo inteiro
+      durante a chamada (inclui as outras threads do pipeline)
+
+    O tracemalloc só fica ligado enquanto uma chamada medida roda (a
+    tarefa de decodificação no worker, a carga com granule_of): nesse
+    intervalo toda alocação do processo é rastreada e fica algumas vezes
+    mais lenta, então os tempos desses estágios saem inflados no perfil.
+    """
+
+    def __init__(self, mode, directory, interval=SAMPLE_INTERVAL):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Modo de perfil desconhecido: {mode}")
+        self.mode = mode
+        self.directory = Path(directory)
+        self.interval = interval
+        self.memory = defaultdict(dict)
+        self.skipped_calls = 0
+        self._profiles = []
+        self._tracing = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._sampler = None
+
+    def start(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if self.mode == 'sample':
+            self._sampler = StackSampler(self.interval).start()
+        return self
+
+    def worker_profile(self, root='worker'):
+        """Perfilador a ser usado nos processos worker (root: raiz das pilhas deles)"""
+        return WorkerProfile(self.mode, self.directory, self.interval, root)
+
+    def _thread_profile(self):
+        profile = getattr(self._local, 'profile', None)
+        if profile is None:
+            profile = self._local.profile = cProfile.Profile()
+            with self._lock:
+                self._profiles.append(profile)
+        return profile
+
+    def _trace_begin(self):
+        with self._lock:
+            if self._tracing == 0:
+                tracemalloc.start()
+            self._tracing += 1
+            tracemalloc.reset_peak()
+
+    def _trace_end(self):
+        """Pico desde _trace_begin; desliga o tracemalloc quando ninguém mais mede"""
+        with self._lock:
+            peak = tracemalloc.get_traced_memory()[1]
+            self._tracing -= 1
+            if self._tracing == 0:
+                tracemalloc.stop()
+            return peak
+
+    def wrap(self, stage, func, granule_of=None, workers=1):
+        """Envolver a função de um estágio do pipeline
+
+        Com granule_of (item -> nome do granule) liga o tracemalloc durante
+        cada chamada e registra o pico do que foi alocado nela, como
+        <estágio>_process_peak_mb. O pico é do processo inteiro (downloads
+        e outras threads rodando ao mesmo tempo entram nele) e o reset de
+        um worker apagaria o de outro, então só é aceito em estágios de um
+        worker.
+        """
+        if granule_of is not None and workers != 1:
+            raise ValueError(f"Pico de memória por granule só em estágio de um worker ({stage}: {workers})")
+
+        def profiled(item):
+            granule = granule_of(item) if granule_of is not None and item is not None else None
+            if granule is not None:
+                self._trace_begin()
+
+            profile = self._thread_profile() if self.mode == 'cprofile' else None
+            if profile is not None:
+                try:
+                    profile.enable()
+                except ValueError:
+                    with self._lock:
+                        self.skipped_calls += 1
+                    profile = None
+
+            try:
+                return func(item)
+            finally:
+                if profile is not None:
+                    profile.disable()
+                if granule is not None:
+                    self.record(granule, f"{stage}_process_peak_mb", _peak_mb(self._trace_end()))
+
+        return profiled
+
+    def record(self, granule, key, value):
+        with self._lock:
+            self.memory[granule][key] = value
+
+    def record_workers(self, infos):
+        """Picos informados pelos workers ({arquivo: info} de DecodePool.profile_info)"""
+        for file_path, info in infos.items():
+            granule = Path(file_path).stem
+            self.record(granule, 'decode_peak_mb', _peak_mb(info.get('peak_bytes')))
+            self.record(granule, 'decode_pid', info.get('pid'))
+            self.record(granule, 'decode_seconds', info.get('seconds'))
+
+    def _worker_files(self, suffix):
+        return sorted(self.directory.glob(f"{WORKER_PREFIX}*{suffix}"))
+
+    def finish(self):
+        """Parar, juntar threads e workers e gravar os arquivos; devolve os caminhos"""
+        paths = []
+        counts = Counter()
+
+        if self.mode == 'sample':
+            counts.update(self._sampler.stop())
+            for path in self._worker_files('.folded'):
+                counts.update(read_folded(path))
+                path.unlink()
+        else:
+            stats = None
+            sources = [p for p in self._profiles if p.getstats()] + [str(p) for p in self._worker_files('.prof')]
+            for source in sources:
+                if stats is None:
+                    stats = pstats.Stats(source)
+                else:
+                    stats.add(source)
+
+            if stats is not None:
+                paths.append(self.directory / 'profile.prof')
+                stats.dump_stats(paths[-1])
+
+                text = io.StringIO()
+                stats.stream = text
+                stats.sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+                if self.skipped_calls:
+                    text.write(f"\n{self.skipped_calls} chamadas de estágio sem perfil (outro perfilador ativo)\n")
+                paths.append(self.directory / 'profile.txt')
+                paths[-1].write_text(text.getvalue(), encoding='utf-8')
+
+                counts.update(pstats_to_folded(stats))
+
+            for path in self._worker_files('.prof'):
+                path.unlink()
+
+        paths.append(write_folded(counts, self.directory / 'stacks.folded'))
+
+        paths.append(self.directory / 'memory.json')
+        with open(paths[-1], 'w', encoding='utf-8') as f:
+            json.dump({'mode': self.mode, 'granules': dict(sorted(self.memory.items()))}, f, indent=2)
+
+        return paths